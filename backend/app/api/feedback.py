@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, BackgroundTasks
 from typing import Optional, Dict, Any
 from pydantic import BaseModel
+from app.core.config import settings
 from app.core.database import get_db
 from app.services.cache import cache_service
+from app.services.storage import storage_service
+from app.services.image_features import ImageFeatures
+from app.services.ai_identification.embedding_index import embedding_index
 import logging
+import numpy as np
 import uuid
 from datetime import datetime
 
@@ -22,8 +27,54 @@ class RetryRequest(BaseModel):
     feedback: Optional[str] = None
     exclude_species: Optional[list] = []
 
+CONFIRMED_OBSERVATIONS_QUERY = """
+MATCH (f:Feedback)
+WHERE f.type IN ['correct', 'correction'] AND f.observation_id IS NOT NULL
+MATCH (o:Observation {id: f.observation_id})-[:IDENTIFIED_AS]->(s:Species)
+WHERE o.filename IS NOT NULL
+RETURN DISTINCT o.id as observation_id, o.filename as filename,
+       s.scientific_name as scientific_name, s.common_name as common_name
+"""
+
+def _confirmed_embedding(filename: str) -> np.ndarray:
+    return ImageFeatures(storage_service.get_image(filename)).embedding
+
+def _index_confirmed_observation(observation_id: str, species: Dict[str, Any]):
+    """Add a confirmed observation's image to the nearest-neighbor index"""
+    try:
+        rows = get_db().execute_query(
+            "MATCH (o:Observation {id: $id}) RETURN o.filename as filename",
+            {"id": observation_id}
+        )
+        if not rows or not rows[0].get("filename"):
+            logger.info(f"Observation {observation_id} has no stored image, not indexing it")
+            return
+        embedding_index.append(observation_id, species, _confirmed_embedding(rows[0]["filename"]))
+    except Exception as e:
+        logger.warning(f"Could not index confirmed observation {observation_id}: {e}")
+
+def _backfill_embedding_index(batch_size: int = 100):
+    """Index every confirmed observation not already in the nearest-neighbor index"""
+    embedding_index.refresh()
+    pending = []
+    for row in get_db().execute_query(CONFIRMED_OBSERVATIONS_QUERY):
+        if embedding_index.contains(row["observation_id"]):
+            continue
+        try:
+            embedding = _confirmed_embedding(row["filename"])
+        except Exception as e:
+            logger.warning(f"Skipping observation {row['observation_id']}: {e}")
+            continue
+        pending.append((row["observation_id"], row, embedding))
+        if len(pending) >= batch_size:
+            embedding_index.append_many(pending)
+            pending = []
+    embedding_index.append_many(pending)
+    embedding_index.snapshot()
+    logger.info(f"Embedding index backfilled to {len(embedding_index)} vectors")
+
 @router.post("/feedback")
-async def submit_feedback(feedback: IdentificationFeedback):
+async def submit_feedback(feedback: IdentificationFeedback, background_tasks: BackgroundTasks):
     """
     Submit feedback on an identification
     """
@@ -78,6 +129,16 @@ async def submit_feedback(feedback: IdentificationFeedback):
             # Clear cache for this observation
             cache_service.delete(f"recent_identification:{feedback.observation_id}")
         
+        # Confirmed and corrected observations become labeled examples for kNN matching
+        if settings.KNN_ENABLED and feedback.observation_id:
+            species = None
+            if feedback.feedback_type == "correction" and feedback.corrected_species:
+                species = feedback.corrected_species
+            elif feedback.feedback_type == "correct":
+                species = feedback.prediction
+            if species and species.get("scientific_name"):
+                background_tasks.add_task(_index_confirmed_observation, feedback.observation_id, species)
+        
         # Track learning data for improving the model
         if feedback.feedback_type == "incorrect":
             # Log incorrect predictions for analysis
@@ -162,6 +223,14 @@ async def retry_identification(request: RetryRequest):
         logger.error(f"Error processing retry: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/knn/backfill")
+async def backfill_embedding_index(background_tasks: BackgroundTasks):
+    """
+    Index all confirmed observations for nearest-neighbor matching, then snapshot
+    """
+    background_tasks.add_task(_backfill_embedding_index)
+    return {"status": "started", "index": embedding_index.stats()}
+
 @router.get("/stats")
 async def get_feedback_stats():
     """
@@ -1,21 +1,139 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from typing import Optional, List, Dict
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 from app.services.storage import storage_service
+from app.services.image_features import ImageFeatures
+from app.services.ingest import ingest_upload
+from app.services.renditions import rendition_service
+from app.services.url_signer import url_signer
+from app.services.identification_cache import identification_cache
+from app.services.ai_identification.phash_index import near_duplicate_index
+from app.services.ai_identification.location_prior import location_prior
 from app.services.cache import cache_service
+from app.services.write_behind import write_behind_queue
 from app.core.database import get_db
+from app.core.loaders import Loaders
 from app.core.config import settings
-from app.services.ai_identification.google_vision_rest import google_vision_rest_service
-from app.services.ai_identification.mock_service import MockIdentificationService
-from app.services.ai_identification.free_classifier import free_classifier
+from app.services.ai_identification.registry import provider_registry, UnknownProviderError
+from app.services.executor import (
+    classification_executor,
+    ExecutorSaturatedError,
+    ExecutorUnavailableError,
+    ClassificationTimeoutError
+)
+import asyncio
+import json
 import logging
+import os
+import tarfile
+import time
 import uuid
+import zipfile
+from concurrent.futures import Future
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Create a singleton mock service instance to maintain state
-mock_service = MockIdentificationService()
+IMAGE_EXTENSIONS = {
+    ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+    ".gif": "image/gif", ".bmp": "image/bmp", ".webp": "image/webp",
+    ".tif": "image/tiff", ".tiff": "image/tiff",
+    ".dng": "image/x-adobe-dng", ".cr2": "image/x-canon-cr2",
+    ".nef": "image/x-nikon-nef", ".arw": "image/x-sony-arw",
+}
+
+def _select_provider(requested: Optional[str] = None) -> str:
+    """Name of the classifier provider to use, as requested or the configured default"""
+    # mock is the default: free, no API costs and more varied than the heuristic classifier
+    provider = requested or provider_registry.default
+    if provider not in provider_registry.names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown provider '{provider}', expected one of {', '.join(provider_registry.names)}"
+        )
+    return provider
+
+def _provider_version(provider: str) -> str:
+    """Version of a provider's results, used to key cached identifications"""
+    return provider_registry.version(provider)
+
+async def _run_classifier(features: ImageFeatures, provider: str) -> Tuple[List[Dict], Optional[Dict]]:
+    """Run a classifier, returning predictions and a report of who answered, if any"""
+    predictions, report = await provider_registry.get(provider).identify(features)
+    if report is not None and "escalation_reason" in report:
+        logger.info(
+            f"Cascade answered by {report['answered_by']} "
+            f"(escalation: {report['escalation_reason'] or 'none'})"
+        )
+    else:
+        logger.info(f"{provider} classifier returned {len(predictions)} predictions")
+    
+    return predictions, report
+
+def _is_cacheable(report: Optional[Dict]) -> bool:
+    """Answers produced while a provider was failing are not cached"""
+    if report is None:
+        return True
+    return not report.get("fallback_reason") and not any("error" in stage for stage in report.get("stages", []))
+
+async def _find_near_duplicate(
+    features: ImageFeatures,
+    provider: str,
+    version: str
+) -> Tuple[Optional[int], Optional[Dict]]:
+    """pHash of the image and the closest prior identification by the same provider version, if any"""
+    if not settings.NEAR_DUPLICATE_ENABLED:
+        return None, None
+    phash = await run_in_threadpool(lambda: features.phash)
+    return phash, near_duplicate_index.find(phash, provider, version)
+
+def _apply_location_prior(
+    predictions: List[Dict],
+    lat: Optional[float],
+    lon: Optional[float]
+) -> Tuple[List[Dict], Optional[List[Dict]]]:
+    """Predictions re-ranked for where the photo was taken, and likely species they miss"""
+    if not settings.LOCATION_PRIOR_ENABLED or lat is None or lon is None:
+        return predictions, None
+    return location_prior.rerank(predictions, lat, lon)
+
+def _format_phash(phash: Optional[int]) -> Optional[str]:
+    return f"{phash:016x}" if phash is not None else None
+
+OBSERVATION_QUERY = """
+MERGE (o:Observation {id: $id})
+SET o.timestamp = datetime($timestamp),
+    o.latitude = $lat,
+    o.longitude = $lon,
+    o.confidence = $confidence,
+    o.filename = $filename,
+    o.phash = $phash,
+    o.provider = $provider,
+    o.provider_version = $provider_version
+WITH o
+MATCH (s:Species {scientific_name: $species_name})
+MERGE (o)-[:IDENTIFIED_AS]->(s)
+RETURN o
+"""
+
+def persist_observation(observation: Dict[str, Any], features: ImageFeatures):
+    """Upload an observation's image and write the observation; repeating it is harmless"""
+    storage_result = storage_service.upload_features(features, f"observation:{observation['id']}")
+    get_db().execute_write(OBSERVATION_QUERY, {
+        "id": observation["id"],
+        "timestamp": observation["timestamp"],
+        "lat": observation["lat"],
+        "lon": observation["lon"],
+        "confidence": observation["confidence"],
+        "filename": storage_result["filename"],
+        "phash": observation["phash"],
+        "provider": observation.get("provider"),
+        "provider_version": observation.get("provider_version"),
+        "species_name": observation["species_name"]
+    })
+    rendition_service.submit(features, storage_result["filename"])
 
 @router.post("/")
 async def identify_species(
@@ -23,127 +141,573 @@ async def identify_species(
     file: UploadFile = File(...),
     lat: Optional[float] = None,
     lon: Optional[float] = None,
-    save_image: bool = True
+    save_image: bool = True,
+    provider: Optional[str] = None
 ):
     """
     Identify species in an uploaded image using AI
+    
+    `provider` picks the classifier for this request; the configured default
+    is used when it is omitted.
     """
+    features = None
     try:
         # Validate file type
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Read image data
-        image_data = await file.read()
-        await file.seek(0)
+        # Map the spooled upload once; every later stage shares the same features
+        features = await ingest_upload(file)
         
-        # Use mock service for better variety (free classifier needs more work)
-        # The free classifier is available but needs ML models for better accuracy
-        use_mock_service = True  # Free, no API costs
+        db = get_db()
+        provider = _select_provider(provider)
+        version = _provider_version(provider)
         
-        if use_mock_service:
-            logger.info("Using mock identification service (free, no API required)")
-            predictions = mock_service.identify_species(image_data)
-            logger.info(f"Mock service returned {len(predictions)} predictions")
-        else:
-            # Alternative: Use free classifier (color/shape analysis)
-            logger.info("Using free marine classifier")
-            predictions = free_classifier.identify_species(image_data)
-            logger.info(f"Free classifier returned {len(predictions)} predictions")
+        # Re-submitted photos skip classification and enrichment entirely
+        enriched_predictions = identification_cache.get(features.content_hash, provider, version)
+        cache_status = "hit" if enriched_predictions is not None else "miss"
+        phash, near_duplicate, classifier_report = None, None, None
+        
+        if enriched_predictions is None:
+            # Burst shots of the same subject reuse the closest prior identification
+            phash, near_duplicate = await _find_near_duplicate(features, provider, version)
+            if near_duplicate is not None:
+                predictions = near_duplicate["predictions"]
+                cache_status = "near_duplicate"
+            else:
+                try:
+                    predictions, classifier_report = await _run_classifier(features, provider)
+                except ExecutorSaturatedError as e:
+                    raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+                except ExecutorUnavailableError as e:
+                    raise HTTPException(status_code=503, detail=str(e))
+                except ClassificationTimeoutError as e:
+                    raise HTTPException(status_code=504, detail=str(e))
+            
+            if predictions:
+                logger.info(f"First prediction: {predictions[0].get('common_name', 'Unknown')}")
+            
+            # Get additional species info from database
+            enriched_predictions = await _enrich_predictions(Loaders(db), predictions)
+            
+            # A near duplicate's answer belongs to another image, so only exact results are cached by hash
+            if near_duplicate is None and _is_cacheable(classifier_report):
+                identification_cache.set(features.content_hash, provider, version, enriched_predictions)
         
-        if predictions:
-            logger.info(f"First prediction: {predictions[0].get('common_name', 'Unknown')}")
+        # Cached results are location independent, the prior is applied per request
+        enriched_predictions, nearby_species = _apply_location_prior(enriched_predictions, lat, lon)
         
-        if not predictions:
-            return {
+        if not enriched_predictions:
+            response = {
                 "status": "no_species_detected",
                 "message": "No marine species detected in the image",
-                "predictions": []
+                "predictions": [],
+                "cache": cache_status
             }
-        
-        # Get additional species info from database
-        db = get_db()
-        enriched_predictions = []
-        
-        for pred in predictions:
-            # Query species details
-            query = """
-            MATCH (s:Species {scientific_name: $name})
-            OPTIONAL MATCH (s)-[:FOUND_IN]->(l:Location)
-            RETURN s, collect(l.name) as locations
-            """
-            
-            results = db.execute_query(query, {"name": pred["scientific_name"]})
-            
-            if results:
-                species_data = dict(results[0]['s'])
-                species_data['confidence'] = pred['confidence']
-                species_data['locations'] = results[0]['locations']
-                enriched_predictions.append(species_data)
-            else:
-                # Species not in database, use basic prediction
-                enriched_predictions.append(pred)
+            if nearby_species is not None:
+                response["nearby_species"] = nearby_species
+            return response
         
         observation_id = str(uuid.uuid4())
+        # Degraded answers are neither reused for near duplicates nor reloaded into the index
+        reusable = _is_cacheable(classifier_report)
+        if phash is not None and near_duplicate is None and reusable:
+            near_duplicate_index.add(phash, predictions, observation_id if save_image else None, provider, version)
         
-        # Save image and create observation if requested
+        # Save image and create observation if requested, with the highest confidence species
+        persistence = None
         if save_image:
-            # Upload to storage
-            storage_result = storage_service.upload_image(
-                file.file,
-                file.filename,
-                file.content_type
-            )
-            
-            # Create observation in database
-            obs_query = """
-            CREATE (o:Observation {
-                id: $id,
-                timestamp: datetime(),
-                latitude: $lat,
-                longitude: $lon,
-                confidence: $confidence,
-                filename: $filename
-            })
-            WITH o
-            MATCH (s:Species {scientific_name: $species_name})
-            CREATE (o)-[:IDENTIFIED_AS]->(s)
-            RETURN o
-            """
-            
-            # Save with highest confidence species
-            if enriched_predictions:
-                top_species = enriched_predictions[0]
-                db.execute_write(obs_query, {
-                    "id": observation_id,
-                    "lat": lat,
-                    "lon": lon,
-                    "confidence": top_species['confidence'],
-                    "filename": storage_result["filename"],
-                    "species_name": top_species.get('scientific_name')
-                })
+            top_species = enriched_predictions[0]
+            observation = {
+                "id": observation_id,
+                "timestamp": datetime.utcnow().isoformat(),
+                "lat": lat,
+                "lon": lon,
+                "confidence": top_species['confidence'],
+                "phash": _format_phash(phash),
+                "provider": provider if reusable else None,
+                "provider_version": version if reusable else None,
+                "species_name": top_species.get('scientific_name')
+            }
+            if settings.WRITE_BEHIND_ENABLED:
+                # Journaled to local disk; the upload and Neo4j write happen after the response
+                await run_in_threadpool(write_behind_queue.enqueue, features, observation)
+                persistence = "queued"
+            else:
+                await run_in_threadpool(persist_observation, observation, features)
+                persistence = "stored"
         
         logger.info(f"Returning {len(enriched_predictions)} enriched predictions")
         
         response = {
             "status": "success",
             "observation_id": observation_id if save_image else None,
+            "persistence": persistence,
             "predictions": enriched_predictions,
             "location": {"latitude": lat, "longitude": lon} if lat and lon else None,
+            "cache": cache_status,
             "timestamp": datetime.utcnow().isoformat()
         }
+        if classifier_report is not None:
+            response["classifier"] = classifier_report
+        if nearby_species is not None:
+            response["nearby_species"] = nearby_species
+        if near_duplicate is not None:
+            response["near_duplicate"] = {
+                "observation_id": near_duplicate["observation_id"],
+                "distance": near_duplicate["distance"]
+            }
         
         # Cache recent identification
         cache_key = f"recent_identification:{observation_id}"
         cache_service.set(cache_key, response, ttl=3600)
         
         return response
-        
+    
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error identifying species: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if features is not None:
+            features.close()
+
+def _is_image_member(name: str) -> bool:
+    """Check whether an archive member looks like an image file"""
+    base = os.path.basename(name)
+    ext = os.path.splitext(base)[1].lower()
+    return bool(base) and not base.startswith(".") and ext in IMAGE_EXTENSIONS
+
+class BatchLimitError(Exception):
+    """Raised when a batch archive expands past BATCH_MAX_EXTRACTED_BYTES"""
+
+def _read_limited(stream) -> Optional[bytes]:
+    """A file's data, or None if it is over MAX_IMAGE_SIZE, never reading more than one byte past it"""
+    data = stream.read(settings.MAX_IMAGE_SIZE + 1)
+    return data if len(data) <= settings.MAX_IMAGE_SIZE else None
+
+def _read_archive(archive: UploadFile):
+    """
+    Yield (filename, content_type, data) for every image in a tar or zip archive
+    
+    Members over MAX_IMAGE_SIZE are yielded with data None instead of being
+    extracted, whatever size their header claims, and extraction stops with
+    BatchLimitError once BATCH_MAX_EXTRACTED_BYTES have been extracted.
+    """
+    extracted_bytes = 0
+    
+    def extract(name: str, declared_size: int, open_member) -> Tuple[str, str, Optional[bytes]]:
+        nonlocal extracted_bytes
+        ext = os.path.splitext(name)[1].lower()
+        filename = os.path.basename(name)
+        if declared_size > settings.MAX_IMAGE_SIZE:
+            return filename, IMAGE_EXTENSIONS[ext], None
+        if extracted_bytes + declared_size > settings.BATCH_MAX_EXTRACTED_BYTES:
+            raise BatchLimitError(f"Archive expands past {settings.BATCH_MAX_EXTRACTED_BYTES} bytes")
+        with open_member() as stream:
+            data = _read_limited(stream)
+        extracted_bytes += len(data) if data is not None else 0
+        return filename, IMAGE_EXTENSIONS[ext], data
+    
+    archive.file.seek(0)
+    if zipfile.is_zipfile(archive.file):
+        archive.file.seek(0)
+        with zipfile.ZipFile(archive.file) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not _is_image_member(info.filename):
+                    continue
+                yield extract(info.filename, info.file_size, lambda: zf.open(info))
+        return
+    
+    archive.file.seek(0)
+    # Stream mode reads members sequentially without seeking back
+    with tarfile.open(fileobj=archive.file, mode="r|*") as tf:
+        for member in tf:
+            if not member.isfile() or not _is_image_member(member.name):
+                continue
+            extracted = tf.extractfile(member)
+            if extracted is None:
+                continue
+            yield extract(member.name, member.size, lambda: extracted)
+
+async def _iter_batch_inputs(
+    files: Optional[List[UploadFile]],
+    archive: Optional[UploadFile]
+) -> AsyncIterator[Tuple[str, str, Optional[bytes]]]:
+    """Yield (filename, content_type, data) for every image in the batch request, data None if too large"""
+    for file in files or []:
+        data = await run_in_threadpool(_read_limited, file.file)
+        yield file.filename, file.content_type or "", data
+    
+    if archive is not None:
+        members = _read_archive(archive)
+        sentinel = object()
+        while True:
+            member = await run_in_threadpool(next, members, sentinel)
+            if member is sentinel:
+                break
+            yield member
+
+async def _enrich_predictions(loaders: Loaders, predictions: List[Dict]) -> List[Dict]:
+    """Attach species details to predictions with one batched species lookup"""
+    results = await loaders.species.load_many(p["scientific_name"] for p in predictions)
+    
+    enriched = []
+    for pred, result in zip(predictions, results):
+        if result:
+            species_data = dict(result['s'])
+            species_data['confidence'] = pred['confidence']
+            species_data['locations'] = result['locations']
+            enriched.append(species_data)
+        else:
+            # Species not in database, use basic prediction
+            enriched.append(pred)
+    return enriched
+
+def _write_batch_observations(db, observations: List[Dict]):
+    """Create all pending observations of a batch in a single write"""
+    if not observations:
+        return
+    query = """
+    UNWIND $observations AS obs
+    CREATE (o:Observation {
+        id: obs.id,
+        timestamp: datetime(),
+        latitude: obs.lat,
+        longitude: obs.lon,
+        confidence: obs.confidence,
+        filename: obs.filename,
+        phash: obs.phash,
+        provider: obs.provider,
+        provider_version: obs.provider_version
+    })
+    WITH o, obs
+    MATCH (s:Species {scientific_name: obs.species_name})
+    CREATE (o)-[:IDENTIFIED_AS]->(s)
+    """
+    db.execute_write(query, {"observations": observations})
+
+@router.post("/batch")
+async def identify_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    save_image: bool = True,
+    concurrency: int = Query(settings.BATCH_MAX_CONCURRENCY, ge=1, le=settings.BATCH_MAX_CONCURRENCY),
+    provider: Optional[str] = None
+):
+    """
+    Identify species in many images at once
+    
+    Accepts multiple `files` and/or a tar/zip `archive`. Results are streamed
+    back as NDJSON, one line per image in completion order, followed by a
+    summary line once all observations have been written.
+    """
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="No files or archive provided")
+    if files and len(files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many files (max {settings.BATCH_MAX_FILES} per batch)"
+        )
+    provider = _select_provider(provider)
+    
+    async def run_batch() -> AsyncIterator[str]:
+        db = get_db()
+        results: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(concurrency)
+        # One loader set per batch, so each species is looked up once across all images
+        loaders = Loaders(db)
+        version = _provider_version(provider)
+        uploads: Dict[str, asyncio.Future] = {}
+        pending_observations: List[Dict] = []
+        # Rendered as soon as each original is stored, so no image outlives its item;
+        # recorded once the observations are written, so the keys have a node to land on
+        renditions: Dict[str, Future] = {}
+        stats = {"total": 0, "succeeded": 0, "failed": 0, "saved": 0}
+        tasks: set = set()
+        
+        async def upload(features: ImageFeatures, reference: str) -> Dict:
+            # Identical payloads within a batch share a single storage upload;
+            # the others wait for it and then only record their reference
+            first = uploads.get(features.content_hash)
+            if first is None:
+                uploads[features.content_hash] = asyncio.ensure_future(
+                    run_in_threadpool(storage_service.upload_features, features, reference)
+                )
+                return await uploads[features.content_hash]
+            await first
+            return await run_in_threadpool(storage_service.upload_features, features, reference)
+        
+        async def process(index: int, filename: str, content_type: str, data: bytes):
+            line: Dict[str, Any] = {"index": index, "filename": filename}
+            features = None
+            try:
+                if not content_type.startswith('image/'):
+                    raise ValueError("File must be an image")
+                if data is None:
+                    raise ValueError(f"Image too large (max {settings.MAX_IMAGE_SIZE} bytes)")
+                features = ImageFeatures(data, filename, content_type)
+                
+                enriched = identification_cache.get(features.content_hash, provider, version)
+                line["cache"] = "hit" if enriched is not None else "miss"
+                phash, near_duplicate, classifier_report = None, None, None
+                
+                if enriched is None:
+                    phash, near_duplicate = await _find_near_duplicate(features, provider, version)
+                    if near_duplicate is not None:
+                        predictions = near_duplicate["predictions"]
+                        line["cache"] = "near_duplicate"
+                        line["near_duplicate"] = {
+                            "observation_id": near_duplicate["observation_id"],
+                            "distance": near_duplicate["distance"]
+                        }
+                    else:
+                        # Batches wait a while for pool capacity instead of failing items at once
+                        give_up_at = time.monotonic() + settings.BATCH_SATURATION_WAIT
+                        while True:
+                            try:
+                                predictions, classifier_report = await _run_classifier(features, provider)
+                                break
+                            except ExecutorSaturatedError:
+                                if time.monotonic() >= give_up_at:
+                                    raise
+                                await asyncio.sleep(0.1)
+                    
+                    enriched = await _enrich_predictions(loaders, predictions)
+                    if near_duplicate is None and _is_cacheable(classifier_report):
+                        identification_cache.set(features.content_hash, provider, version, enriched)
+                    if classifier_report is not None:
+                        line["classifier"] = classifier_report
+                
+                enriched, nearby_species = _apply_location_prior(enriched, lat, lon)
+                if nearby_species is not None:
+                    line["nearby_species"] = nearby_species
+                
+                if not enriched:
+                    line.update({"status": "no_species_detected", "predictions": []})
+                    return
+                
+                line.update({"status": "success", "predictions": enriched, "observation_id": None})
+                observation_id = str(uuid.uuid4()) if save_image else None
+                reusable = _is_cacheable(classifier_report)
+                if phash is not None and near_duplicate is None and reusable:
+                    near_duplicate_index.add(phash, predictions, observation_id, provider, version)
+                
+                if save_image:
+                    storage_result = await upload(features, f"observation:{observation_id}")
+                    if storage_result["filename"] not in renditions:
+                        future = rendition_service.submit(features, storage_result["filename"], record=False)
+                        if future is not None:
+                            renditions[storage_result["filename"]] = future
+                    pending_observations.append({
+                        "id": observation_id,
+                        "lat": lat,
+                        "lon": lon,
+                        "confidence": enriched[0]['confidence'],
+                        "filename": storage_result["filename"],
+                        "phash": _format_phash(phash),
+                        "provider": provider if reusable else None,
+                        "provider_version": version if reusable else None,
+                        "species_name": enriched[0].get('scientific_name')
+                    })
+                    line["observation_id"] = observation_id
+            except Exception as e:
+                logger.error(f"Error identifying batch item {filename}: {e}")
+                line.update({"status": "error", "error": str(e)})
+            finally:
+                if features is not None:
+                    features.close()
+                slots.release()
+                await results.put(line)
+        
+        async def produce():
+            index = 0
+            try:
+                async for filename, content_type, data in _iter_batch_inputs(files, archive):
+                    if index >= settings.BATCH_MAX_FILES:
+                        logger.warning(f"Batch truncated at {settings.BATCH_MAX_FILES} files")
+                        break
+                    # Only read the next image once a worker slot is free
+                    await slots.acquire()
+                    task = asyncio.ensure_future(process(index, filename, content_type, data))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    index += 1
+            except BatchLimitError as e:
+                logger.warning(f"Batch truncated: {e}")
+                stats["truncated"] = str(e)
+            return index
+        
+        async def flush_observations():
+            batch = pending_observations[:]
+            del pending_observations[:]
+            await run_in_threadpool(_write_batch_observations, db, batch)
+            stats["saved"] += len(batch)
+            for filename in {obs["filename"] for obs in batch}:
+                if filename in renditions:
+                    rendition_service.record_when_done(renditions[filename], filename)
+        
+        producer = asyncio.ensure_future(produce())
+        emitted = 0
+        try:
+            while True:
+                if producer.done():
+                    stats["total"] = producer.result()
+                    if emitted >= stats["total"]:
+                        break
+                    line = await results.get()
+                else:
+                    getter = asyncio.ensure_future(results.get())
+                    done, _ = await asyncio.wait(
+                        {getter, producer}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if getter not in done:
+                        getter.cancel()
+                        continue
+                    line = getter.result()
+                
+                emitted += 1
+                stats["succeeded" if line["status"] != "error" else "failed"] += 1
+                
+                if len(pending_observations) >= settings.BATCH_WRITE_SIZE:
+                    await flush_observations()
+                
+                yield json.dumps(line, default=str) + "\n"
+            
+            await flush_observations()
+            if stats["saved"]:
+                cache_service.clear_pattern("identifications:*")
+        except Exception as e:
+            logger.error(f"Error in batch identification: {e}")
+            stats["error"] = str(e)
+        finally:
+            if not producer.done():
+                producer.cancel()
+            # Items still running when the client went away
+            for task in list(tasks):
+                task.cancel()
+        
+        stats["status"] = "complete" if "error" not in stats else "error"
+        stats["timestamp"] = datetime.utcnow().isoformat()
+        yield json.dumps(stats) + "\n"
+    
+    return StreamingResponse(run_batch(), media_type="application/x-ndjson")
+
+@router.get("/executor/stats")
+async def get_executor_stats():
+    """
+    Get classification process pool queue depth and task latency
+    """
+    return classification_executor.stats()
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Get identification result cache hit/miss counters
+    """
+    return identification_cache.stats()
+
+@router.get("/vision/stats")
+async def get_vision_stats():
+    """
+    Get Google Vision images sent per batched annotate call
+    """
+    for name in ("vision", "cascade"):
+        loaded = provider_registry.loaded(name)
+        if loaded is not None:
+            return loaded.client.stats()
+    return {"loaded": False}
+
+@router.get("/providers")
+async def get_providers():
+    """
+    Get the default provider and which providers are loaded, with their stats
+    
+    Remote providers report circuit breaker state, retries and fallback counts.
+    """
+    return provider_registry.stats()
+
+@router.get("/providers/stats")
+async def get_provider_stats():
+    """
+    Get remote provider circuit breaker state, retries and fallback counts
+    """
+    return provider_registry.stats()["providers"]
+
+@router.put("/providers/default")
+async def set_default_provider(name: str):
+    """
+    Switch the default classifier provider without a restart
+    
+    The switch is shared through Redis and reaches every worker within
+    PROVIDER_DEFAULT_REFRESH seconds. `scope` is "worker" when Redis could
+    not be written and only the worker that served this request switched.
+    """
+    try:
+        shared = provider_registry.set_default(name)
+    except UnknownProviderError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**provider_registry.stats(), "scope": "shared" if shared else "worker"}
+
+@router.delete("/providers/{name}")
+async def unload_provider(name: str):
+    """
+    Unload a provider, closing its connections until it is next used
+    """
+    try:
+        await provider_registry.unload(name)
+    except UnknownProviderError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return provider_registry.stats()
+
+@router.get("/cascade/stats")
+async def get_cascade_stats():
+    """
+    Get how often each classifier cascade stage ran and answered
+    """
+    cascade = provider_registry.loaded("cascade")
+    return cascade.stats() if cascade is not None else {"loaded": False}
+
+@router.get("/knn/stats")
+async def get_knn_stats():
+    """
+    Get nearest-neighbor index size, snapshot generation and search counters
+    """
+    knn = provider_registry.loaded("knn")
+    return knn.stats() if knn is not None else {"loaded": False}
+
+@router.post("/knn/snapshot")
+async def snapshot_knn_index():
+    """
+    Fold appended feedback into a new memory-mapped snapshot of the kNN index
+    """
+    knn = provider_registry.get("knn")
+    await run_in_threadpool(knn.index.snapshot)
+    return knn.stats()
+
+@router.get("/write-behind/stats")
+async def get_write_behind_stats():
+    """
+    Get queued, persisted, retrying and dead observation writes
+    """
+    return write_behind_queue.stats()
+
+@router.get("/location-prior/stats")
+async def get_location_prior_stats():
+    """
+    Get geohash cells, species and refresh counters of the location prior
+    """
+    return location_prior.stats()
+
+@router.get("/near-duplicates/stats")
+async def get_near_duplicate_stats():
+    """
+    Get perceptual-hash index size and hit/miss counters
+    """
+    return near_duplicate_index.stats()
 
 @router.get("/recent")
 async def get_recent_identifications(limit: int = 10):
@@ -166,6 +730,10 @@ async def get_recent_identifications(limit: int = 10):
         
         results = db.execute_query(query, {"limit": limit})
         
+        signed = url_signer.sign_many(
+            key for result in results if result['o'].get('filename')
+            for key in (result['o']['filename'], *rendition_service.object_keys(result['o']).values())
+        )
         identifications = []
         for result in results:
             obs = dict(result['o'])
@@ -174,7 +742,8 @@ async def get_recent_identifications(limit: int = 10):
                 obs['timestamp'] = obs['timestamp'].isoformat()
             obs['species'] = dict(result['s'])
             if obs.get('filename'):
-                obs['image_url'] = storage_service.get_image_url(obs['filename'])
+                obs['image_url'] = signed[obs['filename']]
+                obs.update(rendition_service.urls(obs, signed))
             identifications.append(obs)
         
         response = {
@@ -186,7 +755,7 @@ async def get_recent_identifications(limit: int = 10):
         cache_service.set(cache_key, response, ttl=300)
         
         return response
-        
+    
     except Exception as e:
         logger.error(f"Error getting recent identifications: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -238,7 +807,7 @@ async def get_identification_stats():
         cache_service.set(cache_key, stats, ttl=600)
         
         return stats
-        
+    
     except Exception as e:
         logger.error(f"Error getting identification stats: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,16 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from minio.error import S3Error
 from typing import Optional, List
 from app.services.storage import storage_service
+from app.services.ingest import ingest_upload
+from app.services.renditions import rendition_service
+from app.services.url_signer import url_signer
 from app.services.cache import cache_service
 from app.core.database import get_db
+from app.core.config import settings
+from app.core.loaders import Loaders
+from app.core.object_response import object_response
 import logging
 from datetime import datetime
 import uuid
@@ -19,24 +27,20 @@ async def upload_image(
     description: Optional[str] = None
 ):
     """Upload an image to the system"""
+    features = None
     try:
         # Validate file type
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Upload to MinIO
-        file_data = await file.read()
-        await file.seek(0)
-        
-        storage_result = storage_service.upload_image(
-            file.file,
-            file.filename,
-            file.content_type
-        )
+        # Stream the spooled upload to MinIO without reading it into memory
+        features = await ingest_upload(file)
+        image_id = str(uuid.uuid4())
+        # A file stored before is only counted as referenced by this image
+        storage_result = await run_in_threadpool(storage_service.upload_features, features, f"image:{image_id}")
         
         # Store metadata in Neo4j
         db = get_db()
-        image_id = str(uuid.uuid4())
         
         query = """
         CREATE (i:Image {
@@ -61,9 +65,12 @@ async def upload_image(
             "latitude": latitude,
             "longitude": longitude,
             "description": description,
-            "size": file.size
+            "size": features.size
         })
         
+        # Thumbnail and preview are rendered after the response
+        rendition_service.submit(features, storage_result["filename"])
+        
         # Clear cache
         cache_service.clear_pattern("images:*")
         
@@ -71,12 +78,18 @@ async def upload_image(
             "id": image_id,
             "filename": storage_result["filename"],
             "message": "Image uploaded successfully",
+            "deduplicated": storage_result["deduplicated"],
             "url": storage_service.get_image_url(storage_result["filename"])
         }
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading image: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if features is not None:
+            features.close()
 
 @router.get("/")
 async def list_images(
@@ -102,11 +115,16 @@ async def list_images(
         
         results = db.execute_query(query, {"limit": limit, "offset": offset})
         
-        images = []
-        for result in results:
-            image = result['i']
-            image['url'] = storage_service.get_image_url(image['filename'])
-            images.append(image)
+        images = [result['i'] for result in results]
+        # Sign the whole page at once, renditions included
+        signed = url_signer.sign_many(
+            key for image in images
+            for key in (image['filename'], *rendition_service.object_keys(image).values())
+        )
+        for image in images:
+            image['url'] = signed[image['filename']]
+            image.update(rendition_service.urls(image, signed))
+            image['content_url'] = f"{settings.API_V1_STR}/images/{image['id']}/content"
         
         response = {
             "images": images,
@@ -119,11 +137,16 @@ async def list_images(
         cache_service.set(cache_key, response, ttl=300)  # 5 minutes
         
         return response
-        
+    
     except Exception as e:
         logger.error(f"Error listing images: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/renditions/stats")
+async def get_rendition_stats():
+    """Get counters of background thumbnail and preview generation"""
+    return rendition_service.stats()
+
 @router.get("/{image_id}")
 async def get_image(image_id: str):
     """Get a specific image by ID"""
@@ -134,22 +157,16 @@ async def get_image(image_id: str):
         if cached:
             return cached
         
-        db = get_db()
-        query = """
-        MATCH (i:Image {id: $id})
-        OPTIONAL MATCH (i)-[:CONTAINS]->(s:Species)
-        OPTIONAL MATCH (i)-[:TAKEN_AT]->(l:Location)
-        RETURN i, collect(DISTINCT s) as species, l as location
-        """
-        
-        results = db.execute_query(query, {"id": image_id})
+        loaders = Loaders(get_db())
+        result = await loaders.image.load(image_id)
         
-        if not results:
+        if not result:
             raise HTTPException(status_code=404, detail="Image not found")
         
-        result = results[0]
         image = result['i']
         image['url'] = storage_service.get_image_url(image['filename'])
+        image.update(rendition_service.urls(image))
+        image['content_url'] = f"{settings.API_V1_STR}/images/{image['id']}/content"
         image['species'] = result['species']
         image['location'] = result['location']
         
@@ -157,13 +174,55 @@ async def get_image(image_id: str):
         cache_service.set(cache_key, image, ttl=600)  # 10 minutes
         
         return image
-        
+    
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error getting image: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{image_id}/content")
+async def get_image_content(
+    image_id: str,
+    request: Request,
+    rendition: Optional[str] = Query(None, pattern="^(thumbnail|preview)$")
+):
+    """
+    Stream an image, or one of its renditions, from storage
+    
+    Honors Range and If-None-Match; renditions not generated yet are
+    served as the original.
+    """
+    try:
+        cache_key = f"image:{image_id}:objects"
+        objects = cache_service.get(cache_key)
+        if objects is None:
+            query = """
+            MATCH (i:Image {id: $id})
+            RETURN i.filename as filename, i.thumbnail_key as thumbnail_key, i.preview_key as preview_key
+            """
+            results = get_db().execute_query(query, {"id": image_id})
+            if not results:
+                raise HTTPException(status_code=404, detail="Image not found")
+            objects = results[0]
+            # Only cached once complete, so renditions show up as soon as they are recorded
+            if all(objects.get(key) for key in ("thumbnail_key", "preview_key")):
+                cache_service.set(cache_key, objects, ttl=600)
+        
+        key = objects.get(f"{rendition}_key") if rendition else None
+        return await run_in_threadpool(object_response, storage_service, key or objects["filename"], request.headers)
+    
+    except HTTPException:
+        raise
+    except S3Error as e:
+        if e.code == "NoSuchKey":
+            raise HTTPException(status_code=404, detail="Image content not found")
+        logger.error(f"Error streaming image: {e}")
+        raise HTTPException(status_code=502, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error streaming image: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/{image_id}")
 async def delete_image(image_id: str):
     """Delete an image"""
@@ -171,7 +230,10 @@ async def delete_image(image_id: str):
         db = get_db()
         
         # Get image info first
-        query = "MATCH (i:Image {id: $id}) RETURN i.filename as filename"
+        query = """
+        MATCH (i:Image {id: $id})
+        RETURN i.filename as filename, i.thumbnail_key as thumbnail_key, i.preview_key as preview_key
+        """
         results = db.execute_query(query, {"id": image_id})
         
         if not results:
@@ -179,8 +241,16 @@ async def delete_image(image_id: str):
         
         filename = results[0]['filename']
         
-        # Delete from MinIO
-        storage_service.delete_image(filename)
+        # Delete from MinIO, renditions included, unless observations or
+        # other images still reference the same content
+        def release():
+            if storage_service.release_image(filename, f"image:{image_id}"):
+                for key in ("thumbnail_key", "preview_key"):
+                    if results[0].get(key):
+                        storage_service.delete_image(results[0][key])
+        
+        # Redis, the per-blob lock, a possible graph backfill and MinIO all block
+        await run_in_threadpool(release)
         
         # Delete from Neo4j
         delete_query = "MATCH (i:Image {id: $id}) DETACH DELETE i"
@@ -188,10 +258,11 @@ async def delete_image(image_id: str):
         
         # Clear cache
         cache_service.delete(f"image:{image_id}")
+        cache_service.delete(f"image:{image_id}:objects")
         cache_service.clear_pattern("images:*")
         
         return {"message": "Image deleted successfully"}
-        
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -10,6 +10,7 @@ import logging
 from app.core.config import settings
 from app.services.lightroom import LightroomAuth, LightroomAPIClient, LightroomSyncService
 from app.services.storage import StorageService
+from app.services.url_signer import url_signer
 from app.services.cache import CacheService
 
 logger = logging.getLogger(__name__)
@@ -279,12 +280,11 @@ async def get_album_assets(
     
     assets = await sync_service.get_album_assets(album_id)
     
-    # Add MinIO URLs for thumbnails
+    # Add MinIO URLs for thumbnails, signed for the whole album at once
+    signed = url_signer.sign_many(asset.get("thumbnail_key") for asset in assets)
     for asset in assets:
         if asset.get("thumbnail_key"):
-            asset["thumbnail_url"] = storage_service.get_image_url(
-                asset["thumbnail_key"]
-            )
+            asset["thumbnail_url"] = signed[asset["thumbnail_key"]]
     
     return {"assets": assets}
 
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List
 from app.core.database import get_db
+from app.core.loaders import Loaders
 from app.services.cache import cache_service
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -130,41 +132,22 @@ async def get_species(scientific_name: str):
         if cached:
             return cached
         
-        db = get_db()
-        query = """
-        MATCH (s:Species {scientific_name: $name})
-        OPTIONAL MATCH (s)<-[:CONTAINS*]-(parent)
-        OPTIONAL MATCH (s)-[:FOUND_IN]->(l:Location)
-        OPTIONAL MATCH (i:Image)-[:CONTAINS]->(s)
-        WITH s, 
-             collect(DISTINCT {name: parent.name, rank: parent.rank}) as taxonomy,
-             collect(DISTINCT l) as locations,
-             count(DISTINCT i) as image_count
-        RETURN s, taxonomy, locations, image_count
-        """
+        loaders = Loaders(get_db())
         
-        results = db.execute_query(query, {"name": scientific_name})
+        # Detail and related species are fetched concurrently
+        result, related = await asyncio.gather(
+            loaders.species_detail.load(scientific_name),
+            loaders.related_species.load(scientific_name)
+        )
         
-        if not results:
+        if not result:
             raise HTTPException(status_code=404, detail="Species not found")
         
-        result = results[0]
         species = dict(result['s'])
         species['taxonomy'] = result['taxonomy']
         species['locations'] = result['locations']
         species['image_count'] = result['image_count']
-        
-        # Get related species
-        related_query = """
-        MATCH (s:Species {scientific_name: $name})<-[:CONTAINS]-(parent)
-        MATCH (parent)-[:CONTAINS]->(related:Species)
-        WHERE related.scientific_name <> $name
-        RETURN related
-        LIMIT 5
-        """
-        
-        related_results = db.execute_query(related_query, {"name": scientific_name})
-        species['related_species'] = [dict(r['related']) for r in related_results]
+        species['related_species'] = [dict(r) for r in related['related']] if related else []
         
         # Cache for 30 minutes
         cache_service.set(cache_key, species, ttl=1800)
@@ -17,6 +17,14 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = os.getenv("MINIO_SECRET_KEY", "minioadmin123")
     MINIO_BUCKET: str = os.getenv("MINIO_BUCKET", "marine-images")
     MINIO_SECURE: bool = False
+    MINIO_REGION: str = os.getenv("MINIO_REGION", "us-east-1")
+    
+    # URLs handed to clients for stored objects
+    STORAGE_PUBLIC_URL: str = os.getenv("STORAGE_PUBLIC_URL", "http://localhost:9000")  # Browser-facing MinIO, proxy or CDN base
+    STORAGE_URL_MODE: str = "presigned"  # presigned, or public for a public bucket
+    STORAGE_URL_EXPIRES: int = 3600  # Seconds a presigned URL stays valid at least
+    STORAGE_URL_BUCKET: int = 900  # Seconds during which the same URL is reused
+    STORAGE_URL_CACHE_SIZE: int = 50000  # Presigned URLs memoized in-process
     
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
     
@@ -34,8 +42,111 @@ class Settings(BaseSettings):
     FREE_MONTHLY_IDS: int = 50  # Free identifications per month
     
     MAX_IMAGE_SIZE: int = 100 * 1024 * 1024
+    UPLOAD_FORM_OVERHEAD: int = 64 * 1024  # Multipart framing and form fields allowed on top of MAX_IMAGE_SIZE
+    INGEST_MMAP_THRESHOLD: int = 1024 * 1024  # Uploads at least this large are memory-mapped from their spool file
+    STORAGE_PART_SIZE: int = 16 * 1024 * 1024  # Multipart part size for MinIO uploads, at least 5 MiB
+    STORAGE_PARALLEL_THRESHOLD: int = 32 * 1024 * 1024  # Originals at least this large upload their parts concurrently
+    STORAGE_UPLOAD_CONCURRENCY: int = 4  # Parts in flight across all parallel uploads
+    STORAGE_PART_RETRIES: int = 3  # Extra attempts for a failed part
+    STORAGE_PART_RETRY_BASE: float = 0.5  # Seconds before a part's first retry, doubled each time
+    STORAGE_STREAM_CHUNK: int = 256 * 1024  # Bytes read from MinIO per chunk when proxying an object
+    IMAGE_CACHE_MAX_AGE: int = 365 * 24 * 3600  # Seconds clients may cache content-addressed objects
+    BLOB_LOCK_TIMEOUT: float = 300.0  # Seconds one worker may hold the lock storing or deleting an original
+    BLOB_LOCK_WAIT: float = 5.0  # Seconds to wait for that lock before giving up
+    REDUCED_DECODE_ENABLED: bool = True  # Decode large uploads at the resolution analysis needs
     THUMBNAIL_SIZE: tuple = (300, 300)
     PREVIEW_SIZE: tuple = (1200, 1200)
+    RENDITIONS_ENABLED: bool = True  # Render thumbnails and previews of every stored image
+    RENDITION_FORMAT: str = "WEBP"  # WEBP or JPEG
+    RENDITION_QUALITY: int = 80
+    RENDITION_WORKERS: int = 2  # Threads rendering and uploading renditions
+    
+    # Classifier selection
+    IDENTIFICATION_PROVIDER: str = "mock"  # Default of mock, free, onnx, knn, vision or cascade; requests may pick another
+    PROVIDER_DEFAULT_REFRESH: float = 5.0  # Seconds between reads of the default switched at runtime, shared through Redis
+    CASCADE_LOCAL_PROVIDER: str = "free"  # Cheap first stage of the cascade
+    CASCADE_MIN_MARGIN: float = 0.1  # Escalate when the top two confidences are closer than this
+    GOOGLE_VISION_API_URL: str = os.getenv("GOOGLE_VISION_API_URL", "https://vision.googleapis.com/v1/images:annotate")
+    VISION_BATCH_SIZE: int = 16  # Images per images:annotate call, the API maximum
+    VISION_BATCH_WINDOW_MS: float = 10.0  # How long to wait for more images before calling
+    VISION_TIMEOUT: float = 10.0  # Seconds per annotate call
+    VISION_MAX_CONNECTIONS: int = 10  # Pooled connections to the Vision API
+    VISION_DEADLINE: float = 3.0  # Seconds per identification, retries included
+    VISION_RETRIES: int = 2  # Extra attempts after a transient failure
+    VISION_BREAKER_FAILURES: int = 5  # Consecutive failures that open the circuit
+    VISION_BREAKER_RESET: float = 30.0  # Seconds the circuit stays open before a trial call
+    VISION_FALLBACK_PROVIDER: str = "free"  # Local classifier used while Vision is unavailable
+    VISION_PREPROCESS_ENABLED: bool = True  # Downscale and re-encode uploads before sending them
+    VISION_MAX_SIDE: int = 1024  # Longest side, in pixels, of the image sent to Vision
+    VISION_JPEG_QUALITY: int = 85  # Quality of the re-encoded JPEG
+    VISION_CROP_SUBJECT: bool = False  # Crop to the largest region standing out from the background
+    VISION_CROP_PADDING: float = 0.15  # Margin kept around the subject, as a fraction of its size
+    
+    # Mock provider, deterministic per image for reproducible load tests
+    MOCK_SEED: int = 0  # Picks which images are slow or fail; predictions depend on the image alone
+    MOCK_LATENCY_P50_MS: float = 0.0  # Median synthetic latency, 0 answers immediately
+    MOCK_LATENCY_P99_MS: float = 0.0  # 99th percentile of the lognormal latency
+    MOCK_ERROR_RATE: float = 0.0  # Fraction of images the mock fails on
+    
+    # Local ONNX Runtime classifier (CPU only)
+    ONNX_MODEL_PATH: str = os.getenv("ONNX_MODEL_PATH", "models/marine_int8.onnx")
+    ONNX_LABELS_PATH: str = os.getenv("ONNX_LABELS_PATH", "models/marine_labels.json")
+    ONNX_SESSIONS: int = 2  # Inference sessions per worker process
+    ONNX_INTRA_OP_THREADS: int = max(1, (os.cpu_count() or 2) // 2)  # Threads each session uses within an operator
+    ONNX_MAX_BATCH: int = 32  # Images per inference call
+    ONNX_BATCH_WINDOW_MS: float = 5.0  # How long to wait for more images before running
+    ONNX_TOP_K: int = 3  # Predictions returned per image
+    
+    # Nearest-neighbor matching against user-confirmed observations
+    KNN_ENABLED: bool = True  # Add confirmed feedback to the embedding index
+    KNN_INDEX_DIR: str = os.getenv("KNN_INDEX_DIR", "data/knn_index")
+    KNN_NEIGHBORS: int = 15  # Neighbors that vote on the species
+    KNN_MIN_SIMILARITY: float = 0.85  # Cosine similarity below which neighbors are ignored
+    KNN_SNAPSHOT_EVERY: int = 500  # Journal entries that trigger a new snapshot
+    KNN_MAX_BATCH: int = 32  # Identifications searched in one pass over the index
+    KNN_BATCH_WINDOW_MS: float = 5.0
+    
+    # Location-aware re-ranking from occurrences near the photo
+    LOCATION_PRIOR_ENABLED: bool = False  # Re-rank predictions when a request has lat/lon
+    LOCATION_PRIOR_PRECISION: int = 3  # Geohash characters per cell, 3 is roughly 156 km across
+    LOCATION_PRIOR_WEIGHT: float = 0.5  # Exponent on the local-to-global frequency ratio
+    LOCATION_PRIOR_SMOOTHING: float = 10.0  # Pseudo-observations pulling sparse cells toward the global mix
+    LOCATION_PRIOR_RANGE_WEIGHT: float = 5.0  # Observations a FOUND_IN range counts as
+    LOCATION_PRIOR_SUGGESTIONS: int = 3  # Nearby species surfaced that the classifier missed
+    LOCATION_PRIOR_MIN_SHARE: float = 0.05  # Local share a species needs to be surfaced
+    LOCATION_PRIOR_REFRESH_INTERVAL: float = 60.0  # Seconds between loads of new observations
+    
+    # Write-behind persistence of identify requests
+    WRITE_BEHIND_ENABLED: bool = True  # Respond before the image upload and observation write finish
+    WRITE_BEHIND_DIR: str = os.getenv("WRITE_BEHIND_DIR", "data/write_behind")
+    WRITE_BEHIND_FSYNC: bool = True  # Flush each queued job to disk before responding
+    WRITE_BEHIND_CONCURRENCY: int = 4  # Jobs persisted at once
+    WRITE_BEHIND_POLL_INTERVAL: float = 0.5  # Seconds between checks for jobs queued by other workers
+    WRITE_BEHIND_RETRY_BASE: float = 1.0  # Seconds before the first retry, doubling after each failure
+    WRITE_BEHIND_RETRY_MAX: float = 300.0  # Longest wait between retries
+    WRITE_BEHIND_MAX_ATTEMPTS: int = 20  # Attempts before a job is set aside under dead/
+    WRITE_BEHIND_COMPACT_BYTES: int = 1024 * 1024  # Journal size that triggers compaction once drained
+    
+    # Classification process pool settings
+    CLASSIFIER_WORKERS: int = os.cpu_count() or 2
+    CLASSIFIER_MAX_QUEUE: int = 32  # Tasks allowed to wait for a worker
+    CLASSIFIER_TASK_TIMEOUT: float = 30.0  # Seconds per classification
+    
+    # Identification result cache
+    IDENTIFICATION_CACHE_SIZE: int = 1024  # Entries kept in the in-process LRU
+    IDENTIFICATION_CACHE_TTL: int = 86400  # Seconds entries live in Redis
+    
+    # Near-duplicate (perceptual hash) reuse of prior identifications
+    NEAR_DUPLICATE_ENABLED: bool = True
+    NEAR_DUPLICATE_MAX_DISTANCE: int = 6  # Max differing perceptual hash bits out of 64
+    NEAR_DUPLICATE_MAX_ENTRIES: int = 200000  # Most recent identifications kept in the index
+    
+    # Batch identification settings
+    BATCH_MAX_FILES: int = 2000  # Files accepted per batch request
+    BATCH_MAX_CONCURRENCY: int = 8  # Images classified concurrently per request
+    BATCH_WRITE_SIZE: int = 100  # Observations per grouped Neo4j write
+    BATCH_MAX_EXTRACTED_BYTES: int = 4 * 1024 * 1024 * 1024  # Image bytes extracted from one batch archive
+    BATCH_SATURATION_WAIT: float = 30.0  # Seconds a batch item waits for classifier capacity before failing
     
     MIN_CONFIDENCE_THRESHOLD: float = 0.5
     HIGH_CONFIDENCE_THRESHOLD: float = 0.8
@@ -0,0 +1,137 @@
+"""
+Request-scoped batching loaders for Neo4j reads
+Key lookups made in the same event loop tick are resolved with a single UNWIND query
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from app.core.database import Neo4jConnection
+
+logger = logging.getLogger(__name__)
+
+BatchFunction = Callable[[List[Hashable]], Dict[Hashable, Any]]
+
+class BatchLoader:
+    """
+    DataLoader-style batching and memoization of key lookups
+    
+    `load()` calls made before the event loop next runs its callbacks are
+    handed to `batch_fn` together, which runs in the threadpool and returns
+    a dict of results by key; missing keys resolve to None. Results are
+    memoized for the lifetime of the loader, so a loader should not outlive
+    the request that created it.
+    """
+    
+    def __init__(self, batch_fn: BatchFunction, max_batch_size: Optional[int] = None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+    
+    async def load(self, key: Hashable) -> Any:
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            if not self._queue:
+                # Runs after every task already scheduled in this tick has queued its keys
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        # Shielded so one cancelled caller does not cancel the shared lookup
+        return await asyncio.shield(future)
+    
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+    
+    def clear(self, key: Hashable):
+        """Forget a memoized result so the next load queries again"""
+        self._futures.pop(key, None)
+    
+    def _dispatch(self):
+        keys, self._queue = self._queue, []
+        size = self.max_batch_size or len(keys)
+        for start in range(0, len(keys), size):
+            asyncio.ensure_future(self._run(keys[start:start + size]))
+    
+    async def _run(self, keys: List[Hashable]):
+        self.batches += 1
+        try:
+            results = await run_in_threadpool(self.batch_fn, keys)
+        except Exception as e:
+            logger.error(f"Batch load of {len(keys)} keys failed: {e}")
+            for key in keys:
+                # Failed lookups are not memoized
+                future = self._futures.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        
+        for key in keys:
+            future = self._futures.get(key)
+            if future is not None and not future.done():
+                future.set_result(results.get(key))
+
+def cypher_batch(db: Neo4jConnection, query: str) -> BatchFunction:
+    """
+    Batch function running `query` once for all keys
+    
+    The query receives the keys as `$keys` and must return a `key` column;
+    the first row for each key becomes its result.
+    """
+    def batch_fn(keys: List[Hashable]) -> Dict[Hashable, Dict]:
+        results = {}
+        for row in db.execute_query(query, {"keys": keys}):
+            results.setdefault(row.pop("key"), row)
+        return results
+    return batch_fn
+
+SPECIES_QUERY = """
+UNWIND $keys AS key
+MATCH (s:Species {scientific_name: key})
+OPTIONAL MATCH (s)-[:FOUND_IN]->(l:Location)
+RETURN key, s, collect(l.name) as locations
+"""
+
+SPECIES_DETAIL_QUERY = """
+UNWIND $keys AS key
+MATCH (s:Species {scientific_name: key})
+OPTIONAL MATCH (s)<-[:CONTAINS*]-(parent)
+OPTIONAL MATCH (s)-[:FOUND_IN]->(l:Location)
+OPTIONAL MATCH (i:Image)-[:CONTAINS]->(s)
+WITH key, s,
+     collect(DISTINCT {name: parent.name, rank: parent.rank}) as taxonomy,
+     collect(DISTINCT l) as locations,
+     count(DISTINCT i) as image_count
+RETURN key, s, taxonomy, locations, image_count
+"""
+
+RELATED_SPECIES_QUERY = """
+UNWIND $keys AS key
+MATCH (s:Species {scientific_name: key})<-[:CONTAINS]-(parent)
+MATCH (parent)-[:CONTAINS]->(related:Species)
+WHERE related.scientific_name <> key
+WITH key, collect(related)[..5] as related
+RETURN key, related
+"""
+
+IMAGE_QUERY = """
+UNWIND $keys AS key
+MATCH (i:Image {id: key})
+OPTIONAL MATCH (i)-[:CONTAINS]->(s:Species)
+OPTIONAL MATCH (i)-[:TAKEN_AT]->(l:Location)
+RETURN key, i, collect(DISTINCT s) as species, l as location
+"""
+
+class Loaders:
+    """Per-request set of Neo4j loaders, create one per request"""
+    
+    def __init__(self, db: Neo4jConnection):
+        self.species = BatchLoader(cypher_batch(db, SPECIES_QUERY))
+        self.species_detail = BatchLoader(cypher_batch(db, SPECIES_DETAIL_QUERY))
+        self.related_species = BatchLoader(cypher_batch(db, RELATED_SPECIES_QUERY))
+        self.image = BatchLoader(cypher_batch(db, IMAGE_QUERY))
@@ -0,0 +1,56 @@
+"""
+ASGI middleware for the API
+Upload bodies are size-checked as they arrive instead of after they are spooled
+"""
+
+import logging
+from typing import Dict
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies over a per-path limit with 413
+    
+    `limits` maps exact request paths to the most body bytes they accept. A
+    declared Content-Length over the limit is refused before the endpoint
+    runs; otherwise bytes are counted as the endpoint receives them and the
+    request is aborted as soon as the count passes the limit, so an
+    oversized chunked upload is never spooled in full.
+    """
+    
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        
+        detail = f"Request body too large (max {limit} bytes)"
+        declared = Headers(scope=scope).get("content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            logger.warning(f"Refused {declared} byte body for {scope['path']}")
+            response = JSONResponse({"detail": detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def receive_limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside body parsing, so the exception handlers turn it into the response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+        
+        await self.app(scope, receive_limited, send)
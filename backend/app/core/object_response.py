@@ -0,0 +1,101 @@
+"""
+Conditional and ranged HTTP responses for stored objects
+Objects are streamed from storage in fixed-size chunks, so memory per request does not grow with object size
+"""
+
+import re
+from email.utils import format_datetime
+from typing import Any, Mapping, Optional, Tuple
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+
+# Originals are stored as <md5>.<ext> and renditions under renditions/<md5>/, so their bytes never change
+CONTENT_ADDRESSED = re.compile(r"^(?:[0-9a-f]{32}\.\w+|renditions/[0-9a-f]{32}/\w+\.\w+)$")
+
+class RangeNotSatisfiableError(ValueError):
+    """Raised when a Range header selects no bytes of the object"""
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) of a single-range `bytes=` header, or None to serve everything
+    
+    Multiple ranges and other units are ignored, which RFC 9110 allows;
+    a syntactically valid range outside the object raises
+    RangeNotSatisfiableError.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    match = re.fullmatch(r"\s*(\d*)-(\d*)\s*", spec)
+    if match is None or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the final `last` bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiableError(header)
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiableError(header)
+    return start, end
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match header lists the (unquoted) etag, compared weakly"""
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+def cache_control(key: str) -> str:
+    """Immutable for content-addressed keys, revalidated by ETag otherwise"""
+    if CONTENT_ADDRESSED.match(key):
+        return f"public, max-age={settings.IMAGE_CACHE_MAX_AGE}, immutable"
+    return "no-cache"
+
+def object_response(storage: Any, key: str, request_headers: Mapping[str, str]) -> Response:
+    """
+    Response for a stored object honoring Range, If-Range and If-None-Match
+    
+    `storage` provides `stat_image(key)` and `stream_image(key, offset,
+    length)`. The body is a generator that Starlette drains on a worker
+    thread, one chunk at a time. Blocking, call it from a worker thread.
+    """
+    info = storage.stat_image(key)
+    etag = f'"{info["etag"]}"'
+    size = info["size"]
+    headers = {"ETag": etag, "Cache-Control": cache_control(key), "Accept-Ranges": "bytes"}
+    if info.get("last_modified") is not None:
+        headers["Last-Modified"] = format_datetime(info["last_modified"], usegmt=True)
+    
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, info["etag"]):
+        return Response(status_code=304, headers=headers)
+    
+    byte_range = None
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    # A stale If-Range validator means the client's partial copy is outdated, send it all
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiableError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    
+    status_code, start, length = 200, 0, size
+    if byte_range is not None:
+        start, end = byte_range
+        status_code, length = 206, end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+    
+    body = storage.stream_image(key, start, length) if length else iter(())
+    return StreamingResponse(body, status_code=status_code, media_type=info.get("content_type"), headers=headers)
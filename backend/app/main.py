@@ -1,10 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from app.api import images, species, identification, search, feedback, lightroom
 from app.core.config import settings
+from app.core.database import get_db
+from app.core.middleware import BodySizeLimitMiddleware
+from app.services.executor import classification_executor
+from app.services.write_behind import write_behind_queue
+from app.services.renditions import rendition_service
+from app.services.multipart import parallel_uploader
+from app.services.ai_identification.phash_index import near_duplicate_index
+from app.services.ai_identification.location_prior import location_prior
+from app.services.ai_identification.registry import provider_registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,8 +23,30 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting Marine Life ID System...")
+    classification_executor.start()
+    if settings.NEAR_DUPLICATE_ENABLED:
+        try:
+            await run_in_threadpool(near_duplicate_index.load, get_db())
+        except Exception as e:
+            logger.warning(f"Could not load near-duplicate index: {e}")
+    location_refresher = None
+    if settings.LOCATION_PRIOR_ENABLED:
+        try:
+            await run_in_threadpool(location_prior.load, get_db())
+        except Exception as e:
+            logger.warning(f"Could not load location prior: {e}")
+        location_refresher = asyncio.ensure_future(location_prior.refresh_periodically(get_db))
+    if settings.WRITE_BEHIND_ENABLED:
+        write_behind_queue.start(identification.persist_observation)
     yield
     logger.info("Shutting down Marine Life ID System...")
+    if location_refresher is not None:
+        location_refresher.cancel()
+    await write_behind_queue.stop()
+    await run_in_threadpool(rendition_service.shutdown)
+    await run_in_threadpool(parallel_uploader.shutdown)
+    classification_executor.shutdown()
+    await provider_registry.close()
 
 app = FastAPI(
     title="Marine Life Identification System",
@@ -30,6 +63,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Single-image uploads are cut off as soon as they pass the image size limit
+upload_limit = settings.MAX_IMAGE_SIZE + settings.UPLOAD_FORM_OVERHEAD
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        f"{settings.API_V1_STR}/images/upload": upload_limit,
+        f"{settings.API_V1_STR}/identify/": upload_limit,
+    },
+)
+
 app.include_router(images.router, prefix="/api/v1/images", tags=["images"])
 app.include_router(species.router, prefix="/api/v1/species", tags=["species"])
 app.include_router(identification.router, prefix="/api/v1/identify", tags=["identification"])
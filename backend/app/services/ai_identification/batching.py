@@ -0,0 +1,92 @@
+"""
+Request batching for classifiers
+Concurrent identifications are coalesced into one batched classifier call
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from app.services.image_features import ImageFeatures
+from app.services.executor import latency_percentiles
+
+logger = logging.getLogger(__name__)
+
+class BatchingClassifier:
+    """
+    Coalesces concurrent identifications into batched inference calls
+    
+    Requests arriving within `batch_window` seconds of each other share one
+    `classifier.identify_batch` call of up to `max_batch` images, run on a
+    worker thread so the event loop stays free. Worth it when the batch call
+    costs much less than the same number of single calls.
+    """
+    
+    def __init__(
+        self,
+        classifier: Any,
+        max_batch: int,
+        batch_window: float
+    ):
+        self.classifier = classifier
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window
+        self._pending: List[Tuple[ImageFeatures, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._latencies = deque(maxlen=1000)
+        self._counters = {"images": 0, "batches": 0, "errors": 0}
+    
+    async def identify(self, features: ImageFeatures) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((features, future))
+        self._counters["images"] += 1
+        
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+    
+    async def _run(self, batch: List[Tuple[ImageFeatures, asyncio.Future]]):
+        self._counters["batches"] += 1
+        start = time.perf_counter()
+        try:
+            results = await run_in_threadpool(self.classifier.identify_batch, [features for features, _ in batch])
+        except Exception as e:
+            logger.error(f"Batched classification failed for {len(batch)} images: {e}")
+            self._counters["errors"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._latencies.append(time.perf_counter() - start)
+        
+        for (_, future), predictions in zip(batch, results):
+            if not future.done():
+                future.set_result(predictions)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Images classified, inference calls made and per-call latency"""
+        batches = self._counters["batches"]
+        return {
+            **self._counters,
+            "mean_batch_size": round(self._counters["images"] / batches, 2) if batches else None,
+            "pending": len(self._pending),
+            "latency": latency_percentiles(self._latencies)
+        }
@@ -0,0 +1,148 @@
+"""
+Confidence-driven classifier cascade
+The cheap local classifier answers first and Google Vision is only consulted when it is unsure
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+from app.services.executor import classification_executor, get_provider_version, latency_percentiles
+from app.services.ai_identification.google_vision_rest import google_vision_rest_service
+from app.services.ai_identification.resilience import guarded_vision
+
+logger = logging.getLogger(__name__)
+
+class CascadeStage:
+    """
+    A named classifier step, run as `await stage.run(features)`
+    
+    `version` may be a callable, read each time so the stage neither loads
+    its classifier to learn it nor misses a new model or index.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[ImageFeatures], Awaitable[List[Dict]]],
+        version: Union[str, Callable[[], str]] = "0"
+    ):
+        self.name = name
+        self.run = run
+        self._version = version
+    
+    @property
+    def version(self) -> str:
+        return self._version() if callable(self._version) else self._version
+
+class ClassifierCascade:
+    """
+    Local classifier first, escalating to a remote classifier when unsure
+    
+    Escalation happens when the local stage finds nothing, its top confidence
+    is below `high_confidence`, or its top two predictions are within
+    `min_margin` of each other. If the remote stage fails or finds nothing,
+    the local predictions are returned.
+    """
+    
+    def __init__(
+        self,
+        local: CascadeStage,
+        remote: CascadeStage,
+        high_confidence: Optional[float] = None,
+        min_margin: Optional[float] = None
+    ):
+        self.local = local
+        self.remote = remote
+        self.high_confidence = high_confidence if high_confidence is not None else settings.HIGH_CONFIDENCE_THRESHOLD
+        self.min_margin = min_margin if min_margin is not None else settings.CASCADE_MIN_MARGIN
+        self._latencies = {stage.name: deque(maxlen=1000) for stage in (local, remote)}
+        self._counters = {
+            "requests": 0,
+            "answered_by": {local.name: 0, remote.name: 0},
+            "escalations": {},
+            "remote_errors": 0
+        }
+    
+    @property
+    def version(self) -> str:
+        """Cache key version; thresholds are included since they change answers"""
+        return (
+            f"{self.local.name}-{self.local.version}+{self.remote.name}-{self.remote.version}"
+            f"@{self.high_confidence}/{self.min_margin}"
+        )
+    
+    def escalation_reason(self, predictions: List[Dict]) -> Optional[str]:
+        """Why the local predictions are not good enough, or None to accept them"""
+        if not predictions:
+            return "no_predictions"
+        top = predictions[0].get("confidence", 0)
+        if top < self.high_confidence:
+            return "low_confidence"
+        if len(predictions) > 1 and top - predictions[1].get("confidence", 0) < self.min_margin:
+            return "ambiguous"
+        return None
+    
+    async def _run_stage(self, stage: CascadeStage, features: ImageFeatures, report: Dict) -> List[Dict]:
+        entry = {"name": stage.name}
+        report["stages"].append(entry)
+        start = time.perf_counter()
+        try:
+            return await stage.run(features)
+        finally:
+            elapsed = time.perf_counter() - start
+            entry["latency_ms"] = round(elapsed * 1000, 2)
+            self._latencies[stage.name].append(elapsed)
+    
+    async def identify(self, features: ImageFeatures) -> Tuple[List[Dict], Dict[str, Any]]:
+        """Predictions plus a report of which stages ran, their latency and who answered"""
+        self._counters["requests"] += 1
+        report = {"answered_by": self.local.name, "escalation_reason": None, "stages": []}
+        
+        predictions = await self._run_stage(self.local, features, report)
+        reason = self.escalation_reason(predictions)
+        
+        if reason is not None:
+            report["escalation_reason"] = reason
+            self._counters["escalations"][reason] = self._counters["escalations"].get(reason, 0) + 1
+            try:
+                remote_predictions = await self._run_stage(self.remote, features, report)
+                if remote_predictions:
+                    predictions = remote_predictions
+                    report["answered_by"] = self.remote.name
+            except Exception as e:
+                logger.warning(f"{self.remote.name} stage failed, keeping {self.local.name} predictions: {e}")
+                self._counters["remote_errors"] += 1
+                report["stages"][-1]["error"] = str(e)
+        
+        self._counters["answered_by"][report["answered_by"]] += 1
+        return predictions, report
+    
+    def stats(self) -> Dict[str, Any]:
+        """How often each stage ran and answered, and its latency"""
+        return {
+            "local": self.local.name,
+            "remote": self.remote.name,
+            "high_confidence": self.high_confidence,
+            "min_margin": self.min_margin,
+            **self._counters,
+            "latency": {name: latency_percentiles(samples) for name, samples in self._latencies.items()}
+        }
+
+def _local_stage(provider: str) -> CascadeStage:
+    async def run(features: ImageFeatures) -> List[Dict]:
+        return await classification_executor.submit(provider, features)
+    return CascadeStage(provider, run, lambda: get_provider_version(provider))
+
+def _vision_stage() -> CascadeStage:
+    async def run(features: ImageFeatures) -> List[Dict]:
+        # Deadline and circuit breaker bound the escalation; failures keep the local answer
+        predictions, _ = await guarded_vision.identify(features)
+        return predictions
+    return CascadeStage("vision", run, google_vision_rest_service.VERSION)
+
+# Global cascade instance
+classifier_cascade = ClassifierCascade(_local_stage(settings.CASCADE_LOCAL_PROVIDER), _vision_stage())
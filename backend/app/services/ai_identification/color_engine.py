@@ -0,0 +1,150 @@
+"""
+Vectorized color classification for the free marine classifier
+Pixels are bucketed through a precomputed lookup table instead of a per-pixel if/elif chain
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# Color classes in the order FreeMarineClassifier reports them
+COLOR_NAMES = [
+    "red", "orange", "yellow",
+    "green", "blue", "purple",
+    "brown", "gray", "white",
+    "black", "translucent"
+]
+
+Bound = Tuple[Optional[int], Optional[int]]
+
+# Threshold rules checked in order, first match wins.
+# Each channel bound is (low, high) with exclusive limits; None means unbounded.
+COLOR_RULES: List[Tuple[str, Bound, Bound, Bound]] = [
+    ("white", (200, None), (200, None), (200, None)),
+    ("black", (None, 50), (None, 50), (None, 50)),
+    ("red", (180, None), (None, 100), (None, 100)),
+    ("orange", (180, None), (80, 140), (None, 80)),
+    ("yellow", (180, None), (180, None), (None, 100)),
+    ("green", (None, 100), (120, None), (None, 100)),
+    ("blue", (None, 150), (None, 180), (120, None)),
+    ("purple", (100, None), (None, 100), (100, None)),
+    ("brown", (80, 160), (40, 120), (None, 80)),
+    ("gray", (80, 180), (80, 180), (80, 180)),
+    ("translucent", (180, 220), (150, 200), (150, 200)),
+]
+
+def _in_bound(value: int, bound: Bound) -> bool:
+    low, high = bound
+    return (low is None or value > low) and (high is None or value < high)
+
+class ColorEngine:
+    """
+    Lookup-table color classifier
+    
+    Each channel is quantized into the intervals between rule thresholds, so
+    every pixel in a cell of the (R, G, B) grid gets the same rule outcome.
+    Cells where no rule matches fall back to the dominant-channel comparison.
+    The tables are built on first use, so importing the engine is cheap in
+    processes that never classify.
+    """
+    
+    def __init__(self, rules: Sequence[Tuple[str, Bound, Bound, Bound]] = COLOR_RULES):
+        self.color_names = list(COLOR_NAMES)
+        self.fallback = len(self.color_names)
+        self._class_index = {name: i for i, name in enumerate(self.color_names)}
+        self._rules = rules
+        self.table: Optional[np.ndarray] = None
+    
+    def _build_tables(self, rules):
+        """Quantize each channel at the rule thresholds and precompute the class table"""
+        edges = []
+        for channel in range(3):
+            cuts = set()
+            for rule in rules:
+                low, high = rule[channel + 1]
+                if low is not None:
+                    cuts.add(low + 1)
+                if high is not None:
+                    cuts.add(high)
+            edges.append(np.array(sorted(c for c in cuts if 0 < c < 256), dtype=np.int32))
+        
+        values = np.arange(256)
+        bins = [np.searchsorted(e, values, side="right") for e in edges]
+        sizes = [len(e) + 1 for e in edges]
+        # Smallest channel value in each bin stands in for the whole bin
+        representatives = [np.concatenate(([0], e)) for e in edges]
+        
+        table = np.full(sizes[0] * sizes[1] * sizes[2], self.fallback, dtype=np.uint8)
+        for ri, r in enumerate(representatives[0]):
+            for gi, g in enumerate(representatives[1]):
+                for bi, b in enumerate(representatives[2]):
+                    for name, r_bound, g_bound, b_bound in rules:
+                        if _in_bound(r, r_bound) and _in_bound(g, g_bound) and _in_bound(b, b_bound):
+                            table[(ri * sizes[1] + gi) * sizes[2] + bi] = self._class_index[name]
+                            break
+        
+        # Per-channel offsets so the cell index is a sum of three lookups
+        self._r_offset = (bins[0] * sizes[1] * sizes[2]).astype(np.uint16)
+        self._g_offset = (bins[1] * sizes[2]).astype(np.uint16)
+        self._b_offset = bins[2].astype(np.uint16)
+        self.table = table
+    
+    def classify(self, pixels: np.ndarray) -> np.ndarray:
+        """Map uint8 RGB pixels of shape (..., 3) to color class indices of shape (...)"""
+        pixels = np.asarray(pixels)
+        if pixels.shape[-1] != 3:
+            raise ValueError(f"Expected RGB pixels with a trailing axis of 3, got {pixels.shape}")
+        if pixels.dtype != np.uint8:
+            pixels = np.clip(pixels, 0, 255).astype(np.uint8)
+        
+        if self.table is None:
+            # Offsets are set before the table, so a racing build is harmless
+            self._build_tables(self._rules)
+        r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+        classes = self.table[self._r_offset[r] + self._g_offset[g] + self._b_offset[b]]
+        
+        unmatched = classes == self.fallback
+        if unmatched.any():
+            fr = r[unmatched].astype(np.int16)
+            fg = g[unmatched].astype(np.int16)
+            fb = b[unmatched].astype(np.int16)
+            # Default to nearest color based on the dominant channel
+            fallback = np.full(fr.shape, self._class_index["gray"], dtype=np.uint8)
+            fallback[(fr > fg) & (fr > fb)] = self._class_index["red"]
+            fallback[(fg > fr) & (fg > fb)] = self._class_index["green"]
+            fallback[(fb > fr) & (fb > fg)] = self._class_index["blue"]
+            classes[unmatched] = fallback
+        
+        return classes
+    
+    def fractions(self, pixels: np.ndarray) -> np.ndarray:
+        """
+        Color class fractions for one (H, W, 3) image or a batch of (N, H, W, 3) images
+        Returns an array of shape (len(color_names),) or (N, len(color_names))
+        """
+        pixels = np.asarray(pixels)
+        single = pixels.ndim == 3
+        if single:
+            pixels = pixels[np.newaxis]
+        if pixels.ndim != 4:
+            raise ValueError(f"Expected (H, W, 3) or (N, H, W, 3) pixels, got {pixels.shape}")
+        
+        n = pixels.shape[0]
+        k = len(self.color_names)
+        per_image = pixels.shape[1] * pixels.shape[2]
+        classes = self.classify(pixels).reshape(n, per_image).astype(np.intp)
+        # Offset each image's classes so one bincount covers the whole batch
+        classes += (np.arange(n, dtype=np.intp) * k)[:, np.newaxis]
+        counts = np.bincount(classes.ravel(), minlength=n * k).reshape(n, k)
+        
+        result = counts / per_image
+        return result[0] if single else result
+    
+    def analyze(self, pixels: np.ndarray) -> Union[Dict[str, float], List[Dict[str, float]]]:
+        """Color percentages keyed by color name, per image for batches"""
+        fractions = self.fractions(pixels)
+        if fractions.ndim == 1:
+            return dict(zip(self.color_names, fractions.tolist()))
+        return [dict(zip(self.color_names, row)) for row in fractions.tolist()]
+
+# Global engine instance
+color_engine = ColorEngine()
@@ -0,0 +1,382 @@
+"""
+Nearest-neighbor species matcher
+User-confirmed observations kept as a memory-mapped float16 embedding index, answered by a top-k species vote
+"""
+
+import base64
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+JOURNAL_FILE = "journal.jsonl"
+SPECIES_FIELDS = ("scientific_name", "common_name", "key")
+
+class EmbeddingIndex:
+    """
+    Embeddings of confirmed observations, each labeled with its species
+    
+    Each snapshot generation is a directory holding vectors.npy (float16,
+    memory-mapped read-only so every worker shares the same pages),
+    labels.npy and meta.json, next to that generation's append journal.
+    Appends go to the journal under a file lock and every worker replays
+    it; `snapshot` folds the journal into the next generation. Appending an
+    observation that is already indexed relabels it, so a later correction
+    replaces an earlier confirmation.
+    """
+    
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        dim: int = ImageFeatures.EMBEDDING_DIM,
+        chunk_rows: int = 8192
+    ):
+        self.directory = directory or settings.KNN_INDEX_DIR
+        self.dim = dim
+        self.chunk_rows = chunk_rows
+        self._lock = threading.RLock()
+        self._counters = {"searches": 0, "appends": 0, "snapshots": 0}
+        self._reset(0)
+    
+    def _reset(self, generation: int):
+        self.generation = generation
+        self._base = np.zeros((0, self.dim), dtype=np.float16)
+        self._base_labels = np.zeros(0, dtype=np.int32)
+        self._tail: List[np.ndarray] = []
+        self._tail_labels: List[int] = []
+        self._tail_matrix: Optional[np.ndarray] = None
+        self._species: List[Dict[str, Any]] = []
+        self._species_ids: Dict[str, int] = {}
+        self._rows: Dict[str, int] = {}
+        self._journal_offset = 0
+        self._journal_entries = 0
+    
+    def __len__(self) -> int:
+        return len(self._base) + len(self._tail)
+    
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.directory, f"gen-{generation:06d}")
+    
+    def _journal_path(self, generation: int) -> str:
+        return os.path.join(self._generation_dir(generation), JOURNAL_FILE)
+    
+    def _read_current(self) -> int:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+                return int(f.read().strip())
+        except FileNotFoundError:
+            return 0
+    
+    def _disk_state(self) -> Tuple[int, int]:
+        """The current generation and the size of its journal, as written by any worker"""
+        generation = self._read_current()
+        try:
+            return generation, os.path.getsize(self._journal_path(generation))
+        except FileNotFoundError:
+            return generation, 0
+    
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Serialize journal appends and snapshots across worker processes"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def load(self):
+        """Map the current snapshot and replay its journal"""
+        with self._lock:
+            generation = self._read_current()
+            self._reset(generation)
+            path = self._generation_dir(generation)
+            meta_path = os.path.join(path, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                self._base = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+                # Labels are copied so corrections can relabel snapshot rows
+                self._base_labels = np.array(np.load(os.path.join(path, "labels.npy")), dtype=np.int32)
+                self._species = meta["species"]
+                self._species_ids = {s["scientific_name"]: i for i, s in enumerate(self._species)}
+                self._rows = {obs: row for row, obs in enumerate(meta["observation_ids"]) if obs}
+            self._replay()
+            logger.info(f"Embedding index generation {generation} loaded with {len(self)} vectors")
+    
+    def _replay(self):
+        """Apply journal entries written since the last replay"""
+        try:
+            with open(self._journal_path(self.generation), "rb") as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Only complete lines; a partial one is picked up next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+                self._journal_entries += 1
+        self._journal_offset += end
+    
+    def _apply(self, entry: Dict[str, Any]):
+        label = self._species_id(entry["species"])
+        observation_id = entry["observation_id"]
+        row = self._rows.get(observation_id)
+        if row is not None and row < len(self._base):
+            self._base_labels[row] = label
+            return
+        
+        vector = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float16)
+        if row is not None:
+            self._tail[row - len(self._base)] = vector
+            self._tail_labels[row - len(self._base)] = label
+        else:
+            self._rows[observation_id] = len(self)
+            self._tail.append(vector)
+            self._tail_labels.append(label)
+        self._tail_matrix = None
+    
+    def _species_id(self, species: Dict[str, Any]) -> int:
+        name = species["scientific_name"]
+        if name not in self._species_ids:
+            self._species_ids[name] = len(self._species)
+            self._species.append({field: species.get(field) for field in SPECIES_FIELDS})
+        return self._species_ids[name]
+    
+    def refresh(self):
+        """Pick up appends and snapshots made by other workers"""
+        with self._lock:
+            if self._read_current() != self.generation:
+                self.load()
+            else:
+                self._replay()
+    
+    def _maybe_refresh(self):
+        # Answers must match VERSION, so any snapshot or append on disk is picked up first
+        if self._disk_state() != (self.generation, self._journal_offset):
+            self.refresh()
+    
+    def append(self, observation_id: str, species: Dict[str, Any], vector: np.ndarray):
+        """Add (or relabel) one confirmed observation"""
+        self.append_many([(observation_id, species, vector)])
+    
+    def append_many(self, entries: Sequence[Tuple[str, Dict[str, Any], np.ndarray]]):
+        lines = []
+        for observation_id, species, vector in entries:
+            vector = np.asarray(vector, dtype=np.float16).reshape(-1)
+            if len(vector) != self.dim:
+                raise ValueError(f"Expected a {self.dim}-d embedding, got {len(vector)}")
+            lines.append(json.dumps({
+                "observation_id": observation_id,
+                "species": {field: species.get(field) for field in SPECIES_FIELDS},
+                "vector": base64.b64encode(vector.tobytes()).decode("ascii")
+            }) + "\n")
+        if not lines:
+            return
+        
+        with self._file_lock():
+            generation = self._read_current()
+            os.makedirs(self._generation_dir(generation), exist_ok=True)
+            with open(self._journal_path(generation), "a") as f:
+                f.write("".join(lines))
+        self._counters["appends"] += len(lines)
+        self.refresh()
+        
+        if self._journal_entries >= settings.KNN_SNAPSHOT_EVERY:
+            self.snapshot()
+    
+    def snapshot(self):
+        """Fold the journal into a new snapshot generation"""
+        with self._file_lock(), self._lock:
+            self.refresh()
+            count = len(self)
+            generation = self.generation + 1
+            path = self._generation_dir(generation)
+            staging = path + ".tmp"
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            
+            vectors = np.lib.format.open_memmap(
+                os.path.join(staging, "vectors.npy"), mode="w+", dtype=np.float16, shape=(count, self.dim)
+            )
+            for start in range(0, len(self._base), self.chunk_rows):
+                chunk = self._base[start:start + self.chunk_rows]
+                vectors[start:start + len(chunk)] = chunk
+            if self._tail:
+                vectors[len(self._base):] = self._tail_vectors()
+            vectors.flush()
+            del vectors
+            
+            np.save(os.path.join(staging, "labels.npy"), self._labels())
+            observation_ids: List[Optional[str]] = [None] * count
+            for observation_id, row in self._rows.items():
+                observation_ids[row] = observation_id
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump({
+                    "generation": generation,
+                    "count": count,
+                    "dim": self.dim,
+                    "species": self._species,
+                    "observation_ids": observation_ids
+                }, f)
+            
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(staging, path)
+            current = os.path.join(self.directory, CURRENT_FILE)
+            with open(current + ".tmp", "w") as f:
+                f.write(str(generation))
+            os.replace(current + ".tmp", current)
+            
+            # Workers still mapping the previous generation keep it until they refresh
+            for name in os.listdir(self.directory):
+                if name.startswith("gen-") and not name.endswith(".tmp") and int(name[4:]) < generation - 1:
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            
+            self._counters["snapshots"] += 1
+            self.load()
+    
+    def _tail_vectors(self) -> np.ndarray:
+        if self._tail_matrix is None:
+            self._tail_matrix = np.stack(self._tail) if self._tail else np.zeros((0, self.dim), dtype=np.float16)
+        return self._tail_matrix
+    
+    def _label(self, row: int) -> int:
+        if row < len(self._base):
+            return int(self._base_labels[row])
+        return self._tail_labels[row - len(self._base)]
+    
+    def _labels(self) -> np.ndarray:
+        return np.concatenate([self._base_labels, np.asarray(self._tail_labels, dtype=np.int32)])
+    
+    def search_many(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows by cosine similarity for each of several queries
+        
+        Returns (rows, similarities), both shaped (len(queries), k) and best
+        first; fewer than k columns when the index is smaller than k. The
+        float16 vectors are widened a chunk at a time, so one pass over the
+        index serves every query in the call.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            base, tail = self._base, self._tail_vectors()
+        total = len(base) + len(tail)
+        k = min(k, total)
+        if k == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        
+        buffer = np.empty((min(self.chunk_rows, max(len(base), 1)), self.dim), dtype=np.float32)
+        candidate_rows, candidate_sims = [], []
+        
+        def consider(block: np.ndarray, offset: int):
+            sims = queries @ block.T
+            if sims.shape[1] > k:
+                top = np.argpartition(sims, -k, axis=1)[:, -k:]
+                sims = np.take_along_axis(sims, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(sims.shape[1]), sims.shape)
+            candidate_rows.append(top + offset)
+            candidate_sims.append(sims)
+        
+        for start in range(0, len(base), self.chunk_rows):
+            chunk = base[start:start + self.chunk_rows]
+            widened = buffer[:len(chunk)]
+            np.copyto(widened, chunk)
+            consider(widened, start)
+        if len(tail):
+            consider(tail.astype(np.float32), len(base))
+        
+        rows = np.concatenate(candidate_rows, axis=1)
+        sims = np.concatenate(candidate_sims, axis=1)
+        order = np.argsort(-sims, axis=1)[:, :k]
+        self._counters["searches"] += len(queries)
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(sims, order, axis=1)
+    
+    def vote(self, rows: np.ndarray, similarities: np.ndarray) -> List[Dict]:
+        """
+        Species predictions from one query's neighbors
+        
+        Each neighbor above KNN_MIN_SIMILARITY votes with its similarity.
+        Confidence is the species' share of the vote, scaled by its closest
+        neighbor's similarity so a unanimous but distant match stays low.
+        """
+        votes: Dict[int, Dict[str, float]] = {}
+        for row, similarity in zip(rows, similarities):
+            if similarity < settings.KNN_MIN_SIMILARITY:
+                continue
+            tally = votes.setdefault(self._label(row), {"weight": 0.0, "best": 0.0, "neighbors": 0})
+            tally["weight"] += float(similarity)
+            tally["best"] = max(tally["best"], float(similarity))
+            tally["neighbors"] += 1
+        
+        total = sum(tally["weight"] for tally in votes.values())
+        predictions = [
+            {
+                **self._species[label],
+                "confidence": tally["weight"] / total * tally["best"],
+                "neighbors": tally["neighbors"],
+                "source": "kNN"
+            }
+            for label, tally in votes.items()
+        ]
+        predictions.sort(key=lambda p: p["confidence"], reverse=True)
+        return predictions[:3]
+    
+    def identify_batch(self, images: Sequence[Union[bytes, ImageFeatures]]) -> List[List[Dict]]:
+        """Predictions for several images from a single pass over the index"""
+        if not images:
+            return []
+        self._maybe_refresh()
+        queries = np.stack([ImageFeatures.ensure(image).embedding for image in images])
+        rows, similarities = self.search_many(queries, settings.KNN_NEIGHBORS)
+        with self._lock:
+            return [self.vote(r, s) for r, s in zip(rows, similarities)]
+    
+    def identify_species(self, image_data: Union[bytes, ImageFeatures]) -> List[Dict]:
+        """
+        Identify marine species from the most similar confirmed observations
+        """
+        return self.identify_batch([image_data])[0]
+    
+    @property
+    def VERSION(self) -> str:
+        """
+        Changes with each snapshot and each journal append, so cached answers
+        never miss a confirmation
+        
+        Read from disk rather than the loaded state, so it can be asked
+        without loading the index.
+        """
+        generation, journal_size = self._disk_state()
+        return f"1-g{generation}-j{journal_size}"
+    
+    def contains(self, observation_id: str) -> bool:
+        return observation_id in self._rows
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "vectors": len(self),
+            "snapshot_vectors": len(self._base),
+            "journal_entries": self._journal_entries,
+            "species": len(self._species),
+            **self._counters
+        }
+
+# Global index instance
+embedding_index = EmbeddingIndex()
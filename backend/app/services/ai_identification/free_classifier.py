@@ -5,10 +5,9 @@ No API costs - runs locally
 
 import logging
 import numpy as np
-from typing import List, Dict, Any
-from PIL import Image
-import io
-import hashlib
+from typing import List, Dict, Any, Union
+from app.services.image_features import ImageFeatures
+from .color_engine import color_engine
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +17,9 @@ class FreeMarineClassifier:
     and pattern matching - no external API required
     """
     
+    # Bump when scoring or preprocessing changes so cached identifications are invalidated
+    VERSION = "2"
+    
     def __init__(self):
         self.species_patterns = {
             "clownfish": {
@@ -92,94 +94,50 @@ class FreeMarineClassifier:
             }
         }
     
-    def analyze_image_colors(self, image_data: bytes) -> Dict[str, float]:
+    def analyze_image_colors(self, image_data: Union[bytes, ImageFeatures]) -> Dict[str, float]:
         """
         Analyze dominant colors in the image
         Returns color percentages
         """
         try:
-            img = Image.open(io.BytesIO(image_data))
-            img = img.convert('RGB')
-            img = img.resize((150, 150))  # Resize for faster processing
-            
-            pixels = np.array(img)
-            
-            # Calculate color dominance
-            colors = {
-                "red": 0, "orange": 0, "yellow": 0,
-                "green": 0, "blue": 0, "purple": 0,
-                "brown": 0, "gray": 0, "white": 0,
-                "black": 0, "translucent": 0
-            }
-            
-            total_pixels = pixels.shape[0] * pixels.shape[1]
-            
-            for row in pixels:
-                for pixel in row:
-                    r, g, b = pixel
-                    
-                    # Classify pixel color - improved thresholds
-                    if r > 200 and g > 200 and b > 200:
-                        colors["white"] += 1
-                    elif r < 50 and g < 50 and b < 50:
-                        colors["black"] += 1
-                    elif r > 180 and g < 100 and b < 100:
-                        colors["red"] += 1
-                    elif r > 180 and 80 < g < 140 and b < 80:
-                        colors["orange"] += 1
-                    elif r > 180 and g > 180 and b < 100:
-                        colors["yellow"] += 1
-                    elif r < 100 and g > 120 and b < 100:
-                        colors["green"] += 1
-                    elif r < 150 and g < 180 and b > 120:
-                        colors["blue"] += 1
-                    elif r > 100 and g < 100 and b > 100:
-                        colors["purple"] += 1
-                    elif 80 < r < 160 and 40 < g < 120 and b < 80:
-                        colors["brown"] += 1
-                    elif 80 < r < 180 and 80 < g < 180 and 80 < b < 180:
-                        colors["gray"] += 1
-                    elif 180 < r < 220 and 150 < g < 200 and 150 < b < 200:
-                        colors["translucent"] += 1
-                    else:
-                        # Default to nearest color based on RGB values
-                        if b > r and b > g:
-                            colors["blue"] += 1
-                        elif g > r and g > b:
-                            colors["green"] += 1
-                        elif r > g and r > b:
-                            colors["red"] += 1
-                        else:
-                            colors["gray"] += 1
-            
-            # Convert to percentages
-            for color in colors:
-                colors[color] = colors[color] / total_pixels
+            # 150x150 RGB view, resized for faster processing
+            pixels = ImageFeatures.ensure(image_data).rgb_thumbnail
             
-            return colors
+            # Lookup-table classification, identical to the per-pixel thresholds
+            return color_engine.analyze(pixels)
             
         except Exception as e:
             logger.error(f"Error analyzing image colors: {e}")
             return {}
     
-    def calculate_shape_score(self, image_data: bytes) -> Dict[str, float]:
+    def analyze_image_colors_batch(self, pixels: np.ndarray) -> List[Dict[str, float]]:
+        """
+        Analyze dominant colors for a batch of decoded images
+        Takes a uint8 array of shape (N, H, W, 3), returns one color dict per image
+        """
+        try:
+            pixels = np.asarray(pixels)
+            if pixels.ndim != 4:
+                raise ValueError(f"Expected (N, H, W, 3) pixels, got {pixels.shape}")
+            return color_engine.analyze(pixels)
+        except Exception as e:
+            logger.error(f"Error analyzing batch colors: {e}")
+            return [{} for _ in range(len(pixels))]
+    
+    def calculate_shape_score(self, image_data: Union[bytes, ImageFeatures]) -> Dict[str, float]:
         """
         Analyze image shape characteristics
         """
         try:
-            img = Image.open(io.BytesIO(image_data))
-            img = img.convert('L')  # Convert to grayscale
-            img = img.resize((100, 100))
-            
-            pixels = np.array(img)
+            features = ImageFeatures.ensure(image_data)
             
-            # Simple edge detection
-            edges = np.gradient(pixels)
-            edge_magnitude = np.sqrt(edges[0]**2 + edges[1]**2)
+            # Simple edge detection on the 100x100 grayscale view
+            edge_magnitude = features.edge_magnitude
             
             # Calculate shape metrics
-            aspect_ratio = img.width / img.height
-            edge_density = np.sum(edge_magnitude > 20) / (img.width * img.height)
+            height, width = features.grayscale.shape
+            aspect_ratio = width / height
+            edge_density = np.sum(edge_magnitude > 20) / (width * height)
             
             shapes = {
                 "oval": 1.0 if 0.8 < aspect_ratio < 1.2 else 0.5,
@@ -200,15 +158,16 @@ class FreeMarineClassifier:
             logger.error(f"Error analyzing shape: {e}")
             return {}
     
-    def identify_species(self, image_data: bytes) -> List[Dict[str, Any]]:
+    def identify_species(self, image_data: Union[bytes, ImageFeatures]) -> List[Dict[str, Any]]:
         """
         Identify marine species from image using free methods
         """
         logger.info("Using free marine classifier")
+        features = ImageFeatures.ensure(image_data)
         
         # Analyze image
-        color_analysis = self.analyze_image_colors(image_data)
-        shape_analysis = self.calculate_shape_score(image_data)
+        color_analysis = self.analyze_image_colors(features)
+        shape_analysis = self.calculate_shape_score(features)
         
         # Find dominant colors
         dominant_colors = sorted(color_analysis.items(), key=lambda x: x[1], reverse=True)[:3]
@@ -268,7 +227,7 @@ class FreeMarineClassifier:
         # If no good matches, return some defaults based on image hash
         if not results:
             # Use image hash to deterministically select species
-            image_hash = hashlib.md5(image_data).hexdigest()
+            image_hash = features.content_hash
             hash_value = int(image_hash[:8], 16)
             
             species_list = list(self.species_patterns.values())
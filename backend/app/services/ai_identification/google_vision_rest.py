@@ -1,27 +1,135 @@
 """
 Google Vision API integration using REST API
+Concurrent identifications are coalesced into batched images:annotate calls over a pooled connection
 """
 
 import os
+import asyncio
 import logging
-import requests
+import httpx
 import base64
-from typing import List, Dict
-import json
+from typing import List, Dict, Optional, Tuple
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
 
 logger = logging.getLogger(__name__)
 
+FEATURES = [
+    {"type": "LABEL_DETECTION", "maxResults": 10},
+    {"type": "WEB_DETECTION", "maxResults": 5},
+    {"type": "OBJECT_LOCALIZATION", "maxResults": 10}
+]
+
+# Extract marine-related labels
+MARINE_KEYWORDS = [
+    'fish', 'shark', 'ray', 'turtle', 'dolphin', 'whale', 'coral',
+    'octopus', 'squid', 'jellyfish', 'crab', 'lobster', 'shrimp',
+    'seal', 'sea lion', 'marine', 'ocean', 'underwater', 'reef',
+    'anemone', 'clownfish', 'grouper', 'barracuda', 'stingray'
+]
+
+# Map to known species
+SPECIES_MAPPING = {
+    "clownfish": {"scientific_name": "Amphiprion ocellaris", "common_name": "Common Clownfish"},
+    "anemonefish": {"scientific_name": "Amphiprion ocellaris", "common_name": "Common Clownfish"},
+    "shark": {"scientific_name": "Carcharodon carcharias", "common_name": "Great White Shark"},
+    "sea turtle": {"scientific_name": "Chelonia mydas", "common_name": "Green Sea Turtle"},
+    "turtle": {"scientific_name": "Chelonia mydas", "common_name": "Green Sea Turtle"},
+    "manta ray": {"scientific_name": "Mobula birostris", "common_name": "Giant Manta Ray"},
+    "ray": {"scientific_name": "Mobula birostris", "common_name": "Giant Manta Ray"},
+    "dolphin": {"scientific_name": "Tursiops truncatus", "common_name": "Bottlenose Dolphin"},
+}
+
+class VisionAPIError(Exception):
+    """
+    Raised when Google Vision cannot identify an image
+    
+    `retryable` marks transient failures (timeouts, connection errors,
+    throttling and 5xx responses) as opposed to answers that will not change.
+    """
+    
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+def prepare_image(features: ImageFeatures) -> bytes:
+    """
+    Bytes to send to Vision for an upload
+    
+    Vision gains nothing from more than about 1024 px, so unless
+    VISION_PREPROCESS_ENABLED is off the upload is downscaled, turned
+    upright and re-encoded as JPEG. Images that cannot be decoded here are
+    sent as they are. CPU bound, call it from a worker thread.
+    """
+    if not settings.VISION_PREPROCESS_ENABLED:
+        return features.data
+    try:
+        return features.vision_payload(
+            settings.VISION_MAX_SIDE, settings.VISION_JPEG_QUALITY, settings.VISION_CROP_SUBJECT
+        )
+    except Exception as e:
+        logger.warning(f"Could not preprocess image for Vision, sending the original: {e}")
+        return features.data
+
 class GoogleVisionRESTService:
-    def __init__(self):
-        self.api_key = os.getenv("GOOGLE_VISION_API_KEY")
-        self.base_url = "https://vision.googleapis.com/v1/images:annotate"
+    """
+    Async Google Vision client with micro-batching
+    
+    Calls to `identify_species` made within `batch_window` seconds of each
+    other share one images:annotate request of up to `batch_size` images;
+    each caller still gets back only the predictions for its own image.
+    """
+    
+    VERSION = "2"  # Bump when the label-to-species mapping or image preprocessing changes
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        batch_window: Optional[float] = None,
+        timeout: Optional[float] = None
+    ):
+        self.api_key = api_key or os.getenv("GOOGLE_VISION_API_KEY")
+        self.base_url = base_url or settings.GOOGLE_VISION_API_URL
+        self.batch_size = max(1, min(batch_size or settings.VISION_BATCH_SIZE, 16))
+        self.batch_window = batch_window if batch_window is not None else settings.VISION_BATCH_WINDOW_MS / 1000
+        self.timeout = timeout or settings.VISION_TIMEOUT
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[bytes, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._counters = {"images": 0, "calls": 0, "errors": 0, "image_bytes": 0}
         
         if not self.api_key:
             logger.warning("Google Vision API key not configured")
         else:
             logger.info(f"Google Vision REST API configured")
     
-    def identify_species(self, image_data: bytes) -> List[Dict]:
+    def _get_client(self) -> httpx.AsyncClient:
+        """Pooled client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # Connections belong to the loop that opened them
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.VISION_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.VISION_MAX_CONNECTIONS
+                ),
+                headers={"Content-Type": "application/json"}
+            )
+            self._client_loop = loop
+        return self._client
+    
+    async def close(self):
+        """Close the pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+    
+    async def identify_species(self, image_data: bytes) -> List[Dict]:
         """
         Identify marine species using Google Vision REST API
         """
@@ -29,142 +137,151 @@ class GoogleVisionRESTService:
             logger.warning("Using mock data - no API key")
             return self._mock_identification()
         
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((image_data, future))
+        self._counters["images"] += 1
+        
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        if self._pending:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        if batch:
+            asyncio.ensure_future(self._annotate(batch))
+    
+    async def _annotate(self, batch: List[Tuple[bytes, asyncio.Future]]):
+        """Send one images:annotate call and hand each caller its own response"""
+        self._counters["calls"] += 1
+        contents = [base64.b64encode(image_data).decode('utf-8') for image_data, _ in batch]
+        self._counters["image_bytes"] += sum(len(content) for content in contents)
+        request_data = {
+            "requests": [{"image": {"content": content}, "features": FEATURES} for content in contents]
+        }
+        
         try:
-            # Encode image as base64
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            
-            # Prepare request
-            request_data = {
-                "requests": [{
-                    "image": {
-                        "content": image_base64
-                    },
-                    "features": [
-                        {"type": "LABEL_DETECTION", "maxResults": 10},
-                        {"type": "WEB_DETECTION", "maxResults": 5},
-                        {"type": "OBJECT_LOCALIZATION", "maxResults": 10}
-                    ]
-                }]
-            }
-            
-            # Make API request
-            response = requests.post(
-                f"{self.base_url}?key={self.api_key}",
-                json=request_data,
-                headers={"Content-Type": "application/json"}
-            )
-            
+            response = await self._get_client().post(f"{self.base_url}?key={self.api_key}", json=request_data)
             if response.status_code != 200:
-                logger.error(f"Google Vision API error: {response.status_code} - {response.text}")
-                return self._mock_identification()
-            
+                raise VisionAPIError(
+                    f"Google Vision API error: {response.status_code} - {response.text[:200]}",
+                    retryable=response.status_code == 429 or response.status_code >= 500
+                )
             result = response.json()
-            
             if "error" in result:
-                logger.error(f"Google Vision API error: {result['error']}")
-                return self._mock_identification()
-            
-            # Process response
-            annotations = result.get("responses", [{}])[0]
-            
-            # Extract marine-related labels
-            marine_keywords = [
-                'fish', 'shark', 'ray', 'turtle', 'dolphin', 'whale', 'coral',
-                'octopus', 'squid', 'jellyfish', 'crab', 'lobster', 'shrimp',
-                'seal', 'sea lion', 'marine', 'ocean', 'underwater', 'reef',
-                'anemone', 'clownfish', 'grouper', 'barracuda', 'stingray'
-            ]
-            
-            identified_species = []
-            
-            # Process label annotations
-            labels = annotations.get("labelAnnotations", [])
-            for label in labels:
-                label_lower = label.get("description", "").lower()
-                if any(keyword in label_lower for keyword in marine_keywords):
-                    identified_species.append({
-                        "label": label.get("description"),
-                        "confidence": label.get("score", 0),
-                        "source": "labels"
-                    })
-            
-            # Process web detection
-            web_detection = annotations.get("webDetection", {})
-            web_entities = web_detection.get("webEntities", [])
-            for entity in web_entities[:3]:
-                desc = entity.get("description", "").lower()
-                if any(keyword in desc for keyword in marine_keywords):
-                    identified_species.append({
-                        "label": entity.get("description"),
-                        "confidence": entity.get("score", 0),
-                        "source": "web"
-                    })
-            
-            # Process object localization
-            objects = annotations.get("localizedObjectAnnotations", [])
-            for obj in objects:
-                name_lower = obj.get("name", "").lower()
-                if any(keyword in name_lower for keyword in marine_keywords):
-                    identified_species.append({
-                        "label": obj.get("name"),
-                        "confidence": obj.get("score", 0),
-                        "source": "objects"
-                    })
-            
-            # Map to known species
-            species_mapping = {
-                "clownfish": {"scientific_name": "Amphiprion ocellaris", "common_name": "Common Clownfish"},
-                "anemonefish": {"scientific_name": "Amphiprion ocellaris", "common_name": "Common Clownfish"},
-                "shark": {"scientific_name": "Carcharodon carcharias", "common_name": "Great White Shark"},
-                "sea turtle": {"scientific_name": "Chelonia mydas", "common_name": "Green Sea Turtle"},
-                "turtle": {"scientific_name": "Chelonia mydas", "common_name": "Green Sea Turtle"},
-                "manta ray": {"scientific_name": "Mobula birostris", "common_name": "Giant Manta Ray"},
-                "ray": {"scientific_name": "Mobula birostris", "common_name": "Giant Manta Ray"},
-                "dolphin": {"scientific_name": "Tursiops truncatus", "common_name": "Bottlenose Dolphin"},
-            }
-            
-            # Convert to final format
-            final_results = []
-            seen_species = set()
-            
-            for item in identified_species:
-                label_lower = item["label"].lower()
-                
-                # Try to map to known species
-                for key, value in species_mapping.items():
-                    if key in label_lower and value["scientific_name"] not in seen_species:
-                        final_results.append({
-                            "scientific_name": value["scientific_name"],
-                            "common_name": value["common_name"],
-                            "confidence": item["confidence"],
-                            "source": f"Google Vision ({item['source']})",
-                            "original_label": item["label"]
-                        })
-                        seen_species.add(value["scientific_name"])
-                        break
-            
-            # If no marine species found, return the best guess
-            if not final_results and labels:
-                # Just return top label as unknown species
-                top_label = labels[0]
-                final_results.append({
-                    "scientific_name": None,
-                    "common_name": top_label.get("description", "Unknown"),
-                    "confidence": top_label.get("score", 0),
-                    "source": "Google Vision (labels)"
-                })
-            
-            return final_results[:5] if final_results else self._mock_identification()
-            
+                raise VisionAPIError(f"Google Vision API error: {result['error']}")
+            responses = result.get("responses", [])
         except Exception as e:
             logger.error(f"Error calling Google Vision API: {e}")
-            return self._mock_identification()
+            self._counters["errors"] += 1
+            if isinstance(e, VisionAPIError):
+                error = e
+            else:
+                error = VisionAPIError(str(e) or type(e).__name__, retryable=isinstance(e, httpx.TransportError))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            annotations = responses[i] if i < len(responses) else {}
+            try:
+                if "error" in annotations:
+                    raise VisionAPIError(f"Google Vision API error: {annotations['error']}")
+                future.set_result(self._parse_annotations(annotations))
+            except Exception as e:
+                future.set_exception(e)
+    
+    def _parse_annotations(self, annotations: Dict) -> List[Dict]:
+        """Map one image's annotations to known species"""
+        identified_species = []
+        
+        # Process label annotations
+        labels = annotations.get("labelAnnotations", [])
+        for label in labels:
+            label_lower = label.get("description", "").lower()
+            if any(keyword in label_lower for keyword in MARINE_KEYWORDS):
+                identified_species.append({
+                    "label": label.get("description"),
+                    "confidence": label.get("score", 0),
+                    "source": "labels"
+                })
+        
+        # Process web detection
+        web_detection = annotations.get("webDetection", {})
+        web_entities = web_detection.get("webEntities", [])
+        for entity in web_entities[:3]:
+            desc = entity.get("description", "").lower()
+            if any(keyword in desc for keyword in MARINE_KEYWORDS):
+                identified_species.append({
+                    "label": entity.get("description"),
+                    "confidence": entity.get("score", 0),
+                    "source": "web"
+                })
+        
+        # Process object localization
+        objects = annotations.get("localizedObjectAnnotations", [])
+        for obj in objects:
+            name_lower = obj.get("name", "").lower()
+            if any(keyword in name_lower for keyword in MARINE_KEYWORDS):
+                identified_species.append({
+                    "label": obj.get("name"),
+                    "confidence": obj.get("score", 0),
+                    "source": "objects"
+                })
+        
+        # Convert to final format
+        final_results = []
+        seen_species = set()
+        
+        for item in identified_species:
+            label_lower = item["label"].lower()
+            
+            # Try to map to known species
+            for key, value in SPECIES_MAPPING.items():
+                if key in label_lower and value["scientific_name"] not in seen_species:
+                    final_results.append({
+                        "scientific_name": value["scientific_name"],
+                        "common_name": value["common_name"],
+                        "confidence": item["confidence"],
+                        "source": f"Google Vision ({item['source']})",
+                        "original_label": item["label"]
+                    })
+                    seen_species.add(value["scientific_name"])
+                    break
+        
+        # If no marine species found, return the best guess
+        if not final_results and labels:
+            # Just return top label as unknown species
+            top_label = labels[0]
+            final_results.append({
+                "scientific_name": None,
+                "common_name": top_label.get("description", "Unknown"),
+                "confidence": top_label.get("score", 0),
+                "source": "Google Vision (labels)"
+            })
+        
+        return final_results[:5] if final_results else self._mock_identification()
     
     def _mock_identification(self) -> List[Dict]:
         """Return mock data when API fails - raises exception to trigger fallback"""
         # Instead of returning hardcoded data, raise an exception
         # This will trigger the fallback to the better MockIdentificationService
-        raise Exception("Google Vision API billing not enabled, use mock service")
+        raise VisionAPIError("Google Vision API billing not enabled, use mock service")
+    
+    def stats(self) -> Dict[str, int]:
+        """Images sent, annotate calls made, failed calls and base64 image bytes uploaded"""
+        return {**self._counters, "pending": len(self._pending)}
 
 # Global service instance
-google_vision_rest_service = GoogleVisionRESTService()
\ No newline at end of file
+google_vision_rest_service = GoogleVisionRESTService()
@@ -0,0 +1,281 @@
+"""
+In-process spatial prior over species occurrences
+Geohash-bucketed observation counts re-rank predictions by where the photo was taken
+"""
+
+import asyncio
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+OBSERVATIONS_QUERY = """
+MATCH (o:Observation)-[:IDENTIFIED_AS]->(s:Species)
+WHERE o.latitude IS NOT NULL AND o.longitude IS NOT NULL
+  AND ($since IS NULL OR o.timestamp >= datetime({epochMillis: $since}))
+RETURN o.id as id, o.latitude as latitude, o.longitude as longitude,
+       o.timestamp.epochMillis as timestamp,
+       s.scientific_name as scientific_name, s.common_name as common_name
+"""
+
+RANGES_QUERY = """
+MATCH (s:Species)-[:FOUND_IN]->(l:Location)
+WHERE l.latitude IS NOT NULL AND l.longitude IS NOT NULL
+RETURN l.latitude as latitude, l.longitude as longitude,
+       s.scientific_name as scientific_name, s.common_name as common_name
+"""
+
+def _cell_bits(precision: int) -> Tuple[int, int]:
+    """Longitude and latitude bits in a geohash of `precision` characters"""
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+def _cell_indices(lat: float, lon: float, precision: int) -> Tuple[int, int]:
+    """Row and column of the cell containing a point, longitude wrapping at the antimeridian"""
+    lon_bits, lat_bits = _cell_bits(precision)
+    row = min(int((lat + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    column = int(((lon + 180.0) % 360.0) / 360.0 * (1 << lon_bits))
+    return max(row, 0), column
+
+@lru_cache(maxsize=65536)
+def _encode_indices(row: int, column: int, precision: int) -> str:
+    lon_bits, lat_bits = _cell_bits(precision)
+    value = 0
+    # Geohash interleaves bits starting with longitude
+    for k in range(5 * precision):
+        if k % 2 == 0:
+            value = (value << 1) | ((column >> (lon_bits - 1 - k // 2)) & 1)
+        else:
+            value = (value << 1) | ((row >> (lat_bits - 1 - k // 2)) & 1)
+    return "".join(_BASE32[(value >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+def geohash(lat: float, lon: float, precision: int) -> str:
+    return _encode_indices(*_cell_indices(lat, lon, precision), precision)
+
+@lru_cache(maxsize=65536)
+def _neighborhood_cells(row: int, column: int, precision: int) -> Tuple[str, ...]:
+    lon_bits, lat_bits = _cell_bits(precision)
+    cells = []
+    for d_row in (0, -1, 1):
+        r = row + d_row
+        if not 0 <= r < (1 << lat_bits):
+            continue
+        for d_column in (0, -1, 1):
+            cell = _encode_indices(r, (column + d_column) % (1 << lon_bits), precision)
+            if cell not in cells:
+                cells.append(cell)
+    return tuple(cells)
+
+def geohash_neighborhood(lat: float, lon: float, precision: int) -> Tuple[str, ...]:
+    """The cell containing a point and its eight neighbours, fewer at the poles"""
+    return _neighborhood_cells(*_cell_indices(lat, lon, precision), precision)
+
+class LocationPrior:
+    """
+    Thread-safe table of species occurrence weights per geohash cell
+    
+    Each observation with coordinates adds one to its species in its cell,
+    and each FOUND_IN range adds LOCATION_PRIOR_RANGE_WEIGHT at the range's
+    location. A prediction's score is its confidence times the species'
+    smoothed local-to-global frequency ratio raised to LOCATION_PRIOR_WEIGHT,
+    where local means the cell of the photo and its neighbours.
+    
+    Species are numbered and each cell keeps its counts as a dict plus a
+    packed (ids, weights) array pair rebuilt only after the cell changes, so
+    summing a neighbourhood is one bincount however many species it holds.
+    """
+    
+    def __init__(self, precision: Optional[int] = None):
+        self.precision = precision or settings.LOCATION_PRIOR_PRECISION
+        self._species_ids: Dict[str, int] = {}
+        self._species: List[str] = []
+        self._names: Dict[str, str] = {}
+        self._counts: Dict[str, Dict[int, float]] = {}
+        self._packed: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._global: Dict[int, float] = {}
+        self._global_total = 0.0
+        self._ranges: Set[Tuple[str, str]] = set()
+        self._watermark: Optional[int] = None
+        self._at_watermark: Set[str] = set()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._counters = {"reranks": 0, "refreshes": 0, "observations": 0, "surfaced": 0}
+    
+    def _add(self, cell: str, name: str, weight: float):
+        species = self._species_ids.get(name)
+        if species is None:
+            species = self._species_ids[name] = len(self._species)
+            self._species.append(name)
+        cell_counts = self._counts.setdefault(cell, {})
+        cell_counts[species] = cell_counts.get(species, 0.0) + weight
+        self._global[species] = self._global.get(species, 0.0) + weight
+        self._global_total += weight
+        if cell_counts[species] <= 0:
+            del cell_counts[species]
+        if self._global[species] <= 0:
+            del self._global[species]
+        self._packed.pop(cell, None)
+    
+    def _cell_arrays(self, cell: str) -> Tuple[np.ndarray, np.ndarray]:
+        packed = self._packed.get(cell)
+        if packed is None:
+            cell_counts = self._counts[cell]
+            packed = self._packed[cell] = (
+                np.fromiter(cell_counts.keys(), dtype=np.int64, count=len(cell_counts)),
+                np.fromiter(cell_counts.values(), dtype=np.float64, count=len(cell_counts))
+            )
+        return packed
+    
+    def refresh(self, db) -> int:
+        """
+        Fold in observations created since the last refresh and re-read ranges
+        
+        Observations are fetched from the timestamp of the newest one already
+        counted; ids seen at that timestamp are skipped so none count twice.
+        Returns the number of new observations.
+        """
+        ranges = {}
+        for record in db.execute_query(RANGES_QUERY):
+            key = (geohash(record["latitude"], record["longitude"], self.precision), record["scientific_name"])
+            ranges[key] = record["common_name"]
+        records = db.execute_query(OBSERVATIONS_QUERY, {"since": self._watermark})
+        
+        added = 0
+        with self._lock:
+            range_weight = settings.LOCATION_PRIOR_RANGE_WEIGHT
+            for cell, species in self._ranges - ranges.keys():
+                self._add(cell, species, -range_weight)
+            for (cell, species), common_name in ranges.items():
+                if common_name:
+                    self._names[species] = common_name
+                if (cell, species) not in self._ranges:
+                    self._add(cell, species, range_weight)
+            self._ranges = set(ranges)
+            
+            seen = self._at_watermark
+            for record in records:
+                timestamp = record["timestamp"]
+                if record["id"] in seen or timestamp is None:
+                    continue
+                if record["common_name"]:
+                    self._names[record["scientific_name"]] = record["common_name"]
+                self._add(
+                    geohash(record["latitude"], record["longitude"], self.precision),
+                    record["scientific_name"],
+                    1.0
+                )
+                if self._watermark is None or timestamp > self._watermark:
+                    self._watermark = timestamp
+                    self._at_watermark = set()
+                if timestamp == self._watermark:
+                    self._at_watermark.add(record["id"])
+                added += 1
+            
+            self._counters["observations"] += added
+            self._counters["refreshes"] += 1
+            self._loaded = True
+        return added
+    
+    def load(self, db) -> int:
+        """Populate the table from every located observation and range"""
+        count = self.refresh(db)
+        logger.info(f"Loaded {count} located observations and {len(self._ranges)} ranges into the location prior")
+        return count
+    
+    async def refresh_periodically(self, get_db: Callable[[], Any]):
+        """Refresh every LOCATION_PRIOR_REFRESH_INTERVAL seconds until cancelled"""
+        while True:
+            await asyncio.sleep(settings.LOCATION_PRIOR_REFRESH_INTERVAL)
+            try:
+                added = await run_in_threadpool(self.refresh, get_db())
+                if added:
+                    logger.info(f"Added {added} observations to the location prior")
+            except Exception as e:
+                logger.warning(f"Could not refresh location prior: {e}")
+    
+    def _neighborhood(self, lat: float, lon: float) -> np.ndarray:
+        """Weight of every species id summed over the cell of a point and its neighbours"""
+        parts = [self._cell_arrays(cell) for cell in geohash_neighborhood(lat, lon, self.precision) if cell in self._counts]
+        if not parts:
+            return np.zeros(len(self._species))
+        ids = np.concatenate([p[0] for p in parts])
+        weights = np.concatenate([p[1] for p in parts])
+        return np.bincount(ids, weights, minlength=len(self._species))
+    
+    def rerank(self, predictions: List[Dict], lat: float, lon: float) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Predictions re-ordered by location score, and species common nearby that they miss
+        
+        Predictions are copied, not modified, with `location_score` and
+        `location_lift` added. Sparse or empty neighbourhoods give a lift near
+        one, leaving the classifier's order as it was.
+        """
+        alpha = settings.LOCATION_PRIOR_SMOOTHING
+        exponent = settings.LOCATION_PRIOR_WEIGHT
+        suggestions = settings.LOCATION_PRIOR_SUGGESTIONS
+        with self._lock:
+            weights = self._neighborhood(lat, lon)
+            total = float(weights.sum())
+            species_count = len(self._global) + 1
+            global_total = self._global_total
+            
+            ranked = []
+            predicted = set()
+            for prediction in predictions:
+                species = self._species_ids.get(prediction.get("scientific_name"))
+                predicted.add(species)
+                local = float(weights[species]) if species is not None else 0.0
+                global_share = (self._global.get(species, 0.0) + 1) / (global_total + species_count)
+                local_share = (local + alpha * global_share) / (total + alpha)
+                lift = local_share / global_share
+                ranked.append({
+                    **prediction,
+                    "location_score": round(prediction.get("confidence", 0.0) * lift ** exponent, 4),
+                    "location_lift": round(lift, 3)
+                })
+            
+            nearby = []
+            if total > 0 and suggestions > 0:
+                # Enough of the most frequent species to fill the suggestions past predicted ones
+                top = min(suggestions + len(predicted), len(weights))
+                candidates = np.argpartition(-weights, top - 1)[:top]
+                for species in candidates[np.argsort(-weights[candidates], kind="stable")]:
+                    share = float(weights[species]) / total
+                    if len(nearby) >= suggestions or share < settings.LOCATION_PRIOR_MIN_SHARE:
+                        break
+                    if int(species) not in predicted:
+                        name = self._species[species]
+                        nearby.append({
+                            "scientific_name": name,
+                            "common_name": self._names.get(name),
+                            "local_share": round(share, 3),
+                            "source": "location_prior"
+                        })
+            self._counters["reranks"] += 1
+            self._counters["surfaced"] += len(nearby)
+        
+        ranked.sort(key=lambda p: p["location_score"], reverse=True)
+        return ranked, nearby
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "precision": self.precision,
+                "cells": len(self._counts),
+                "species": len(self._global),
+                "ranges": len(self._ranges),
+                "watermark": self._watermark,
+                **self._counters
+            }
+
+# Global prior instance, loaded and refreshed in the application lifespan
+location_prior = LocationPrior()
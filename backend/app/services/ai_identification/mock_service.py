@@ -1,13 +1,50 @@
+import asyncio
+import math
 import random
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
 
 logger = logging.getLogger(__name__)
 
+# Standard normal quantile of the 99th percentile
+Z_99 = 2.3263478740408408
+
+class MockProviderError(Exception):
+    """Synthetic provider failure, retryable like a transient remote error"""
+    
+    retryable = True
+
 class MockIdentificationService:
-    """Mock identification service for testing when Google Vision is not available"""
+    """
+    Mock identification service for testing when Google Vision is not available
+    
+    Results are drawn from a random generator seeded with the image's content
+    hash, so the same image always gets the same predictions, in any process
+    and under any interleaving of requests. Nothing is shared between calls.
     
-    def __init__(self):
+    `identify` also simulates a remote provider: it waits a lognormal latency
+    with the given median and p99 and fails for an `error_rate` fraction of
+    images. Both are drawn from the hash and `seed`, so a load test replays
+    exactly; change the seed to draw a different set of slow and failing images.
+    """
+    
+    # Bump when results change so cached identifications are invalidated
+    VERSION = "2"
+    
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        latency_p50_ms: Optional[float] = None,
+        latency_p99_ms: Optional[float] = None,
+        error_rate: Optional[float] = None
+    ):
+        self.seed = settings.MOCK_SEED if seed is None else seed
+        self.latency_p50_ms = settings.MOCK_LATENCY_P50_MS if latency_p50_ms is None else latency_p50_ms
+        self.latency_p99_ms = settings.MOCK_LATENCY_P99_MS if latency_p99_ms is None else latency_p99_ms
+        self.error_rate = settings.MOCK_ERROR_RATE if error_rate is None else error_rate
+        self._counters = {"calls": 0, "failures": 0, "latency_ms": 0.0}
         # Use species that exist in our database
         self.mock_species = [
             {
@@ -61,43 +98,29 @@ class MockIdentificationService:
                 "labels": ["whale", "blue whale", "marine mammal", "cetacean", "largest animal"]
             }
         ]
-        # Track last returned species to avoid repetition
-        self.last_returned = []
     
-    def identify_species(self, image_data: bytes) -> List[Dict[str, Any]]:
+    def _rng(self, features: ImageFeatures, stream: str) -> random.Random:
+        """Generator private to one call, seeded from the image and the purpose of the draw"""
+        return random.Random(f"{stream}:{features.content_hash}")
+    
+    def identify_species(self, image_data: Union[bytes, ImageFeatures]) -> List[Dict[str, Any]]:
         """
         Mock species identification
-        Returns random marine species with confidence scores
+        Returns 2-3 marine species with confidence scores chosen by the image hash
         """
-        logger.info("Using mock identification service")
-        
-        # Create a pool of species excluding the last 3 returned to avoid repetition
-        available_species = [s for s in self.mock_species 
-                           if s["scientific_name"] not in self.last_returned]
-        
-        # If we've used most species, reset the history
-        if len(available_species) < 3:
-            self.last_returned = []
-            available_species = self.mock_species.copy()
+        rng = self._rng(ImageFeatures.ensure(image_data), "predictions")
         
         # Randomly select 2-3 species
-        num_results = random.randint(2, 3)
-        selected_species = random.sample(available_species, min(num_results, len(available_species)))
-        
-        # Update history with the primary (first) species
-        if selected_species:
-            self.last_returned.append(selected_species[0]["scientific_name"])
-            # Keep only last 3 to avoid too much restriction
-            if len(self.last_returned) > 3:
-                self.last_returned.pop(0)
+        num_results = rng.randint(2, 3)
+        selected_species = rng.sample(self.mock_species, num_results)
         
         results = []
         # Vary the base confidence more
-        confidence_base = random.uniform(0.75, 0.92)
+        confidence_base = rng.uniform(0.75, 0.92)
         
         for i, species in enumerate(selected_species):
             # Decreasing confidence for each result
-            confidence = max(0.3, confidence_base - (i * 0.2) + random.uniform(-0.05, 0.05))
+            confidence = max(0.3, confidence_base - (i * 0.2) + rng.uniform(-0.05, 0.05))
             
             results.append({
                 "common_name": species["common_name"],
@@ -106,5 +129,43 @@ class MockIdentificationService:
                 "labels": species["labels"]
             })
         
-        logger.info(f"Mock identification returned {len(results)} results: {results[0]['common_name']}")
-        return results
\ No newline at end of file
+        logger.debug(f"Mock identification returned {len(results)} results: {results[0]['common_name']}")
+        return results
+    
+    def latency(self, features: ImageFeatures) -> float:
+        """Synthetic response time for an image, in seconds"""
+        if self.latency_p50_ms <= 0:
+            return 0.0
+        # Lognormal: the median fixes mu, the p99 fixes sigma
+        sigma = max(0.0, math.log(max(self.latency_p99_ms, self.latency_p50_ms) / self.latency_p50_ms)) / Z_99
+        z = self._rng(features, f"latency:{self.seed}").gauss(0.0, 1.0)
+        return self.latency_p50_ms * math.exp(sigma * z) / 1000
+    
+    def fails(self, features: ImageFeatures) -> bool:
+        """Whether the simulated provider errors on this image"""
+        return self.error_rate > 0 and self._rng(features, f"error:{self.seed}").random() < self.error_rate
+    
+    async def identify(self, image_data: Union[bytes, ImageFeatures]) -> List[Dict[str, Any]]:
+        """Identify after the synthetic latency, raising MockProviderError for failing images"""
+        features = ImageFeatures.ensure(image_data)
+        delay = self.latency(features)
+        self._counters["calls"] += 1
+        self._counters["latency_ms"] += delay * 1000
+        if delay:
+            await asyncio.sleep(delay)
+        if self.fails(features):
+            self._counters["failures"] += 1
+            raise MockProviderError(f"Synthetic provider failure for image {features.content_hash}")
+        return self.identify_species(features)
+    
+    def stats(self) -> Dict[str, Any]:
+        calls = self._counters["calls"]
+        return {
+            "seed": self.seed,
+            "latency_p50_ms": self.latency_p50_ms,
+            "latency_p99_ms": self.latency_p99_ms,
+            "error_rate": self.error_rate,
+            "calls": calls,
+            "failures": self._counters["failures"],
+            "mean_latency_ms": round(self._counters["latency_ms"] / calls, 2) if calls else None
+        }
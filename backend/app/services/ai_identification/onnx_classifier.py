@@ -0,0 +1,160 @@
+"""
+Local ONNX Runtime classifier
+Runs a small quantized image model on CPU with pooled sessions and batched inference
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import onnxruntime as ort
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+
+logger = logging.getLogger(__name__)
+
+# ImageNet normalization, which the exported models expect
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+DEFAULT_INPUT_SIZE = 224
+
+# Model hashes by path, kept while the file's size and mtime are unchanged
+_model_versions: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+def model_version(model_path: str) -> str:
+    """Version of a model file, readable without loading the model"""
+    stat = os.stat(model_path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _model_versions.get(model_path)
+    if cached is None or cached[0] != key:
+        with open(model_path, "rb") as f:
+            model_hash = hashlib.md5(f.read()).hexdigest()[:12]
+        # A new model file changes answers, so it also changes cache keys
+        cached = _model_versions[model_path] = (key, f"1-{model_hash}")
+    return cached[1]
+
+class SessionPool:
+    """
+    A fixed set of inference sessions over one model file
+    
+    A session runs one batch at a time, so concurrent callers each borrow
+    their own and wait when all are busy.
+    """
+    
+    def __init__(self, model_path: str, size: int = 1, intra_op_threads: int = 1):
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        
+        self.size = max(1, size)
+        self._sessions = [
+            ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+            for _ in range(self.size)
+        ]
+        self._idle: "queue.Queue[ort.InferenceSession]" = queue.Queue()
+        for session in self._sessions:
+            self._idle.put(session)
+    
+    @property
+    def inputs(self):
+        return self._sessions[0].get_inputs()
+    
+    @property
+    def outputs(self):
+        return self._sessions[0].get_outputs()
+    
+    @contextmanager
+    def session(self) -> Iterator[ort.InferenceSession]:
+        session = self._idle.get()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+class OnnxClassifier:
+    """
+    Image classifier backed by a local ONNX model
+    
+    The model takes float32 NCHW images normalized with ImageNet mean and
+    std and returns one row of logits per image. The labels file is a JSON
+    list with one {"scientific_name", "common_name", "key"} entry per output.
+    """
+    
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        labels_path: Optional[str] = None,
+        sessions: Optional[int] = None,
+        intra_op_threads: Optional[int] = None,
+        top_k: Optional[int] = None
+    ):
+        self.model_path = model_path or settings.ONNX_MODEL_PATH
+        self.labels_path = labels_path or settings.ONNX_LABELS_PATH
+        self.top_k = top_k or settings.ONNX_TOP_K
+        
+        with open(self.labels_path) as f:
+            self.labels: List[Dict[str, Any]] = json.load(f)
+        self.VERSION = model_version(self.model_path)
+        
+        self.pool = SessionPool(
+            self.model_path,
+            size=sessions or settings.ONNX_SESSIONS,
+            intra_op_threads=intra_op_threads or settings.ONNX_INTRA_OP_THREADS
+        )
+        model_input = self.pool.inputs[0]
+        self.input_name = model_input.name
+        side = model_input.shape[-1]
+        self.input_size = side if isinstance(side, int) else DEFAULT_INPUT_SIZE
+        
+        outputs = self.pool.outputs[0].shape[-1]
+        if isinstance(outputs, int) and outputs != len(self.labels):
+            raise ValueError(f"Model has {outputs} outputs but {len(self.labels)} labels were given")
+        logger.info(
+            f"Loaded ONNX model {self.model_path} ({len(self.labels)} labels, "
+            f"{self.pool.size} sessions, input {self.input_size}px)"
+        )
+    
+    def preprocess(self, image_data: Union[bytes, ImageFeatures]) -> np.ndarray:
+        """One image as a normalized (3, size, size) float32 array"""
+        features = ImageFeatures.ensure(image_data)
+        size = (self.input_size, self.input_size)
+        pixels = np.asarray(features.reduced(size).convert('RGB').resize(size), dtype=np.float32)
+        return (pixels.transpose(2, 0, 1) / 255.0 - MEAN) / STD
+    
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """Class probabilities for a preprocessed (N, 3, size, size) batch"""
+        with self.pool.session() as session:
+            logits = session.run(None, {self.input_name: batch})[0]
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+    
+    def _top_predictions(self, probabilities: np.ndarray) -> List[Dict]:
+        predictions = []
+        for index in np.argsort(probabilities)[::-1][:self.top_k]:
+            predictions.append({
+                **self.labels[index],
+                "confidence": float(probabilities[index]),
+                "source": "ONNX"
+            })
+        return predictions
+    
+    def identify_batch(self, images: Sequence[Union[bytes, ImageFeatures]]) -> List[List[Dict]]:
+        """Predictions for several images from a single inference call"""
+        if not images:
+            return []
+        batch = np.stack([self.preprocess(image) for image in images])
+        return [self._top_predictions(row) for row in self.run(batch)]
+    
+    def identify_species(self, image_data: Union[bytes, ImageFeatures]) -> List[Dict]:
+        """
+        Identify marine species in an image with the local model
+        """
+        return self.identify_batch([image_data])[0]
@@ -0,0 +1,200 @@
+"""
+Perceptual-hash index for near-duplicate images
+Burst shots of the same subject reuse a prior identification instead of being classified again
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+@lru_cache(maxsize=None)
+def _flip_masks(bits: int, radius: int) -> Tuple[int, ...]:
+    """Every mask of up to `radius` set bits within a `bits`-wide word"""
+    masks = [0]
+    for flipped in range(1, radius + 1):
+        for positions in combinations(range(bits), flipped):
+            masks.append(sum(1 << p for p in positions))
+    return tuple(masks)
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64-bit hashes with Hamming distance
+    
+    Hashes are split into disjoint chunks, each with its own exact-match
+    table. Two hashes within distance r agree to within r // chunks bits on
+    at least one chunk, so a search only probes the buckets near each chunk
+    and verifies that short candidate list.
+    """
+    
+    def __init__(self, chunks: int = 4):
+        self.chunks = max(1, min(chunks, 16))
+        # Spread 64 bits as evenly as possible, e.g. 13/13/13/13/12 for five chunks
+        widths = [64 // self.chunks + (i < 64 % self.chunks) for i in range(self.chunks)]
+        self._layout = [(sum(widths[:i]), width) for i, width in enumerate(widths)]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(self.chunks)]
+        self._hashes: Dict[int, int] = {}
+        self._payloads: Dict[int, Any] = {}
+        self._next_id = 0
+    
+    def __len__(self) -> int:
+        return len(self._hashes)
+    
+    def _chunks(self, value: int) -> List[int]:
+        return [(value >> offset) & ((1 << width) - 1) for offset, width in self._layout]
+    
+    def add(self, value: int, payload: Any) -> int:
+        """Index a hash, returning the id that removes it"""
+        entry_id = self._next_id
+        self._next_id += 1
+        self._hashes[entry_id] = value
+        self._payloads[entry_id] = payload
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, []).append(entry_id)
+        return entry_id
+    
+    def remove(self, entry_id: int):
+        value = self._hashes.pop(entry_id)
+        del self._payloads[entry_id]
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            bucket = table[chunk]
+            bucket.remove(entry_id)
+            if not bucket:
+                del table[chunk]
+    
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """All (distance, payload) pairs within radius of value"""
+        sub_radius = radius // self.chunks
+        if sub_radius > 2:
+            # Probing would touch most buckets, a straight scan is cheaper
+            candidates = list(self._hashes)
+        else:
+            candidates = set()
+            for (_, width), table, chunk in zip(self._layout, self._tables, self._chunks(value)):
+                for mask in _flip_masks(width, sub_radius):
+                    bucket = table.get(chunk ^ mask)
+                    if bucket:
+                        candidates.update(bucket)
+        
+        matches = []
+        for entry_id in candidates:
+            distance = hamming(value, self._hashes[entry_id])
+            if distance <= radius:
+                matches.append((distance, self._payloads[entry_id]))
+        return matches
+
+class NearDuplicateIndex:
+    """
+    Thread-safe perceptual-hash index of previous identifications
+    
+    Entries hold the raw predictions of the image they came from and the
+    provider and version that produced them; lookups return the closest
+    entry from the same provider and version within the configured Hamming
+    distance, so a request never borrows another classifier's answer. The
+    index keeps the `max_entries` most recently added or matched entries.
+    """
+    
+    def __init__(self, max_distance: Optional[int] = None, max_entries: Optional[int] = None):
+        self.max_distance = max_distance if max_distance is not None else settings.NEAR_DUPLICATE_MAX_DISTANCE
+        self.max_entries = max_entries or settings.NEAR_DUPLICATE_MAX_ENTRIES
+        # Enough chunks that a search at max_distance flips at most one bit per chunk
+        self._index = MultiIndexHash(chunks=self.max_distance // 2 + 1)
+        self._recent: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._counters = {"hits": 0, "misses": 0, "evicted": 0}
+    
+    def add(
+        self,
+        phash: int,
+        predictions: List[Dict],
+        observation_id: Optional[str] = None,
+        provider: Optional[str] = None,
+        version: Optional[str] = None
+    ):
+        if not predictions:
+            return
+        entry = {"observation_id": observation_id, "predictions": predictions, "provider": provider, "version": version}
+        with self._lock:
+            entry["id"] = self._index.add(phash, entry)
+            self._recent[entry["id"]] = None
+            while len(self._recent) > self.max_entries:
+                oldest, _ = self._recent.popitem(last=False)
+                self._index.remove(oldest)
+                self._counters["evicted"] += 1
+    
+    def find(
+        self,
+        phash: int,
+        provider: Optional[str] = None,
+        version: Optional[str] = None,
+        max_distance: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Closest prior identification by the same provider and version within max_distance bits, or None"""
+        radius = self.max_distance if max_distance is None else max_distance
+        with self._lock:
+            matches = [
+                (distance, entry) for distance, entry in self._index.search(phash, radius)
+                if entry["provider"] == provider and entry["version"] == version
+            ]
+            if matches:
+                distance, entry = min(matches, key=lambda m: m[0])
+                self._recent.move_to_end(entry["id"])
+        if not matches:
+            self._counters["misses"] += 1
+            return None
+        
+        self._counters["hits"] += 1
+        return {"distance": distance, "observation_id": entry["observation_id"], "predictions": entry["predictions"]}
+    
+    def load(self, db) -> int:
+        """Populate the index from observations that have a stored perceptual hash"""
+        # Observations written before provider versions were recorded can't be matched, so aren't loaded
+        query = """
+        MATCH (o:Observation)-[:IDENTIFIED_AS]->(s:Species)
+        WHERE o.phash IS NOT NULL AND o.provider IS NOT NULL
+        RETURN o.id as id, o.phash as phash, o.confidence as confidence,
+               o.provider as provider, o.provider_version as provider_version,
+               s.scientific_name as scientific_name, s.common_name as common_name
+        ORDER BY o.timestamp DESC
+        LIMIT $limit
+        """
+        count = 0
+        # Oldest first, so the most recent observations are the last evicted
+        for record in reversed(db.execute_query(query, {"limit": self.max_entries})):
+            try:
+                phash = int(record["phash"], 16)
+            except (TypeError, ValueError):
+                continue
+            self.add(phash, [{
+                "scientific_name": record["scientific_name"],
+                "common_name": record["common_name"],
+                "confidence": record["confidence"]
+            }], record["id"], record["provider"], record["provider_version"])
+            count += 1
+        
+        self._loaded = True
+        logger.info(f"Loaded {count} observations into the near-duplicate index")
+        return count
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._index)
+        return {
+            "entries": size,
+            "loaded": self._loaded,
+            "max_distance": self.max_distance,
+            "max_entries": self.max_entries,
+            **self._counters
+        }
+
+# Global index instance, populated in the application lifespan
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,299 @@
+"""
+Lazy classifier provider registry
+Providers are imported and constructed on first use and can be switched at runtime
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+from app.services.executor import classification_executor, get_provider_version
+
+logger = logging.getLogger(__name__)
+
+class PoolProvider:
+    """A local classifier run on the classification process pool"""
+    
+    def __init__(self, name: str):
+        self.name = name
+    
+    @property
+    def version(self) -> str:
+        return get_provider_version(self.name)
+    
+    async def identify(self, features: ImageFeatures) -> Tuple[List[Dict], Optional[Dict]]:
+        return await classification_executor.submit(self.name, features), None
+
+class MockProvider:
+    """Hash-seeded mock classifier with synthetic latency and failures, awaited on the event loop"""
+    
+    name = "mock"
+    
+    def __init__(self):
+        from app.services.ai_identification.mock_service import MockIdentificationService
+        self.service = MockIdentificationService()
+        self.version = self.service.VERSION
+    
+    async def identify(self, features: ImageFeatures) -> Tuple[List[Dict], Optional[Dict]]:
+        return await self.service.identify(features), None
+    
+    def stats(self) -> Dict[str, Any]:
+        return self.service.stats()
+
+class VisionProvider:
+    """Google Vision behind its deadline, circuit breaker and local fallback"""
+    
+    name = "vision"
+    
+    def __init__(self):
+        # Imported here so httpx and tenacity load only when Vision is used
+        from app.services.ai_identification.google_vision_rest import google_vision_rest_service
+        from app.services.ai_identification.resilience import resilient_vision
+        self.client = google_vision_rest_service
+        self.resilient = resilient_vision
+        self.version = google_vision_rest_service.VERSION
+    
+    async def identify(self, features: ImageFeatures) -> Tuple[List[Dict], Optional[Dict]]:
+        return await self.resilient.identify(features)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"client": self.client.stats(), **self.resilient.stats()}
+    
+    async def close(self):
+        await self.client.close()
+
+class CascadeProvider:
+    """Local classifier first, escalating to Google Vision when unsure"""
+    
+    name = "cascade"
+    
+    def __init__(self):
+        from app.services.ai_identification.cascade import classifier_cascade
+        from app.services.ai_identification.google_vision_rest import google_vision_rest_service
+        from app.services.ai_identification.resilience import guarded_vision
+        self.cascade = classifier_cascade
+        self.client = google_vision_rest_service
+        self.guarded = guarded_vision
+    
+    @property
+    def version(self) -> str:
+        return self.cascade.version
+    
+    async def identify(self, features: ImageFeatures) -> Tuple[List[Dict], Optional[Dict]]:
+        return await self.cascade.identify(features)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cascade.stats(), "vision_stage": self.guarded.stats()}
+    
+    async def close(self):
+        await self.client.close()
+
+class OnnxProvider:
+    """Local ONNX model, with concurrent requests batched into one inference call"""
+    
+    name = "onnx"
+    
+    def __init__(self):
+        from app.services.ai_identification.batching import BatchingClassifier
+        from app.services.ai_identification.onnx_classifier import OnnxClassifier
+        self.classifier = OnnxClassifier()
+        self.batcher = BatchingClassifier(
+            self.classifier, settings.ONNX_MAX_BATCH, settings.ONNX_BATCH_WINDOW_MS / 1000
+        )
+        self.version = self.classifier.VERSION
+    
+    async def identify(self, features: ImageFeatures) -> Tuple[List[Dict], Optional[Dict]]:
+        return await self.batcher.identify(features), None
+    
+    def stats(self) -> Dict[str, Any]:
+        return self.batcher.stats()
+
+class KnnProvider:
+    """Species vote among the most similar user-confirmed observations"""
+    
+    name = "knn"
+    
+    def __init__(self):
+        from app.services.ai_identification.batching import BatchingClassifier
+        from app.services.ai_identification.embedding_index import embedding_index
+        self.index = embedding_index
+        self.index.refresh()
+        self.batcher = BatchingClassifier(
+            self.index, settings.KNN_MAX_BATCH, settings.KNN_BATCH_WINDOW_MS / 1000
+        )
+    
+    @property
+    def version(self) -> str:
+        return self.index.VERSION
+    
+    async def identify(self, features: ImageFeatures) -> Tuple[List[Dict], Optional[Dict]]:
+        return await self.batcher.identify(features), None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**self.index.stats(), "batching": self.batcher.stats()}
+
+class UnknownProviderError(ValueError):
+    """Raised when a provider name is not registered"""
+
+DEFAULT_KEY = "identify:provider:default"
+
+class ProviderRegistry:
+    """
+    Named provider factories, instantiated on first use
+    
+    Nothing is imported until a provider is first asked for, so workers only
+    pay for the classifiers they actually serve. The default comes from
+    IDENTIFICATION_PROVIDER and can be swapped at runtime; the switch is
+    stored in Redis and every worker re-reads it each PROVIDER_DEFAULT_REFRESH
+    seconds. While Redis is unreachable a switch applies to this worker only.
+    `unload` closes a provider's connections and drops it until it is next used.
+    """
+    
+    def __init__(self, redis_client=None):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._versions: Dict[str, Callable[[], str]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._default: Optional[str] = None
+        self._default_checked_at = float("-inf")
+        self._redis = redis_client
+        self._lock = threading.Lock()
+    
+    @property
+    def redis(self):
+        if self._redis is None:
+            # Imported here so loading the registry does not open a client
+            from app.services.cache import cache_service
+            self._redis = cache_service.redis_client
+        return self._redis
+    
+    def register(self, name: str, factory: Callable[[], Any], version: Optional[Callable[[], str]] = None):
+        """Add a provider; `version` reads its version without constructing it"""
+        self._factories[name] = factory
+        if version is not None:
+            self._versions[name] = version
+    
+    @property
+    def names(self) -> List[str]:
+        return sorted(self._factories)
+    
+    @property
+    def default(self) -> str:
+        if time.monotonic() - self._default_checked_at >= settings.PROVIDER_DEFAULT_REFRESH:
+            self._refresh_default()
+        return self._default or settings.IDENTIFICATION_PROVIDER
+    
+    def _refresh_default(self):
+        """Pick up a default switched through another worker"""
+        self._default_checked_at = time.monotonic()
+        try:
+            shared = self.redis.get(DEFAULT_KEY)
+        except Exception as e:
+            logger.warning(f"Could not read the shared default provider, keeping {self._default}: {e}")
+            return
+        if isinstance(shared, bytes):
+            shared = shared.decode()
+        if shared in self._factories:
+            self._default = shared
+    
+    def set_default(self, name: str) -> bool:
+        """
+        Switch the provider used when a request does not name one
+        
+        Returns whether the switch was shared with every worker; if Redis
+        could not be written it only applies to this one.
+        """
+        self._check(name)
+        logger.info(f"Default identification provider switched from {self.default} to {name}")
+        self._default = name
+        self._default_checked_at = time.monotonic()
+        try:
+            self.redis.set(DEFAULT_KEY, name)
+            return True
+        except Exception as e:
+            logger.warning(f"Could not share the default provider, {name} applies to this worker only: {e}")
+            return False
+    
+    def _check(self, name: str):
+        if name not in self._factories:
+            raise UnknownProviderError(f"Unknown provider '{name}', expected one of {', '.join(self.names)}")
+    
+    def get(self, name: Optional[str] = None) -> Any:
+        """The named provider, or the default one, constructing it if needed"""
+        name = name or self.default
+        self._check(name)
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    logger.info(f"Loading identification provider: {name}")
+                    instance = self._factories[name]()
+                    self._instances[name] = instance
+        return instance
+    
+    def version(self, name: Optional[str] = None) -> str:
+        """
+        Version of a provider's results, used to key cached identifications
+        
+        A cache hit should not load a model, so an unloaded provider's version
+        comes from its registered resolver and only providers without one are
+        constructed to ask.
+        """
+        name = name or self.default
+        self._check(name)
+        instance = self._instances.get(name)
+        if instance is None and name in self._versions:
+            return self._versions[name]()
+        return self.get(name).version
+    
+    def loaded(self, name: str) -> Optional[Any]:
+        """The provider if it has been constructed, without loading it"""
+        return self._instances.get(name)
+    
+    async def unload(self, name: str):
+        """Drop a provider instance, closing its connections"""
+        self._check(name)
+        instance = self._instances.pop(name, None)
+        if instance is not None and hasattr(instance, "close"):
+            await instance.close()
+    
+    async def close(self):
+        """Close every loaded provider"""
+        for name in list(self._instances):
+            await self.unload(name)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": self.default,
+            "available": self.names,
+            "loaded": sorted(self._instances),
+            "providers": {
+                name: instance.stats()
+                for name, instance in self._instances.items()
+                if hasattr(instance, "stats")
+            }
+        }
+
+def _pool_version(name: str) -> Callable[[], str]:
+    return lambda: get_provider_version(name)
+
+def _vision_version() -> str:
+    from app.services.ai_identification.google_vision_rest import GoogleVisionRESTService
+    return GoogleVisionRESTService.VERSION
+
+def _cascade_version() -> str:
+    # The cascade's stages read their versions lazily, so importing it loads no model
+    from app.services.ai_identification.cascade import classifier_cascade
+    return classifier_cascade.version
+
+# Global provider registry
+provider_registry = ProviderRegistry()
+provider_registry.register("mock", MockProvider, _pool_version("mock"))
+provider_registry.register("free", lambda: PoolProvider("free"), _pool_version("free"))
+provider_registry.register("vision", VisionProvider, _vision_version)
+provider_registry.register("cascade", CascadeProvider, _cascade_version)
+provider_registry.register("onnx", OnnxProvider, _pool_version("onnx"))
+provider_registry.register("knn", KnnProvider, _pool_version("knn"))
@@ -0,0 +1,216 @@
+"""
+Latency-bounded provider calls
+Deadlines, bounded retries and a circuit breaker around remote classifiers, with local fallback
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+from app.services.executor import classification_executor
+from app.services.ai_identification.google_vision_rest import google_vision_rest_service, prepare_image
+
+logger = logging.getLogger(__name__)
+
+Classify = Callable[[ImageFeatures], Awaitable[List[Dict]]]
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+class ProviderDeadlineError(Exception):
+    """Raised when a provider call, retries included, exceeds its deadline"""
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failure is worth retrying and counts against the provider's health"""
+    return isinstance(error, (asyncio.TimeoutError, ProviderDeadlineError)) or getattr(error, "retryable", False)
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+    
+    closed: calls pass through. After `failure_threshold` consecutive
+    failures the circuit opens and calls are refused for `reset_timeout`
+    seconds, then a single trial call is let through (half-open) whose
+    outcome closes or re-opens the circuit.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.VISION_BREAKER_FAILURES
+        self.reset_timeout = reset_timeout if reset_timeout is not None else settings.VISION_BREAKER_RESET
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._counters = {"opened": 0, "refused": 0}
+    
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+    
+    def allow(self) -> bool:
+        """Whether a call may go through now"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self._counters["refused"] += 1
+        return False
+    
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+    
+    def release_trial(self):
+        """Give up a half-open trial whose outcome is unknown, so the next call can try again"""
+        self._trial_in_flight = False
+    
+    def record_failure(self):
+        self._failures += 1
+        if self._trial_in_flight or self._failures >= self.failure_threshold:
+            if self._opened_at is None or self._trial_in_flight:
+                self._counters["opened"] += 1
+                logger.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+            self._opened_at = self._clock()
+        self._trial_in_flight = False
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+            **self._counters
+        }
+
+class ResilientProvider:
+    """
+    Remote provider call with a deadline, bounded retries and a circuit breaker
+    
+    Transient failures are retried with jittered backoff until `retries`
+    extra attempts or the overall `deadline` run out. When the call fails,
+    or the circuit is open, `fallback` answers instead if one is given;
+    otherwise the error is raised.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        primary: Classify,
+        breaker: CircuitBreaker,
+        fallback: Optional[Classify] = None,
+        fallback_name: Optional[str] = None,
+        deadline: Optional[float] = None,
+        retries: Optional[int] = None
+    ):
+        self.name = name
+        self.primary = primary
+        self.breaker = breaker
+        self.fallback = fallback
+        self.fallback_name = fallback_name or "fallback"
+        self.deadline = deadline or settings.VISION_DEADLINE
+        self.retries = retries if retries is not None else settings.VISION_RETRIES
+        self._counters = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "deadline_exceeded": 0, "fallbacks": {}}
+    
+    async def _call_with_retries(self, features: ImageFeatures) -> List[Dict]:
+        attempts = AsyncRetrying(
+            stop=stop_after_attempt(self.retries + 1),
+            wait=wait_random_exponential(multiplier=0.1, max=1.0),
+            retry=retry_if_exception(is_transient),
+            reraise=True
+        )
+        async for attempt in attempts:
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    self._counters["retries"] += 1
+                return await self.primary(features)
+    
+    async def _call_primary(self, features: ImageFeatures) -> List[Dict]:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit for {self.breaker.name} is open")
+        
+        try:
+            predictions = await asyncio.wait_for(self._call_with_retries(features), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            self._counters["deadline_exceeded"] += 1
+            self.breaker.record_failure()
+            raise ProviderDeadlineError(f"{self.name} exceeded its {self.deadline}s deadline")
+        except Exception as e:
+            if is_transient(e):
+                self.breaker.record_failure()
+            else:
+                # The provider answered; the image just has no usable result
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            # Cancelled by the caller (client disconnect, an outer timeout),
+            # which says nothing about the provider's health
+            self.breaker.release_trial()
+            raise
+        
+        self.breaker.record_success()
+        return predictions
+    
+    async def identify(self, features: ImageFeatures) -> Tuple[List[Dict], Dict[str, Any]]:
+        """Predictions plus which provider answered and why a fallback was used"""
+        self._counters["calls"] += 1
+        try:
+            predictions = await self._call_primary(features)
+            self._counters["succeeded"] += 1
+            return predictions, {"answered_by": self.name, "fallback_reason": None}
+        except Exception as e:
+            self._counters["failed"] += 1
+            if self.fallback is None:
+                raise
+            reason = "circuit_open" if isinstance(e, CircuitOpenError) else (
+                "deadline" if isinstance(e, ProviderDeadlineError) else "error"
+            )
+            logger.warning(f"{self.name} unavailable ({reason}: {e}), using {self.fallback_name}")
+            self._counters["fallbacks"][reason] = self._counters["fallbacks"].get(reason, 0) + 1
+            predictions = await self.fallback(features)
+            return predictions, {"answered_by": self.fallback_name, "fallback_reason": reason, "error": str(e)}
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "deadline": self.deadline,
+            "retries_allowed": self.retries,
+            **self._counters,
+            "breaker": self.breaker.stats()
+        }
+
+async def _vision(features: ImageFeatures) -> List[Dict]:
+    payload = await run_in_threadpool(prepare_image, features)
+    return await google_vision_rest_service.identify_species(payload)
+
+async def _local_fallback(features: ImageFeatures) -> List[Dict]:
+    return await classification_executor.submit(settings.VISION_FALLBACK_PROVIDER, features)
+
+# Global breaker shared by every Vision call path
+vision_breaker = CircuitBreaker("vision")
+
+# Direct Vision identification, answered locally while Vision is unavailable
+resilient_vision = ResilientProvider(
+    "vision", _vision, vision_breaker,
+    fallback=_local_fallback, fallback_name=settings.VISION_FALLBACK_PROVIDER
+)
+
+# Vision as a cascade stage; the cascade keeps its own local answer on failure
+guarded_vision = ResilientProvider("vision", _vision, vision_breaker)
@@ -0,0 +1,158 @@
+"""
+Reference-counted index of content-addressed originals in object storage
+Duplicate uploads are answered from Redis instead of re-sending the payload
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from app.core.config import settings
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+KNOWN_KEY = "blobs:known"
+TRACKED_KEY = "blobs:tracked"
+
+class BlobIndex:
+    """
+    Which originals are stored, and which graph nodes reference each
+    
+    Originals are named by content hash, so one blob can back several Image
+    and Observation nodes. Each blob has a Redis set of its references
+    ("image:<id>", "observation:<id>"); adding the same reference twice is
+    harmless, so replayed writes don't inflate the count. `blobs:known`
+    lists blobs confirmed stored, either after a PUT or by `stat_object`
+    when the index is cold.
+    
+    Only blobs first stored through the index have every reference in their
+    set; they are listed in `blobs:tracked`. Originals stored before the
+    index existed may be referenced by nodes it never heard of, so their
+    count is unknown until `release` backfills it from the graph, and
+    without a backfill they are never deleted.
+    
+    Uploads record their reference before checking `blobs:known`, and
+    `release` removes a blob from it before counting what is left, so a
+    duplicate upload racing the last delete either keeps the blob alive or
+    misses the known set and takes the per-blob lock, which the delete holds
+    until the object is gone.
+    """
+    
+    def __init__(
+        self,
+        redis_client=None,
+        lock_timeout: Optional[float] = None,
+        lock_wait: Optional[float] = None
+    ):
+        self.redis = redis_client if redis_client is not None else cache_service.redis_client
+        self.lock_timeout = lock_timeout or settings.BLOB_LOCK_TIMEOUT
+        self.lock_wait = lock_wait or settings.BLOB_LOCK_WAIT
+        self._counters = {
+            "deduplicated": 0, "stored": 0, "released": 0, "deleted": 0, "backfilled": 0, "untracked": 0
+        }
+    
+    @staticmethod
+    def refs_key(name: str) -> str:
+        return f"blobs:refs:{name}"
+    
+    @contextmanager
+    def _lock(self, name: str) -> Iterator[None]:
+        """Serialize storing and deleting one blob across workers, raising LockError if it stays taken"""
+        with self.redis.lock(f"blobs:lock:{name}", timeout=self.lock_timeout, blocking_timeout=self.lock_wait):
+            yield
+    
+    def store(
+        self,
+        name: str,
+        reference: Optional[str],
+        stat: Callable[[], Optional[str]],
+        put: Callable[[], str]
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Store a blob unless it already is, recording `reference` to it
+        
+        `stat` returns the stored object's etag, or None if there is none,
+        and `put` uploads it and returns its etag. Returns the etag, None
+        when answered from the index alone, and whether the blob was
+        already stored.
+        """
+        if reference:
+            self.redis.sadd(self.refs_key(name), reference)
+        if self.redis.sismember(KNOWN_KEY, name):
+            self._counters["deduplicated"] += 1
+            return None, True
+        
+        with self._lock(name):
+            # Stored before the index knew of it, or by a racing upload
+            etag = stat()
+            if etag is not None:
+                self.redis.sadd(KNOWN_KEY, name)
+                self._counters["deduplicated"] += 1
+                return etag, True
+            etag = put()
+            self.redis.sadd(TRACKED_KEY, name)
+            self.redis.sadd(KNOWN_KEY, name)
+            self._counters["stored"] += 1
+            return etag, False
+    
+    def release(
+        self,
+        name: str,
+        reference: str,
+        delete: Callable[[], bool],
+        backfill: Optional[Callable[[], Iterable[str]]] = None
+    ) -> bool:
+        """
+        Drop a reference, calling `delete` if it was the last; returns whether the blob was deleted
+        
+        `backfill` lists every node referencing the blob, `reference`
+        included, and is called once for a blob whose references the index
+        has not tracked from the start. Without it, or if it fails, such a
+        blob is kept.
+        """
+        with self._lock(name):
+            self._counters["released"] += 1
+            if not self.redis.sismember(TRACKED_KEY, name) and not self._backfill(name, backfill):
+                self.redis.srem(self.refs_key(name), reference)
+                self._counters["untracked"] += 1
+                logger.info(f"Kept {name}, its references were never counted")
+                return False
+            self.redis.srem(self.refs_key(name), reference)
+            self.redis.srem(KNOWN_KEY, name)
+            remaining = self.redis.scard(self.refs_key(name))
+            if remaining:
+                self.redis.sadd(KNOWN_KEY, name)
+                logger.info(f"Kept {name}, {remaining} references remain")
+                return False
+            self.redis.delete(self.refs_key(name))
+            self.redis.srem(TRACKED_KEY, name)
+            self._counters["deleted"] += 1
+            return delete()
+    
+    def _backfill(self, name: str, backfill: Optional[Callable[[], Iterable[str]]]) -> bool:
+        """Add the graph's references to an untracked blob's set, returning whether it is tracked now"""
+        if backfill is None:
+            return False
+        try:
+            references = list(backfill())
+        except Exception as e:
+            logger.warning(f"Could not count references to {name}: {e}")
+            return False
+        for reference in references:
+            self.redis.sadd(self.refs_key(name), reference)
+        self.redis.sadd(TRACKED_KEY, name)
+        self._counters["backfilled"] += 1
+        return True
+    
+    def references(self, name: str) -> int:
+        return int(self.redis.scard(self.refs_key(name)))
+    
+    def stats(self) -> Dict[str, Any]:
+        try:
+            known = int(self.redis.scard(KNOWN_KEY))
+        except Exception:
+            known = None
+        return {"known": known, **self._counters}
+
+# Global blob index instance
+blob_index = BlobIndex()
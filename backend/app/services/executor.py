@@ -0,0 +1,206 @@
+"""
+Managed process pool for CPU-bound species classification
+Keeps PIL decoding and NumPy work off the event loop
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Tuple, Union
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+
+logger = logging.getLogger(__name__)
+
+# Per-process provider instances, created lazily on first use
+_providers: Dict[str, Any] = {}
+
+def _get_provider(provider: str):
+    """Get or create the classifier instance for this process"""
+    if provider not in _providers:
+        if provider == "free":
+            from app.services.ai_identification.free_classifier import free_classifier
+            _providers[provider] = free_classifier
+        elif provider == "mock":
+            from app.services.ai_identification.mock_service import MockIdentificationService
+            _providers[provider] = MockIdentificationService()
+        elif provider == "onnx":
+            from app.services.ai_identification.onnx_classifier import OnnxClassifier
+            # Pool workers classify one image at a time, so one session is enough
+            _providers[provider] = OnnxClassifier(sessions=1)
+        elif provider == "knn":
+            from app.services.ai_identification.embedding_index import embedding_index
+            embedding_index.refresh()
+            _providers[provider] = embedding_index
+        else:
+            raise ValueError(f"Unknown classification provider: {provider}")
+    return _providers[provider]
+
+def get_provider_version(provider: str) -> str:
+    """
+    Version of a provider's classifier, used to key cached results
+    
+    Read from the class or the files the classifier loads rather than by
+    constructing it, so the API process never builds models it only hands
+    to the pool.
+    """
+    if provider in _providers:
+        return getattr(_providers[provider], "VERSION", "0")
+    if provider == "free":
+        from app.services.ai_identification.free_classifier import FreeMarineClassifier
+        return FreeMarineClassifier.VERSION
+    elif provider == "mock":
+        from app.services.ai_identification.mock_service import MockIdentificationService
+        return MockIdentificationService.VERSION
+    elif provider == "onnx":
+        from app.services.ai_identification.onnx_classifier import model_version
+        return model_version(settings.ONNX_MODEL_PATH)
+    elif provider == "knn":
+        from app.services.ai_identification.embedding_index import embedding_index
+        return embedding_index.VERSION
+    raise ValueError(f"Unknown classification provider: {provider}")
+
+def latency_percentiles(samples) -> Dict[str, Optional[float]]:
+    """p50/p95/p99 in milliseconds of durations given in seconds"""
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    ordered = sorted(samples)
+    
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+    
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+def _classify_in_worker(provider: str, image: ImageFeatures) -> Tuple[List[Dict], float]:
+    """Run a classifier inside a pool worker, returning predictions and run time"""
+    start = time.perf_counter()
+    predictions = _get_provider(provider).identify_species(image)
+    return predictions, time.perf_counter() - start
+
+class ExecutorSaturatedError(Exception):
+    """Raised when the submission queue is full"""
+
+class ExecutorUnavailableError(Exception):
+    """Raised when the process pool is shut down or broken"""
+
+class ClassificationTimeoutError(Exception):
+    """Raised when a classification task exceeds its deadline"""
+
+class ClassificationExecutor:
+    """
+    Process pool with a bounded submission queue and per-task timeouts
+    
+    At most `max_workers` tasks run at once and at most `max_queue` more may
+    wait; further submissions are rejected immediately instead of piling up.
+    """
+    
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        task_timeout: Optional[float] = None
+    ):
+        self.max_workers = max_workers or settings.CLASSIFIER_WORKERS
+        self.max_queue = max_queue if max_queue is not None else settings.CLASSIFIER_MAX_QUEUE
+        self.task_timeout = task_timeout or settings.CLASSIFIER_TASK_TIMEOUT
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._latencies = deque(maxlen=1000)
+        self._run_times = deque(maxlen=1000)
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "timeouts": 0}
+    
+    def start(self):
+        """Create the process pool"""
+        if self._pool is not None:
+            return
+        # Spawn keeps workers free of the parent's sockets and driver threads
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Classification executor started with {self.max_workers} workers")
+    
+    def shutdown(self):
+        """Shut down the process pool, cancelling queued tasks"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+            logger.info("Classification executor shut down")
+    
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+    
+    def _task_done(self, future):
+        self._pending -= 1
+    
+    async def submit(self, provider: str, image: Union[bytes, ImageFeatures]) -> List[Dict]:
+        """Classify an image on the process pool"""
+        if self._pool is None:
+            self.start()
+        
+        if self._pending >= self.capacity:
+            self._counters["rejected"] += 1
+            raise ExecutorSaturatedError(
+                f"Classification queue is full ({self._pending}/{self.capacity})"
+            )
+        
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            future = self._pool.submit(_classify_in_worker, provider, ImageFeatures.ensure(image))
+        except (BrokenProcessPool, RuntimeError) as e:
+            raise ExecutorUnavailableError(str(e))
+        
+        self._pending += 1
+        self._counters["submitted"] += 1
+        # Queue depth tracks the worker task itself, which keeps running after a timeout
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._task_done, f))
+        
+        try:
+            predictions, run_time = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=self.task_timeout
+            )
+        except asyncio.TimeoutError:
+            future.cancel()
+            self._counters["timeouts"] += 1
+            raise ClassificationTimeoutError(
+                f"Classification exceeded {self.task_timeout}s"
+            )
+        except BrokenProcessPool as e:
+            self._counters["failed"] += 1
+            logger.error(f"Classification pool broken, restarting: {e}")
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            raise ExecutorUnavailableError(str(e))
+        except Exception:
+            self._counters["failed"] += 1
+            raise
+        
+        self._counters["completed"] += 1
+        self._latencies.append(time.perf_counter() - start)
+        self._run_times.append(run_time)
+        return predictions
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, counters and recent task latency"""
+        running = min(self._pending, self.max_workers)
+        return {
+            "running": self._pool is not None,
+            "workers": self.max_workers,
+            "in_flight": running,
+            "queue_depth": self._pending - running,
+            "max_queue": self.max_queue,
+            "task_timeout": self.task_timeout,
+            **self._counters,
+            "latency": latency_percentiles(self._latencies),
+            "run_time": latency_percentiles(self._run_times),
+        }
+
+# Global executor instance, started in the application lifespan
+classification_executor = ClassificationExecutor()
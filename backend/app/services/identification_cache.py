@@ -0,0 +1,78 @@
+"""
+Identification result cache keyed by image content hash
+An in-process LRU sits in front of the shared Redis cache
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.services.cache import cache_service, CacheService
+
+logger = logging.getLogger(__name__)
+
+class IdentificationResultCache:
+    """
+    Two-level cache of enriched predictions
+    
+    Keys combine the content hash with the classifier name and version, so
+    bumping a classifier's VERSION makes every older entry unreachable.
+    """
+    
+    def __init__(
+        self,
+        cache: CacheService,
+        max_entries: Optional[int] = None,
+        ttl: Optional[int] = None
+    ):
+        self.cache = cache
+        self.max_entries = max_entries or settings.IDENTIFICATION_CACHE_SIZE
+        self.ttl = ttl or settings.IDENTIFICATION_CACHE_TTL
+        self._local: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+    
+    @staticmethod
+    def key(content_hash: str, classifier: str, version: str) -> str:
+        return f"identify:result:{classifier}:{version}:{content_hash}"
+    
+    def _remember(self, key: str, predictions: List[Dict]):
+        with self._lock:
+            self._local[key] = predictions
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+    
+    def get(self, content_hash: str, classifier: str, version: str) -> Optional[List[Dict]]:
+        """Cached predictions for an image, or None on a miss"""
+        key = self.key(content_hash, classifier, version)
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                self._counters["local_hits"] += 1
+                # Copies keep callers from mutating the cached entry
+                return [dict(p) for p in self._local[key]]
+        
+        predictions = self.cache.get(key)
+        if predictions is not None:
+            self._counters["shared_hits"] += 1
+            self._remember(key, predictions)
+            return [dict(p) for p in predictions]
+        
+        self._counters["misses"] += 1
+        return None
+    
+    def set(self, content_hash: str, classifier: str, version: str, predictions: List[Dict]):
+        """Store predictions for an image in both cache levels"""
+        key = self.key(content_hash, classifier, version)
+        self._remember(key, [dict(p) for p in predictions])
+        self.cache.set(key, predictions, ttl=self.ttl)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._local)
+        return {"local_entries": entries, "max_entries": self.max_entries, **self._counters}
+
+# Global result cache instance
+identification_cache = IdentificationResultCache(cache_service)
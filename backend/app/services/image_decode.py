@@ -0,0 +1,136 @@
+"""
+Reduced-resolution image decoding
+Decodes only as many pixels as the caller needs instead of the full-resolution original
+"""
+
+import io
+import logging
+import mmap
+import os
+from typing import BinaryIO, Optional, Tuple, Union
+
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+RAW_EXTENSIONS = {
+    ".arw", ".cr2", ".cr3", ".dng", ".nef", ".nrw",
+    ".orf", ".pef", ".raf", ".rw2", ".srw"
+}
+
+# Raw image payloads: bytes, or a memory-mapped upload spool file
+ImageBuffer = Union[bytes, mmap.mmap]
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only stream over a buffer, reading through a memoryview instead of copying it"""
+    
+    def __init__(self, buffer: ImageBuffer):
+        self._view = memoryview(buffer)
+        self._position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, b) -> int:
+        count = max(0, min(len(b), len(self._view) - self._position))
+        b[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def close(self):
+        # Releasing the view lets the mmap behind it be closed
+        self._view.release()
+        super().close()
+
+def open_buffer(data: ImageBuffer) -> BinaryIO:
+    """A fresh seekable stream over the payload that shares rather than copies it"""
+    if isinstance(data, bytes):
+        # BytesIO shares an immutable bytes object until written to
+        return io.BytesIO(data)
+    return io.BufferedReader(_BufferReader(data))
+
+def is_raw_filename(filename: Optional[str]) -> bool:
+    """Check whether a filename has a camera RAW extension"""
+    return bool(filename) and os.path.splitext(filename)[1].lower() in RAW_EXTENSIONS
+
+def _reduce_to(img: Image.Image, min_size: Tuple[int, int]) -> Image.Image:
+    """Shrink by an integer factor while staying at least min_size"""
+    factor = min(img.width // min_size[0], img.height // min_size[1])
+    if factor >= 2:
+        # reduce() box-averages whole pixel blocks, much cheaper than a resample
+        img = img.reduce(factor)
+    return img
+
+def _decode_pil(data: ImageBuffer, min_size: Optional[Tuple[int, int]]) -> Image.Image:
+    with open_buffer(data) as stream:
+        img = Image.open(stream)
+        if min_size and img.format == "JPEG":
+            # DCT scaling: libjpeg decodes at 1/2, 1/4 or 1/8 scale directly
+            img.draft("RGB", min_size)
+        img.load()
+    if min_size:
+        img = _reduce_to(img, min_size)
+    return img
+
+def _decode_raw(data: ImageBuffer, min_size: Optional[Tuple[int, int]]) -> Image.Image:
+    """Decode a camera RAW file, preferring its embedded preview"""
+    import rawpy  # Heavy optional dependency, only needed for RAW uploads
+    
+    with rawpy.imread(open_buffer(data)) as raw:
+        if min_size:
+            try:
+                thumb = raw.extract_thumb()
+                if thumb.format == rawpy.ThumbFormat.JPEG:
+                    preview = _decode_pil(thumb.data, min_size)
+                else:
+                    preview = _reduce_to(Image.fromarray(thumb.data), min_size)
+                if preview.width >= min_size[0] and preview.height >= min_size[1]:
+                    return preview
+            except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+                logger.debug("RAW file has no usable embedded preview")
+        
+        # Half-size demosaicing skips interpolation and quarters the pixel count
+        rgb = raw.postprocess(half_size=bool(min_size), use_camera_wb=True)
+    img = Image.fromarray(rgb)
+    return _reduce_to(img, min_size) if min_size else img
+
+def decode_image(
+    data: ImageBuffer,
+    min_size: Optional[Tuple[int, int]] = None,
+    filename: Optional[str] = None
+) -> Image.Image:
+    """
+    Decode image bytes, at reduced resolution when min_size is given
+    
+    The result is at least min_size in both dimensions whenever the original
+    is, so callers can resize it down exactly as they would the original.
+    Tries, in order: JPEG draft decoding, the embedded preview of RAW files,
+    then a full decode followed by an integer-factor reduction.
+    """
+    if is_raw_filename(filename):
+        try:
+            return _decode_raw(data, min_size)
+        except ImportError:
+            logger.warning("rawpy not installed, decoding RAW file with PIL")
+        except Exception as e:
+            logger.warning(f"RAW decode failed for {filename}, falling back to PIL: {e}")
+    
+    try:
+        return _decode_pil(data, min_size)
+    except UnidentifiedImageError as e:
+        # Unknown to PIL, may still be a RAW file without a telling extension
+        try:
+            return _decode_raw(data, min_size)
+        except Exception:
+            raise e
@@ -0,0 +1,374 @@
+"""
+Single-decode image features shared across the identification pipeline
+The upload is decoded once and every derived view is computed lazily and memoized
+"""
+
+import hashlib
+import io
+import logging
+import mmap
+import os
+from functools import cached_property, lru_cache
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ExifTags
+from app.core.config import settings
+from app.services.image_decode import ImageBuffer, decode_image, open_buffer
+
+logger = logging.getLogger(__name__)
+
+# EXIF orientation values and the transpose that makes the image upright
+_ORIENTATION_TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+@lru_cache(maxsize=None)
+def _dct_matrix(n: int) -> np.ndarray:
+    """Unnormalized DCT-II basis, rows are frequencies"""
+    k = np.arange(n)
+    return np.cos(np.pi * (2 * k[np.newaxis, :] + 1) * k[:, np.newaxis] / (2 * n))
+
+def _map_source(source: Tuple[str, int, int], size: int) -> mmap.mmap:
+    """Map the first `size` bytes of a pickled payload's file, read-only"""
+    path, device, inode = source
+    with open(path, "rb") as file:
+        stat = os.fstat(file.fileno())
+        if (stat.st_dev, stat.st_ino) != (device, inode):
+            raise ValueError(f"{path} no longer holds the image payload")
+        return mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+
+class ImageFeatures:
+    """
+    Lazily derived views of one uploaded image
+    
+    Classifiers, storage and thumbnailing take an ImageFeatures instead of raw
+    bytes so the payload is hashed once and decoded at most once per process.
+    Only the payload and its hash are pickled, so instances can be sent to
+    pool workers.
+    
+    The payload may be a memory-mapped upload spool file instead of bytes;
+    every view reads it through `open()`, and `close()` unmaps it. When
+    `source` is a path other processes can open that file by, pickling sends
+    the path and the worker maps the file itself rather than receiving a
+    heap copy of it.
+    """
+    
+    COLOR_SIZE = (150, 150)  # Resolution used for color analysis
+    SHAPE_SIZE = (100, 100)  # Resolution used for shape analysis
+    ANALYSIS_SIZE = (150, 150)  # Smallest decode that covers both analysis views
+    PHASH_SIZE = 32  # Side of the grayscale square the perceptual hash is taken over
+    EMBEDDING_DIM = 128  # Length of the appearance embedding
+    SUBJECT_GRID = 30  # Blocks per side of the grid subject detection runs on
+    
+    def __init__(
+        self,
+        data: ImageBuffer,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+        source: Optional[str] = None
+    ):
+        self.data = data
+        self.filename = filename
+        self.content_type = content_type
+        self.source = None
+        if source is not None and isinstance(data, mmap.mmap):
+            # The file's identity, so a reused path is never mapped in its place
+            stat = os.stat(source)
+            self.source = (source, stat.st_dev, stat.st_ino)
+        self._reduced: Dict[Tuple[int, int], Image.Image] = {}
+        self._vision_payloads: Dict[Tuple[int, int, bool], bytes] = {}
+    
+    @classmethod
+    def ensure(cls, image: Union[bytes, "ImageFeatures"]) -> "ImageFeatures":
+        """Wrap raw bytes, passing existing features through unchanged"""
+        if isinstance(image, ImageFeatures):
+            return image
+        return cls(image)
+    
+    def _source_available(self) -> bool:
+        if self.source is None or self.data.closed:
+            return False
+        path, device, inode = self.source
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return (stat.st_dev, stat.st_ino) == (device, inode)
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # Derived views are cheaper to rebuild than to pickle
+        state = {"filename": self.filename, "content_type": self.content_type, "source": None}
+        if isinstance(self.data, mmap.mmap) and self._source_available():
+            state.update(source=self.source, size=len(self.data))
+        else:
+            state["data"] = self.data if isinstance(self.data, bytes) else bytes(self.data)
+        if "content_hash" in self.__dict__:
+            state["content_hash"] = self.content_hash
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]):
+        size = state.pop("size", None)
+        self.__dict__.update(state)
+        if self.source is not None:
+            self.data = _map_source(self.source, size)
+        self._reduced = {}
+        self._vision_payloads = {}
+    
+    def open(self) -> BinaryIO:
+        """A fresh read-only stream over the payload, sharing rather than copying it"""
+        return open_buffer(self.data)
+    
+    def close(self):
+        """
+        Unmap a memory-mapped payload once the request is done with it
+        
+        Views still reading it keep the mapping alive until they are released.
+        """
+        if not isinstance(self.data, mmap.mmap):
+            return
+        self.__dict__.pop("header", None)
+        try:
+            self.data.close()
+        except BufferError:
+            logger.debug("Image payload still in use, unmapped when released")
+    
+    @property
+    def size(self) -> int:
+        """Payload size in bytes"""
+        return len(self.data)
+    
+    @cached_property
+    def content_hash(self) -> str:
+        """MD5 of the payload, also used as the storage object name"""
+        return hashlib.md5(self.data).hexdigest()
+    
+    @cached_property
+    def header(self) -> Optional[Image.Image]:
+        """The image opened lazily, with only its header parsed"""
+        try:
+            return Image.open(self.open())
+        except Exception:
+            return None
+    
+    @cached_property
+    def image(self) -> Image.Image:
+        """The decoded image at full resolution"""
+        return decode_image(self.data, filename=self.filename)
+    
+    def reduced(self, min_size: Tuple[int, int]) -> Image.Image:
+        """The image decoded at the lowest resolution still covering min_size"""
+        if not settings.REDUCED_DECODE_ENABLED or "image" in self.__dict__:
+            return self.image
+        if min_size not in self._reduced:
+            self._reduced[min_size] = decode_image(self.data, min_size, filename=self.filename)
+        return self._reduced[min_size]
+    
+    @property
+    def format(self) -> Optional[str]:
+        header = self.header
+        return header.format if header is not None else None
+    
+    @property
+    def dimensions(self) -> Tuple[int, int]:
+        """Original (width, height)"""
+        header = self.header
+        return header.size if header is not None else self.image.size
+    
+    @cached_property
+    def analysis_image(self) -> Image.Image:
+        """Reduced decode shared by the color and shape views"""
+        return self.reduced(self.ANALYSIS_SIZE)
+    
+    @cached_property
+    def rgb(self) -> Image.Image:
+        """Full-resolution RGB image"""
+        return self.image.convert('RGB')
+    
+    @cached_property
+    def rgb_thumbnail(self) -> np.ndarray:
+        """RGB pixels at the color analysis resolution, shape (150, 150, 3)"""
+        return np.array(self.analysis_image.convert('RGB').resize(self.COLOR_SIZE))
+    
+    @cached_property
+    def grayscale(self) -> np.ndarray:
+        """Grayscale pixels at the shape analysis resolution, shape (100, 100)"""
+        return np.array(self.analysis_image.convert('L').resize(self.SHAPE_SIZE))
+    
+    @cached_property
+    def gradients(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Row and column gradients of the grayscale view"""
+        gy, gx = np.gradient(self.grayscale)
+        return gy, gx
+    
+    @cached_property
+    def edge_magnitude(self) -> np.ndarray:
+        gy, gx = self.gradients
+        return np.sqrt(gy ** 2 + gx ** 2)
+    
+    @cached_property
+    def phash(self) -> int:
+        """64-bit DCT perceptual hash, stable across re-encodes and small shifts"""
+        pixels = np.asarray(
+            self.analysis_image.convert('L').resize((self.PHASH_SIZE, self.PHASH_SIZE), Image.LANCZOS),
+            dtype=np.float64
+        )
+        # Keep the 8x8 lowest frequencies and threshold them on their median, ignoring DC
+        dct = _dct_matrix(self.PHASH_SIZE)
+        coefficients = (dct @ pixels @ dct.T)[:8, :8].flatten()
+        bits = coefficients > np.median(coefficients[1:])
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+    
+    @cached_property
+    def embedding(self) -> np.ndarray:
+        """
+        L2-normalized appearance vector of EMBEDDING_DIM float32 values
+        
+        A 4x4x4 RGB histogram, an 8x4 grayscale layout and a 32-bin edge
+        orientation histogram, each normalized before they are concatenated,
+        so cosine similarity weighs color, composition and texture equally.
+        """
+        levels = (self.rgb_thumbnail // 64).reshape(-1, 3).astype(np.int64)
+        color = np.sqrt(np.bincount(levels[:, 0] * 16 + levels[:, 1] * 4 + levels[:, 2], minlength=64))
+        
+        layout = self.grayscale[:96, :96].astype(np.float64).reshape(8, 12, 4, 24).mean(axis=(1, 3)).ravel()
+        layout -= layout.mean()
+        
+        gy, gx = self.gradients
+        angle = np.arctan2(gy, gx) % np.pi
+        bins = np.minimum((angle * (32 / np.pi)).astype(np.int64), 31)
+        edges = np.sqrt(np.bincount(bins.ravel(), weights=self.edge_magnitude.ravel(), minlength=32))
+        
+        parts = []
+        for part in (color, layout, edges):
+            norm = np.linalg.norm(part)
+            parts.append(part / norm if norm > 0 else part)
+        vector = np.concatenate(parts)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).astype(np.float32)
+    
+    @cached_property
+    def subject_box(self) -> Optional[Tuple[float, float, float, float]]:
+        """
+        Box around the largest region standing out from the background, or None
+        
+        The color view is averaged into SUBJECT_GRID blocks and each block
+        scored by its distance from the median color, i.e. the surrounding
+        water. Blocks well above the typical score are grouped into connected
+        regions; the largest one's bounds are returned as (left, top, right,
+        bottom) fractions of the stored (not EXIF-rotated) image.
+        """
+        grid = self.SUBJECT_GRID
+        pixels = self.rgb_thumbnail.astype(np.float32)
+        distance = np.linalg.norm(pixels - np.median(pixels.reshape(-1, 3), axis=0), axis=2)
+        block = self.COLOR_SIZE[0] // grid
+        scores = distance[:grid * block, :grid * block].reshape(grid, block, grid, block).mean(axis=(1, 3))
+        mask = scores > max(scores.mean() + scores.std(), 30.0)
+        
+        best: List[Tuple[int, int]] = []
+        seen = np.zeros_like(mask)
+        for start in zip(*np.nonzero(mask)):
+            if seen[start]:
+                continue
+            seen[start] = True
+            region, stack = [], [start]
+            while stack:
+                r, c = stack.pop()
+                region.append((r, c))
+                for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                    if 0 <= nr < grid and 0 <= nc < grid and mask[nr, nc] and not seen[nr, nc]:
+                        seen[nr, nc] = True
+                        stack.append((nr, nc))
+            if len(region) > len(best):
+                best = region
+        # Specks are noise, not a subject
+        if len(best) < grid * grid // 100:
+            return None
+        
+        rows, columns = zip(*best)
+        return (
+            int(min(columns)) / grid, int(min(rows)) / grid,
+            (int(max(columns)) + 1) / grid, (int(max(rows)) + 1) / grid
+        )
+    
+    def vision_payload(self, max_side: int, quality: int, crop: bool = False) -> bytes:
+        """
+        JPEG of at most max_side pixels per side, upright, optionally cropped to the subject
+        
+        Decodes at reduced resolution, applies the EXIF orientation (which
+        the re-encode would otherwise drop) and pads the subject crop by
+        VISION_CROP_PADDING. The original bytes are returned when they are
+        already no larger and need neither rotation nor cropping.
+        """
+        key = (max_side, quality, crop)
+        if key in self._vision_payloads:
+            return self._vision_payloads[key]
+        
+        width, height = self.dimensions
+        box = self.subject_box if crop else None
+        if box is not None:
+            pad = settings.VISION_CROP_PADDING
+            pad_x, pad_y = (box[2] - box[0]) * pad, (box[3] - box[1]) * pad
+            box = (max(0.0, box[0] - pad_x), max(0.0, box[1] - pad_y), min(1.0, box[2] + pad_x), min(1.0, box[3] + pad_y))
+            if (box[2] - box[0]) * (box[3] - box[1]) > 0.8:
+                box = None  # Nearly the whole frame, not worth a crop
+        
+        # Decode just enough pixels for the (cropped) region to still span max_side
+        fraction = (box[2] - box[0], box[3] - box[1]) if box else (1.0, 1.0)
+        scale = min(1.0, max_side / max(width * fraction[0], height * fraction[1]))
+        img = self.reduced((max(1, int(width * scale)), max(1, int(height * scale))))
+        if box is not None:
+            img = img.crop((
+                int(box[0] * img.width), int(box[1] * img.height),
+                int(box[2] * img.width), int(box[3] * img.height)
+            ))
+        img = img.convert('RGB')
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        
+        img = self.upright(img)
+        
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        payload = buffer.getvalue()
+        upright = self.exif.get("Orientation", 1) not in _ORIENTATION_TRANSPOSE
+        if len(payload) >= self.size and box is None and upright and self.format == "JPEG":
+            payload = self.data if isinstance(self.data, bytes) else bytes(self.data)
+        self._vision_payloads[key] = payload
+        return payload
+    
+    @cached_property
+    def exif(self) -> Dict[str, Any]:
+        """EXIF tags keyed by name, with binary values dropped"""
+        try:
+            raw = (self.header or self.image).getexif()
+        except Exception as e:
+            logger.warning(f"Could not read EXIF data: {e}")
+            return {}
+        
+        exif = {}
+        for tag_id, value in raw.items():
+            if isinstance(value, bytes):
+                continue
+            exif[ExifTags.TAGS.get(tag_id, str(tag_id))] = value
+        return exif
+    
+    def upright(self, img: Image.Image) -> Image.Image:
+        """Apply the payload's EXIF orientation to a view of it, which re-encoding would otherwise drop"""
+        orientation = self.exif.get("Orientation", 1)
+        if orientation in _ORIENTATION_TRANSPOSE:
+            img = img.transpose(_ORIENTATION_TRANSPOSE[orientation])
+        return img
+    
+    def thumbnail(self, size: Tuple[int, int], format: str = "JPEG", quality: int = 85) -> bytes:
+        """Encode an upright rendition that fits within `size`, keeping the aspect ratio"""
+        img = self.upright(self.reduced(size).convert('RGB'))
+        img.thumbnail(size)
+        buffer = io.BytesIO()
+        img.save(buffer, format=format, quality=quality)
+        return buffer.getvalue()
@@ -0,0 +1,60 @@
+"""
+Ingest of uploaded images without heap copies
+Large uploads are memory-mapped from the file they were spooled to while the request arrived
+"""
+
+import logging
+import mmap
+import os
+from typing import Optional
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+
+logger = logging.getLogger(__name__)
+
+def _map_spool(file) -> mmap.mmap:
+    """Map the temporary file an upload was spooled to, read-only"""
+    file.flush()
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _spool_path(file) -> Optional[str]:
+    """A path pool workers can open the spool file by, if it has one"""
+    name = getattr(file, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    # Anonymous temporary files stay reachable through this process's descriptors
+    path = f"/proc/{os.getpid()}/fd/{file.fileno()}"
+    return path if os.path.exists(path) else None
+
+async def ingest_upload(file: UploadFile) -> ImageFeatures:
+    """
+    Size-checked, hashed ImageFeatures over an uploaded file
+    
+    Multipart parsing has already spooled the part to a temporary file (the
+    body size itself is capped by BodySizeLimitMiddleware as it streams in).
+    Uploads under INGEST_MMAP_THRESHOLD are read as bytes; larger ones are
+    mapped, so hashing, classification and the storage upload all read the
+    page cache rather than a heap copy, and pool workers map the spool file
+    themselves. Callers close the features when done.
+    """
+    if file.size is not None and file.size > settings.MAX_IMAGE_SIZE:
+        raise HTTPException(status_code=413, detail=f"Image too large (max {settings.MAX_IMAGE_SIZE} bytes)")
+    
+    source = None
+    if file.size is not None and file.size >= max(1, settings.INGEST_MMAP_THRESHOLD):
+        data = await run_in_threadpool(_map_spool, file.file)
+        source = _spool_path(file.file)
+    else:
+        await file.seek(0)
+        data = await file.read()
+    
+    features = ImageFeatures(data, file.filename, file.content_type, source=source)
+    if features.size > settings.MAX_IMAGE_SIZE:
+        features.close()
+        raise HTTPException(status_code=413, detail=f"Image too large (max {settings.MAX_IMAGE_SIZE} bytes)")
+    
+    # MD5 reads the buffer in place and releases the GIL, so hash off the event loop
+    await run_in_threadpool(lambda: features.content_hash)
+    return features
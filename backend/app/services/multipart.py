@@ -0,0 +1,153 @@
+"""
+Parallel multipart uploads of large originals
+Parts are sliced from the shared payload without copying and sent by one bounded pool
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+import urllib3
+from minio import Minio
+from minio.datatypes import Part
+from minio.error import S3Error, ServerError
+from app.core.config import settings
+from app.services.image_decode import ImageBuffer
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+# S3 error codes worth sending a part again for
+RETRYABLE_CODES = {"RequestTimeout", "InternalError", "SlowDown", "ServiceUnavailable", "OperationAborted"}
+
+def part_ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """(offset, length) of each part, growing the part size if S3's part limit needs it"""
+    part_size = max(part_size, MIN_PART_SIZE, -(-size // MAX_PARTS))
+    return [(offset, min(part_size, size - offset)) for offset in range(0, size, part_size)]
+
+# Connection resets and timeouts that outlasted the HTTP client's own retries
+RETRYABLE_ERRORS = (
+    urllib3.exceptions.MaxRetryError,
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.TimeoutError,
+    ConnectionError,
+    TimeoutError
+)
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, S3Error):
+        return error.code in RETRYABLE_CODES
+    if isinstance(error, ServerError):
+        return error.status_code >= 500
+    # Anything else is a bug or a bad request, and sending the part again won't help
+    return isinstance(error, RETRYABLE_ERRORS)
+
+class ParallelUploader:
+    """
+    Multipart uploads with several parts in flight
+    
+    A single put_object stream is limited by one connection's throughput,
+    which large RAW originals feel most. Here each part is a memoryview of
+    the payload (a memory-mapped spool file for large uploads), so nothing
+    is copied, and parts go through one pool of STORAGE_UPLOAD_CONCURRENCY
+    threads shared by every upload, which bounds connections to MinIO no
+    matter how many uploads run at once. A failed part is retried on its
+    own, with exponential backoff; if one still fails the multipart upload
+    is aborted. The object only appears when the upload is completed, so
+    readers never see a partial original.
+    """
+    
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        part_size: Optional[int] = None,
+        retries: Optional[int] = None,
+        retry_base: Optional[float] = None
+    ):
+        self.concurrency = concurrency or settings.STORAGE_UPLOAD_CONCURRENCY
+        self.part_size = part_size or settings.STORAGE_PART_SIZE
+        self.retries = settings.STORAGE_PART_RETRIES if retries is None else retries
+        self.retry_base = settings.STORAGE_PART_RETRY_BASE if retry_base is None else retry_base
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._counters = {"uploads": 0, "parts": 0, "retries": 0, "aborted": 0, "bytes": 0}
+    
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="upload-parts")
+            return self._pool
+    
+    def _upload_part(
+        self,
+        client: Minio,
+        bucket: str,
+        name: str,
+        upload_id: str,
+        number: int,
+        chunk: memoryview
+    ) -> Part:
+        attempt = 0
+        while True:
+            try:
+                etag = client._upload_part(bucket, name, chunk, None, upload_id, number)
+                self._counters["parts"] += 1
+                self._counters["bytes"] += len(chunk)
+                return Part(number, etag)
+            except Exception as e:
+                if attempt >= self.retries or not _retryable(e):
+                    raise
+                attempt += 1
+                self._counters["retries"] += 1
+                delay = self.retry_base * 2 ** (attempt - 1)
+                logger.warning(f"Part {number} of {name} failed (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+    
+    def upload(self, client: Minio, bucket: str, name: str, data: ImageBuffer, content_type: str) -> str:
+        """Store `data` as `name` with its parts uploaded concurrently, returning the object's etag"""
+        upload_id = client._create_multipart_upload(bucket, name, {"Content-Type": content_type})
+        pool = self._executor()
+        futures: List[Future] = []
+        with memoryview(data) as view:
+            try:
+                for number, (offset, length) in enumerate(part_ranges(len(view), self.part_size), start=1):
+                    futures.append(pool.submit(
+                        self._upload_part, client, bucket, name, upload_id, number, view[offset:offset + length]
+                    ))
+                done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    future.result()
+                result = client._complete_multipart_upload(bucket, name, upload_id, [f.result() for f in futures])
+            except BaseException:
+                # Parts not yet started are dropped; running ones finish before the abort
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                self._counters["aborted"] += 1
+                try:
+                    client._abort_multipart_upload(bucket, name, upload_id)
+                except Exception as e:
+                    logger.warning(f"Could not abort multipart upload of {name}: {e}")
+                raise
+        self._counters["uploads"] += 1
+        return result.etag
+    
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "part_size": self.part_size,
+            "threshold": settings.STORAGE_PARALLEL_THRESHOLD,
+            **self._counters
+        }
+
+# Global uploader, its pool shut down from the application lifespan
+parallel_uploader = ParallelUploader()
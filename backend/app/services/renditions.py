@@ -0,0 +1,188 @@
+"""
+Thumbnail and preview renditions of stored images
+Rendered and uploaded on a worker pool after the request, then recorded on the nodes referencing the original
+"""
+
+import io
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from PIL import Image
+from app.core.config import settings
+from app.core.database import get_db
+from app.services.cache import cache_service
+from app.services.image_features import ImageFeatures
+from app.services.url_signer import url_signer
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "WEBP": ("webp", "image/webp"),
+    "JPEG": ("jpg", "image/jpeg"),
+}
+
+RECORD_QUERY = """
+OPTIONAL MATCH (i:Image {filename: $filename})
+OPTIONAL MATCH (o:Observation {filename: $filename})
+WITH collect(DISTINCT i) + collect(DISTINCT o) AS nodes
+UNWIND nodes AS n
+SET n.thumbnail_key = $thumbnail, n.preview_key = $preview
+"""
+
+def rendition_sizes() -> Dict[str, tuple]:
+    """Rendition names and the box each fits in, largest first"""
+    return {"preview": settings.PREVIEW_SIZE, "thumbnail": settings.THUMBNAIL_SIZE}
+
+def rendition_keys(content_hash: str, format: Optional[str] = None) -> Dict[str, str]:
+    """Deterministic object names of an image's renditions"""
+    ext = FORMATS[(format or settings.RENDITION_FORMAT).upper()][0]
+    return {name: f"renditions/{content_hash}/{name}.{ext}" for name in rendition_sizes()}
+
+class RenditionService:
+    """
+    Background rendition generation
+    
+    One reduced decode serves every rendition: the preview is cut from it
+    and the thumbnail from the preview. Both are made upright, encoded as
+    RENDITION_FORMAT and stored under renditions/<content hash>/, so
+    re-renders overwrite rather than duplicate. Failures are logged and
+    leave the node pointing at the original.
+    """
+    
+    def __init__(self, workers: Optional[int] = None, storage: Any = None):
+        self.workers = workers or settings.RENDITION_WORKERS
+        self._storage = storage
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "rendered": 0, "failed": 0, "bytes": 0}
+    
+    @property
+    def storage(self) -> Any:
+        if self._storage is None:
+            # Imported on first use, the storage service connects to MinIO when loaded
+            from app.services.storage import storage_service
+            self._storage = storage_service
+        return self._storage
+    
+    def object_keys(self, node: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """Object behind thumbnail_url and preview_url of an Image or Observation, the original until renditions exist"""
+        original = node.get("filename")
+        return {f"{name}_url": node.get(f"{name}_key") or original for name in ("thumbnail", "preview")}
+    
+    def urls(self, node: Dict[str, Any], signed: Optional[Dict[str, str]] = None) -> Dict[str, Optional[str]]:
+        """
+        thumbnail_url and preview_url of an Image or Observation
+        
+        List endpoints pass `signed`, the URLs of their whole page from
+        url_signer.sign_many, so nothing is signed per item.
+        """
+        keys = self.object_keys(node)
+        if signed is None:
+            signed = url_signer.sign_many(keys.values())
+        return {field: signed.get(key) if key else None for field, key in keys.items()}
+    
+    def render(self, features: ImageFeatures) -> Dict[str, bytes]:
+        """Encoded renditions of an image, keyed by name"""
+        format = settings.RENDITION_FORMAT.upper()
+        sizes = rendition_sizes()
+        img = features.upright(features.reduced(max(sizes.values())).convert('RGB'))
+        encoded = {}
+        for name, size in sizes.items():
+            img.thumbnail(size, Image.LANCZOS)
+            buffer = io.BytesIO()
+            img.save(buffer, format=format, quality=settings.RENDITION_QUALITY)
+            encoded[name] = buffer.getvalue()
+        return encoded
+    
+    def generate(self, features: ImageFeatures, filename: str, record: bool = True) -> Dict[str, str]:
+        """Render and upload an image's renditions, recording them unless `record` is off; returns their keys"""
+        content_type = FORMATS[settings.RENDITION_FORMAT.upper()][1]
+        keys = rendition_keys(features.content_hash)
+        for name, data in self.render(features).items():
+            self.storage.upload_bytes(keys[name], data, content_type)
+            self._counters["bytes"] += len(data)
+        if record:
+            self.record(filename, keys)
+        return keys
+    
+    def record(self, filename: str, keys: Dict[str, str]):
+        """Point the nodes referencing an original at its renditions"""
+        get_db().execute_write(RECORD_QUERY, {"filename": filename, **keys})
+        # Listings cached before now still point at the original
+        for pattern in ("images:*", "image:*", "identifications:recent:*"):
+            cache_service.clear_pattern(pattern)
+    
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="renditions")
+            return self._pool
+    
+    def _run(self, features: ImageFeatures, filename: str, view: memoryview, record: bool) -> Optional[Dict[str, str]]:
+        try:
+            keys = self.generate(features, filename, record)
+            self._counters["rendered"] += 1
+            return keys
+        except Exception as e:
+            self._counters["failed"] += 1
+            logger.error(f"Could not generate renditions of {filename}: {e}")
+            return None
+        finally:
+            view.release()
+    
+    def submit(self, features: ImageFeatures, filename: str, record: bool = True) -> Optional[Future]:
+        """
+        Generate renditions for a stored original in the background
+        
+        The payload stays readable until the job finishes even if the
+        caller closes the features first. With `record` off, the future's
+        result is the keys (None on failure), for `record_when_done` once
+        the nodes referencing the original exist.
+        """
+        if not settings.RENDITIONS_ENABLED:
+            return None
+        pool = self._executor()
+        self._counters["submitted"] += 1
+        # An exported view keeps a memory-mapped payload from being unmapped under the job
+        return pool.submit(self._run, features, filename, memoryview(features.data), record)
+    
+    def record_when_done(self, future: Future, filename: str):
+        """Record renditions submitted with `record` off once they are stored, without blocking the caller"""
+        pool = self._executor()
+        
+        def done(f: Future):
+            keys = None if f.cancelled() else f.result()
+            if keys is None:
+                return
+            try:
+                # Recorded on the pool, never on a caller that attached to a finished future
+                pool.submit(self._record_logged, filename, keys)
+            except RuntimeError:
+                logger.warning(f"Renditions of {filename} stored but not recorded, pool shut down")
+        
+        future.add_done_callback(done)
+    
+    def _record_logged(self, filename: str, keys: Dict[str, str]):
+        try:
+            self.record(filename, keys)
+        except Exception as e:
+            logger.error(f"Could not record renditions of {filename}: {e}")
+    
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.RENDITIONS_ENABLED,
+            "format": settings.RENDITION_FORMAT.upper(),
+            "workers": self.workers,
+            **self._counters
+        }
+
+# Global rendition service, its pool shut down from the application lifespan
+rendition_service = RenditionService()
@@ -1,14 +1,25 @@
 from minio import Minio
 from minio.error import S3Error
+from redis import RedisError
 import io
 import logging
-from typing import Optional, BinaryIO
+from typing import Any, Dict, Iterator, List, Optional, BinaryIO
 from app.core.config import settings
-import hashlib
+from app.core.database import get_db
+from app.services.image_features import ImageFeatures
+from app.services.url_signer import url_signer
+from app.services.blob_index import blob_index
+from app.services.multipart import parallel_uploader
 from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
+REFERENCES_QUERY = """
+MATCH (n)
+WHERE (n:Image OR n:Observation) AND n.filename = $filename
+RETURN CASE WHEN n:Image THEN 'image:' ELSE 'observation:' END + n.id as reference
+"""
+
 class StorageService:
     def __init__(self):
         self.client = Minio(
@@ -32,49 +43,123 @@ class StorageService:
     
     def upload_image(self, file_data: BinaryIO, filename: str, content_type: str = "image/jpeg") -> dict:
         """Upload image to MinIO"""
+        # Read file data into memory
+        file_bytes = file_data.read()
+        file_data.seek(0)
+        
+        return self.upload_features(ImageFeatures(file_bytes, filename, content_type))
+    
+    def upload_features(self, features: ImageFeatures, reference: Optional[str] = None) -> dict:
+        """
+        Upload an already-read image, reusing its content hash
+        
+        Originals are content addressed, so one already stored is not sent
+        again. `reference` ("image:<id>" or "observation:<id>") is counted
+        against the blob so it outlives every node but the last; see
+        release_image.
+        """
         try:
-            # Read file data into memory
-            file_bytes = file_data.read()
-            file_data.seek(0)
-            
-            # Generate unique filename using hash
-            file_hash = hashlib.md5(file_bytes).hexdigest()
+            filename = features.filename or ""
             
             # Determine file extension
             ext = filename.split('.')[-1] if '.' in filename else 'jpg'
-            stored_filename = f"{file_hash}.{ext}"
+            stored_filename = f"{features.content_hash}.{ext}"
             
-            # Create BytesIO object for upload
-            file_stream = io.BytesIO(file_bytes)
-            file_size = len(file_bytes)
+            try:
+                etag, deduplicated = blob_index.store(
+                    stored_filename,
+                    reference,
+                    stat=lambda: self._stat_etag(stored_filename),
+                    put=lambda: self._put_features(features, stored_filename)
+                )
+            except RedisError as e:
+                logger.warning(f"Blob index unavailable, uploading {stored_filename} unconditionally: {e}")
+                etag, deduplicated = self._put_features(features, stored_filename), False
             
-            # Upload to MinIO
+            return {
+                "filename": stored_filename,
+                "original_filename": filename,
+                "etag": etag,
+                "size": features.size,
+                "bucket": self.bucket,
+                "deduplicated": deduplicated
+            }
+        
+        except S3Error as e:
+            logger.error(f"Error uploading image: {e}")
+            raise
+    
+    def _stat_etag(self, stored_filename: str) -> Optional[str]:
+        try:
+            return self.client.stat_object(self.bucket, stored_filename).etag
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+    
+    def _put_features(self, features: ImageFeatures, stored_filename: str) -> str:
+        content_type = features.content_type or "image/jpeg"
+        if features.size >= settings.STORAGE_PARALLEL_THRESHOLD:
+            etag = parallel_uploader.upload(self.client, self.bucket, stored_filename, features.data, content_type)
+            logger.info(f"Uploaded image in parallel parts: {stored_filename}")
+            return etag
+        
+        # Streamed from the shared payload (possibly a mapped spool file);
+        # objects over one part are sent as a multipart upload
+        with features.open() as file_stream:
             result = self.client.put_object(
                 self.bucket,
                 stored_filename,
                 file_stream,
-                length=file_size,
+                length=features.size,
+                content_type=content_type,
+                part_size=settings.STORAGE_PART_SIZE
+            )
+        logger.info(f"Uploaded image: {stored_filename}")
+        return result.etag
+    
+    def upload_bytes(self, object_name: str, data: bytes, content_type: str) -> str:
+        """Store a small generated object, such as a rendition, under a fixed name"""
+        try:
+            result = self.client.put_object(
+                self.bucket,
+                object_name,
+                io.BytesIO(data),
+                length=len(data),
                 content_type=content_type
             )
-            
-            logger.info(f"Uploaded image: {stored_filename}")
-            
-            return {
-                "filename": stored_filename,
-                "original_filename": filename,
-                "etag": result.etag,
-                "size": file_size,
-                "bucket": self.bucket
-            }
-            
+            return result.etag
         except S3Error as e:
-            logger.error(f"Error uploading image: {e}")
+            logger.error(f"Error uploading {object_name}: {e}")
             raise
     
-    def get_image_url(self, filename: str, expires: int = 3600) -> str:
-        """Get direct public URL for image"""
-        # Since bucket is public, we can use direct URL
-        return f"http://localhost:9000/{self.bucket}/{filename}"
+    def get_image_url(self, filename: str) -> str:
+        """Browser-facing URL for an object, presigned unless the bucket is served publicly"""
+        return url_signer.sign(filename)
+    
+    def release_image(self, filename: str, reference: str) -> bool:
+        """
+        Drop a node's reference to an original, deleting it with the last one
+        
+        Returns whether the original was deleted. If the index can't be
+        reached the original is kept: a leaked blob is cheaper than one
+        deleted from under another node.
+        """
+        try:
+            return blob_index.release(
+                filename,
+                reference,
+                delete=lambda: self.delete_image(filename),
+                backfill=lambda: self.graph_references(filename)
+            )
+        except RedisError as e:
+            logger.error(f"Blob index unavailable, keeping image {filename}: {e}")
+            return False
+    
+    def graph_references(self, filename: str) -> List[str]:
+        """Every Image and Observation node whose original is `filename`"""
+        rows = get_db().execute_query(REFERENCES_QUERY, {"filename": filename})
+        return [row["reference"] for row in rows]
     
     def delete_image(self, filename: str) -> bool:
         """Delete image from MinIO"""
@@ -86,6 +171,32 @@ class StorageService:
             logger.error(f"Error deleting image: {e}")
             return False
     
+    def stat_image(self, filename: str) -> Dict[str, Any]:
+        """Object metadata without its data: etag, size, content type and modification time"""
+        stat = self.client.stat_object(self.bucket, filename)
+        return {
+            "etag": stat.etag,
+            "size": stat.size,
+            "content_type": stat.content_type,
+            "last_modified": stat.last_modified
+        }
+    
+    def stream_image(
+        self,
+        filename: str,
+        offset: int = 0,
+        length: Optional[int] = None,
+        chunk_size: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """Yield an object's bytes, or `length` of them from `offset`, a chunk at a time"""
+        response = self.client.get_object(self.bucket, filename, offset=offset, length=length or 0)
+        try:
+            for chunk in response.stream(chunk_size or settings.STORAGE_STREAM_CHUNK):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+    
     def get_image(self, filename: str) -> bytes:
         """Get image data from MinIO"""
         try:
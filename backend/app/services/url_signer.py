@@ -0,0 +1,138 @@
+"""
+URLs for stored objects, presigned per time bucket
+Signatures are memoized in-process so list endpoints reuse them across requests
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from minio import Minio
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Longest expiry SigV4 presigned URLs accept
+MAX_EXPIRES = 7 * 24 * 3600
+
+class URLSigner:
+    """
+    Presigned GET URLs that stay identical within a time bucket
+    
+    Each URL is signed with a request date floored to the start of the
+    current STORAGE_URL_BUCKET window and expires STORAGE_URL_EXPIRES after
+    the window ends, so it is valid for at least STORAGE_URL_EXPIRES. Every
+    call within a window therefore yields the same URL, which is answered
+    from an LRU instead of a fresh HMAC and also stays cacheable by browsers.
+    
+    URLs are signed for the host of STORAGE_PUBLIC_URL; a path prefix in it
+    is prepended after signing, for a proxy or CDN that strips it and
+    forwards to MinIO with the Host header intact. In "public" mode the base
+    is simply joined with the bucket and key, for a public bucket.
+    """
+    
+    def __init__(
+        self,
+        public_base: Optional[str] = None,
+        mode: Optional[str] = None,
+        expires: Optional[int] = None,
+        window: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        bucket: Optional[str] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.public_base = (public_base or settings.STORAGE_PUBLIC_URL).rstrip("/")
+        self.mode = (mode or settings.STORAGE_URL_MODE).lower()
+        self.window = window or settings.STORAGE_URL_BUCKET
+        self.expires = min(expires or settings.STORAGE_URL_EXPIRES, MAX_EXPIRES - self.window)
+        self.max_entries = max_entries or settings.STORAGE_URL_CACHE_SIZE
+        self.bucket = bucket or settings.MINIO_BUCKET
+        self._clock = clock
+        self._client: Optional[Minio] = None
+        self._signed: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "signed": 0}
+    
+    @property
+    def client(self) -> Minio:
+        """Client used only to sign, with the region fixed so signing never calls MinIO"""
+        if self._client is None:
+            parts = urlsplit(self.public_base)
+            self._client = Minio(
+                parts.netloc,
+                access_key=settings.MINIO_ACCESS_KEY,
+                secret_key=settings.MINIO_SECRET_KEY,
+                secure=parts.scheme == "https",
+                region=settings.MINIO_REGION
+            )
+        return self._client
+    
+    def _window_start(self) -> int:
+        now = int(self._clock())
+        return now - now % self.window
+    
+    def _presign(self, key: str, window_start: int) -> str:
+        signed = self.client.presigned_get_object(
+            self.bucket,
+            key,
+            expires=timedelta(seconds=self.window + self.expires),
+            request_date=datetime.fromtimestamp(window_start, timezone.utc)
+        )
+        parts = urlsplit(signed)
+        return f"{self.public_base}{parts.path}?{parts.query}"
+    
+    def sign(self, key: str) -> str:
+        """URL for one object"""
+        return self.sign_many([key])[key]
+    
+    def sign_many(self, keys: Iterable[Optional[str]]) -> Dict[str, str]:
+        """
+        URLs for a page of objects, keyed by object name
+        
+        Missing keys (None) are skipped and duplicates signed once; the whole
+        page is looked up under a single lock acquisition.
+        """
+        wanted = list(dict.fromkeys(key for key in keys if key))
+        if self.mode == "public":
+            return {key: f"{self.public_base}/{self.bucket}/{quote(key, safe='/')}" for key in wanted}
+        
+        window_start = self._window_start()
+        urls: Dict[str, str] = {}
+        with self._lock:
+            for key in wanted:
+                entry = self._signed.get(key)
+                if entry is not None and entry[0] == window_start:
+                    self._signed.move_to_end(key)
+                    urls[key] = entry[1]
+            self._counters["hits"] += len(urls)
+        
+        missing = [key for key in wanted if key not in urls]
+        if not missing:
+            return urls
+        signed = {key: self._presign(key, window_start) for key in missing}
+        urls.update(signed)
+        with self._lock:
+            for key, url in signed.items():
+                self._signed[key] = (window_start, url)
+                self._signed.move_to_end(key)
+            while len(self._signed) > self.max_entries:
+                self._signed.popitem(last=False)
+            self._counters["signed"] += len(signed)
+        return urls
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "public_base": self.public_base,
+            "window": self.window,
+            "expires": self.expires,
+            "entries": len(self._signed),
+            **self._counters
+        }
+
+# Global URL signer instance
+url_signer = URLSigner()
@@ -0,0 +1,279 @@
+"""
+Write-behind persistence for identification results
+Jobs are journaled to local disk before the response and persisted by a background drainer with retries
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE = "journal.jsonl"
+
+class WriteBehindQueue:
+    """
+    Durable queue of observations waiting to be stored
+    
+    `enqueue` spools the image under images/<id> and appends a "put" record to
+    an append-only journal, fsynced before the request is answered. One
+    process at a time holds the drainer lock; it tails the journal, so jobs
+    enqueued by every worker are persisted, calls the handler for each and
+    appends a "done" record on success. Failures are retried with
+    exponential backoff, and after WRITE_BEHIND_MAX_ATTEMPTS the job is set
+    aside under dead/. A restarted drainer replays every put without a done,
+    so handlers must be idempotent.
+    """
+    
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.WRITE_BEHIND_DIR
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._attempts: Dict[str, int] = {}
+        self._due: Dict[str, float] = {}
+        self._running: set = set()
+        self._offset = 0
+        self._leader = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._handler: Optional[Callable[[Dict[str, Any], ImageFeatures], None]] = None
+        self._counters = {"enqueued": 0, "persisted": 0, "retries": 0, "dead": 0}
+        self._last_error: Optional[str] = None
+    
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.directory, *parts)
+    
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Serialize journal appends and compaction across worker processes"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _append(self, records: List[Dict[str, Any]]):
+        data = "".join(json.dumps(record, default=str) + "\n" for record in records)
+        with self._file_lock():
+            with open(self._path(JOURNAL_FILE), "a") as f:
+                f.write(data)
+                if settings.WRITE_BEHIND_FSYNC:
+                    f.flush()
+                    os.fsync(f.fileno())
+    
+    def _image_path(self, job_id: str) -> str:
+        return self._path("images", job_id)
+    
+    def _spool_image(self, job_id: str, features: ImageFeatures):
+        path = self._image_path(job_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = f"{path}.{os.getpid()}.tmp"
+        with open(staging, "wb") as f:
+            f.write(features.data)
+            if settings.WRITE_BEHIND_FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(staging, path)
+    
+    def enqueue(self, features: ImageFeatures, observation: Dict[str, Any]):
+        """
+        Durably record an observation and its image for later persistence
+        
+        `observation` must carry a unique "id"; the image's filename, content
+        type and hash are added to it.
+        """
+        job = {
+            **observation,
+            "content_hash": features.content_hash,
+            "original_filename": features.filename,
+            "content_type": features.content_type,
+        }
+        self._spool_image(job["id"], features)
+        self._append([{"op": "put", "job": job}])
+        self._counters["enqueued"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    def _replay(self):
+        """Apply journal records written since the last replay"""
+        try:
+            with open(self._path(JOURNAL_FILE), "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Only complete lines; a partial one is picked up next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["op"] == "put":
+                job_id = record["job"]["id"]
+                self._jobs[job_id] = record["job"]
+                self._due.setdefault(job_id, 0.0)
+            else:
+                self._forget(record["id"])
+        self._offset += end
+    
+    def _forget(self, job_id: str):
+        job = self._jobs.pop(job_id, None)
+        self._due.pop(job_id, None)
+        self._attempts.pop(job_id, None)
+        if job is None:
+            return
+        try:
+            os.remove(self._image_path(job_id))
+        except FileNotFoundError:
+            pass
+    
+    def _compact(self):
+        """Rewrite the journal with only pending jobs once it has grown large"""
+        with self._file_lock():
+            self._replay()
+            staging = self._path(f"{JOURNAL_FILE}.tmp")
+            with open(staging, "w") as f:
+                for job in self._jobs.values():
+                    f.write(json.dumps({"op": "put", "job": job}, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(staging, self._path(JOURNAL_FILE))
+            self._offset = os.path.getsize(self._path(JOURNAL_FILE))
+    
+    def _try_lead(self) -> bool:
+        """Take the drainer lock if no other process holds it"""
+        if self._leader is not None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        f = open(self._path(".drainer"), "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        self._leader = f
+        self._offset = 0
+        self._jobs.clear()
+        self._due.clear()
+        with self._file_lock():
+            self._replay()
+        if self._jobs:
+            logger.info(f"Write-behind drainer resuming {len(self._jobs)} pending jobs")
+        return True
+    
+    def _load_image(self, job: Dict[str, Any]) -> ImageFeatures:
+        with open(self._image_path(job["id"]), "rb") as f:
+            data = f.read()
+        return ImageFeatures(data, job.get("original_filename"), job.get("content_type"))
+    
+    async def _persist(self, handler: Callable[[Dict[str, Any], ImageFeatures], None], job: Dict[str, Any]):
+        job_id = job["id"]
+        try:
+            await run_in_threadpool(lambda: handler(job, self._load_image(job)))
+        except Exception as e:
+            attempts = self._attempts.get(job_id, 0) + 1
+            self._attempts[job_id] = attempts
+            self._last_error = f"{job_id}: {e}"
+            if attempts >= settings.WRITE_BEHIND_MAX_ATTEMPTS:
+                logger.error(f"Giving up on observation {job_id} after {attempts} attempts: {e}")
+                os.makedirs(self._path("dead"), exist_ok=True)
+                with open(self._path("dead", f"{job_id}.json"), "w") as f:
+                    json.dump({"job": job, "error": str(e)}, f, default=str)
+                if os.path.exists(self._image_path(job_id)):
+                    os.replace(self._image_path(job_id), self._path("dead", f"{job_id}.image"))
+                self._append([{"op": "dead", "id": job_id}])
+                self._forget(job_id)
+                self._counters["dead"] += 1
+            else:
+                delay = min(settings.WRITE_BEHIND_RETRY_BASE * 2 ** (attempts - 1), settings.WRITE_BEHIND_RETRY_MAX)
+                logger.warning(f"Persisting observation {job_id} failed (attempt {attempts}), retrying in {delay:.1f}s: {e}")
+                self._due[job_id] = time.monotonic() + delay
+                self._counters["retries"] += 1
+            return
+        finally:
+            self._running.discard(job_id)
+        
+        self._append([{"op": "done", "id": job_id}])
+        self._forget(job_id)
+        self._counters["persisted"] += 1
+    
+    async def drain_once(self, handler: Callable[[Dict[str, Any], ImageFeatures], None]) -> int:
+        """Persist every job that is due, returning how many were attempted"""
+        if not self._try_lead():
+            return 0
+        with self._file_lock():
+            self._replay()
+        
+        now = time.monotonic()
+        due = [job for job_id, job in self._jobs.items() if self._due.get(job_id, 0.0) <= now and job_id not in self._running]
+        slots = asyncio.Semaphore(settings.WRITE_BEHIND_CONCURRENCY)
+        
+        async def run(job: Dict[str, Any]):
+            async with slots:
+                await self._persist(handler, job)
+        
+        for job in due:
+            self._running.add(job["id"])
+        await asyncio.gather(*[run(job) for job in due])
+        
+        if not self._jobs and self._offset >= settings.WRITE_BEHIND_COMPACT_BYTES:
+            await run_in_threadpool(self._compact)
+        return len(due)
+    
+    async def run(self, handler: Callable[[Dict[str, Any], ImageFeatures], None]):
+        """Drain until cancelled, woken early by local enqueues"""
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.drain_once(handler)
+            except Exception as e:
+                logger.error(f"Write-behind drainer error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.WRITE_BEHIND_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+    
+    def start(self, handler: Callable[[Dict[str, Any], ImageFeatures], None]):
+        """Start draining in the background with `handler(job, features)` persisting each job"""
+        self._handler = handler
+        self._task = asyncio.ensure_future(self.run(handler))
+    
+    async def stop(self, timeout: float = 5.0):
+        """
+        Stop draining after one last pass and release the drainer lock
+        
+        Jobs that still fail stay journaled for the next drainer.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            try:
+                await asyncio.wait_for(self.drain_once(self._handler), timeout)
+            except Exception as e:
+                logger.warning(f"Write-behind queue not fully drained at shutdown: {e}")
+        if self._leader is not None:
+            self._leader.close()
+            self._leader = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "leader": self._leader is not None,
+            "pending": len(self._jobs) if self._leader is not None else None,
+            "retrying": sum(1 for attempts in self._attempts.values() if attempts),
+            "journal_bytes": self._offset,
+            "last_error": self._last_error,
+            **self._counters
+        }
+
+# Global queue instance, drained from the application lifespan
+write_behind_queue = WriteBehindQueue()
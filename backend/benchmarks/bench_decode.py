@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark full-resolution vs reduced-resolution decoding for the free classifier views
+
+Each case runs in a fresh subprocess so peak RSS is measured per decode path.
+
+Usage:
+    python benchmarks/bench_decode.py [--runs 5] [--sizes 12,24,45]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import os
+
+from common import corpus_image, time_call, peak_rss_mb, print_table
+
+def full_path(data: bytes):
+    """The original path: two full decodes, then resize"""
+    import io
+    from PIL import Image
+    Image.open(io.BytesIO(data)).convert('RGB').resize((150, 150))
+    Image.open(io.BytesIO(data)).convert('L').resize((100, 100))
+
+def reduced_path(data: bytes):
+    from app.services.image_features import ImageFeatures
+    features = ImageFeatures(data)
+    features.rgb_thumbnail
+    features.grayscale
+
+def run_child(megapixels: float, fmt: str, mode: str, runs: int):
+    data = corpus_image(megapixels, fmt)
+    fn = full_path if mode == "full" else reduced_path
+    baseline = peak_rss_mb()
+    result = time_call(lambda: fn(data), runs=runs, warmup=1)
+    result["peak_rss_mb"] = peak_rss_mb() - baseline
+    print(json.dumps(result))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--sizes", default="12,24,45", help="Megapixel sizes to test")
+    parser.add_argument("--formats", default="JPEG,PNG")
+    parser.add_argument("--child", nargs=3, metavar=("MP", "FORMAT", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(float(args.child[0]), args.child[1], args.child[2], args.runs)
+        return
+    
+    rows = []
+    for fmt in args.formats.split(","):
+        for megapixels in [float(s) for s in args.sizes.split(",")]:
+            corpus_image(megapixels, fmt)  # Generate outside the measured child
+            for mode in ("full", "reduced"):
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--runs", str(args.runs),
+                     "--child", str(megapixels), fmt, mode],
+                    capture_output=True, text=True, check=True
+                ).stdout.strip().splitlines()[-1]
+                result = json.loads(output)
+                rows.append({
+                    "format": fmt,
+                    "megapixels": megapixels,
+                    "path": mode,
+                    "p50_ms": result["p50_ms"],
+                    "p99_ms": result["p99_ms"],
+                    "peak_rss_mb": result["peak_rss_mb"],
+                })
+    
+    print_table(rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the nearest-neighbor embedding index at 10k, 100k and 1M vectors
+
+For each size a float16 snapshot of random unit vectors is generated once
+under .corpus and reused, then a fresh process maps it and measures load time and RSS,
+single-query and 32-query search latency, a journal append, and a snapshot
+that folds the append back in.
+
+Usage:
+    python benchmarks/bench_knn.py [--sizes 10000,100000,1000000] [--queries 50]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from common import CORPUS_DIR, peak_rss_mb, percentile, print_table
+
+SPECIES = [{"scientific_name": f"Species {i}", "common_name": f"Fish {i}", "key": f"fish_{i}"} for i in range(200)]
+
+def write_snapshot(directory: str, count: int, dim: int = 128, seed: int = 0):
+    """Generation 1 snapshot in the index's on-disk layout, written in chunks"""
+    if os.path.exists(os.path.join(directory, "CURRENT")):
+        return
+    path = os.path.join(directory, "gen-000001")
+    os.makedirs(path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    vectors = np.lib.format.open_memmap(
+        os.path.join(path, "vectors.npy"), mode="w+", dtype=np.float16, shape=(count, dim)
+    )
+    for start in range(0, count, 100_000):
+        block = rng.normal(size=(min(100_000, count - start), dim)).astype(np.float32)
+        vectors[start:start + len(block)] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    vectors.flush()
+    del vectors
+    np.save(os.path.join(path, "labels.npy"), rng.integers(0, len(SPECIES), count, dtype=np.int32))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({
+            "generation": 1,
+            "count": count,
+            "dim": dim,
+            "species": SPECIES,
+            "observation_ids": [f"obs-{i}" for i in range(count)]
+        }, f)
+    with open(os.path.join(directory, "CURRENT"), "w") as f:
+        f.write("1")
+
+def run_child(directory: str, queries: int):
+    from app.services.ai_identification.embedding_index import EmbeddingIndex
+    
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    index = EmbeddingIndex(directory)
+    index.load()
+    load_ms = (time.perf_counter() - start) * 1000
+    
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(queries + 32, index.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    
+    single = []
+    for query in vectors[:queries]:
+        start = time.perf_counter()
+        rows, sims = index.search_many(query, 15)
+        index.vote(rows[0], sims[0])
+        single.append((time.perf_counter() - start) * 1000)
+    
+    start = time.perf_counter()
+    index.search_many(vectors[queries:], 15)
+    batch_ms = (time.perf_counter() - start) * 1000
+    
+    start = time.perf_counter()
+    index.append("bench-append", SPECIES[0], vectors[0])
+    append_ms = (time.perf_counter() - start) * 1000
+    
+    start = time.perf_counter()
+    index.snapshot()
+    snapshot_ms = (time.perf_counter() - start) * 1000
+    
+    print(json.dumps({
+        "load_ms": load_ms,
+        "rss_mb": peak_rss_mb() - baseline,
+        "query_p50_ms": percentile(single, 0.50),
+        "query_p99_ms": percentile(single, 0.99),
+        "batch32_per_query_ms": batch_ms / 32,
+        "append_ms": append_ms,
+        "snapshot_ms": snapshot_ms,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--child", metavar="DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(args.child, args.queries)
+        return
+    
+    rows = []
+    for count in [int(s) for s in args.sizes.split(",")]:
+        directory = os.path.join(CORPUS_DIR, f"knn-{count}")
+        write_snapshot(directory, count)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--queries", str(args.queries), "--child", directory],
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        rows.append({"vectors": count, **json.loads(output)})
+    
+    print_table(rows)
+
+if __name__ == "__main__":
+    main()
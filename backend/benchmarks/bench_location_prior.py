@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark the location prior's re-rank against its 1 ms p99 budget
+
+Observations of a few thousand species are clustered around dive sites
+worldwide. "random" probes land anywhere, mostly in sparse cells; "site"
+probes land on dive sites, whose neighbourhoods hold hundreds of species.
+Exits non-zero when any p99 exceeds --budget-ms.
+
+Usage:
+    python benchmarks/bench_location_prior.py [--observations 100000,1000000] [--runs 5000]
+"""
+
+import argparse
+import gc
+import random
+import sys
+import time
+
+from common import percentile, print_table
+from app.services.ai_identification.location_prior import LocationPrior, OBSERVATIONS_QUERY
+
+class SyntheticDB:
+    def __init__(self, observations: int, species: int, sites: int, seed: int = 0):
+        rng = random.Random(seed)
+        self.sites = [(rng.uniform(-40, 40), rng.uniform(-180, 180)) for _ in range(sites)]
+        self.records = []
+        for i in range(observations):
+            lat, lon = rng.choice(self.sites)
+            # Each site favours a few hundred species, with a long tail
+            name = f"species-{int(rng.paretovariate(1.2) * (hash((lat, lon)) % 97 + 1)) % species}"
+            self.records.append({
+                "id": f"obs-{i}",
+                "latitude": lat + rng.gauss(0, 0.5),
+                "longitude": lon + rng.gauss(0, 0.5),
+                "timestamp": i,
+                "scientific_name": name,
+                "common_name": name
+            })
+    
+    def execute_query(self, query, parameters=None):
+        return self.records if query == OBSERVATIONS_QUERY else []
+
+def probe(prior: LocationPrior, points, predictions):
+    samples = []
+    for lat, lon in points:
+        start = time.perf_counter()
+        prior.rerank(predictions, lat, lon)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--observations", default="100000,1000000")
+    parser.add_argument("--species", type=int, default=3000)
+    parser.add_argument("--sites", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=5000)
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    args = parser.parse_args()
+    
+    rng = random.Random(1)
+    predictions = [{"scientific_name": f"species-{i}", "confidence": 0.9 - i * 0.1} for i in range(5)]
+    rows = []
+    for count in [int(c) for c in args.observations.split(",")]:
+        db = SyntheticDB(count, args.species, args.sites)
+        prior = LocationPrior()
+        start = time.perf_counter()
+        prior.load(db)
+        load_ms = (time.perf_counter() - start) * 1000
+        sites = db.sites
+        # The synthetic rows stand in for Neo4j and are not part of the service's heap
+        del db
+        gc.collect()
+        
+        anywhere = [(rng.uniform(-40, 40), rng.uniform(-180, 180)) for _ in range(args.runs)]
+        on_site = [rng.choice(sites) for _ in range(args.runs)]
+        for mode, points in (("random", anywhere), ("site", on_site)):
+            samples = probe(prior, points, predictions)
+            rows.append({
+                "observations": count,
+                "mode": mode,
+                "load_ms": load_ms,
+                "p50_ms": percentile(samples, 0.50),
+                "p99_ms": percentile(samples, 0.99),
+                "max_ms": max(samples),
+            })
+    
+    print_table(rows)
+    worst = max(row["p99_ms"] for row in rows)
+    print(f"\nWorst p99 {worst:.3f} ms against a {args.budget_ms:g} ms budget")
+    if worst > args.budget_ms:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the local ONNX Runtime classifier at batch sizes 1, 8 and 32
+
+"inference" times one session.run over an already preprocessed batch.
+"end_to_end" sends concurrent identifications through the request batcher,
+so it includes decoding, preprocessing and the wait for a batch to fill.
+The model is a randomly initialized int8 CNN of realistic input size.
+
+Usage:
+    python benchmarks/bench_onnx.py [--batches 1,8,32] [--threads 2] [--sessions 2] [--images 128]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+import numpy as np
+
+from common import CORPUS_DIR, corpus_image, percentile, print_table, time_call
+from tiny_onnx import build_model
+from app.services.ai_identification.batching import BatchingClassifier
+from app.services.ai_identification.onnx_classifier import OnnxClassifier
+from app.services.image_features import ImageFeatures
+
+def bench_inference(classifier: OnnxClassifier, batch_size: int, runs: int) -> dict:
+    rng = np.random.default_rng(0)
+    size = classifier.input_size
+    batch = rng.normal(0, 1, (batch_size, 3, size, size)).astype(np.float32)
+    result = time_call(lambda: classifier.run(batch), runs=runs, warmup=2)
+    return {
+        "p50_ms": result["p50_ms"],
+        "p99_ms": result["p99_ms"],
+        "images_per_sec": result["ops_per_sec"] * batch_size,
+    }
+
+async def bench_end_to_end(classifier: OnnxClassifier, batch_size: int, images: list) -> dict:
+    batcher = BatchingClassifier(classifier, max_batch=batch_size, batch_window=0.005)
+    latencies = []
+    
+    async def one(data: bytes):
+        start = time.perf_counter()
+        await batcher.identify(ImageFeatures(data))
+        latencies.append((time.perf_counter() - start) * 1000)
+    
+    await one(images[0])  # Warm up the thread pool
+    latencies.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*[one(data) for data in images])
+    elapsed = time.perf_counter() - start
+    return {
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+        "images_per_sec": len(images) / elapsed,
+        "mean_batch": batcher.stats()["mean_batch_size"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", default="1,8,32")
+    parser.add_argument("--threads", type=int, default=2, help="Intra-op threads per session")
+    parser.add_argument("--sessions", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--images", type=int, default=128, help="Concurrent requests in the end-to-end run")
+    args = parser.parse_args()
+    
+    model_path, labels_path = build_model(
+        os.path.join(CORPUS_DIR, "onnx"), size=224, channels=(16, 32, 64, 128)
+    )
+    classifier = OnnxClassifier(
+        model_path, labels_path, sessions=args.sessions, intra_op_threads=args.threads
+    )
+    images = [corpus_image(0.5, seed=i % 8) for i in range(args.images)]
+    
+    rows = []
+    for batch_size in [int(b) for b in args.batches.split(",")]:
+        rows.append({"mode": "inference", "batch": batch_size, **bench_inference(classifier, batch_size, args.runs)})
+        rows.append({"mode": "end_to_end", "batch": batch_size, **asyncio.run(bench_end_to_end(classifier, batch_size, images))})
+    
+    print(f"intra-op threads: {args.threads}, sessions: {args.sessions}")
+    print_table(rows, ["mode", "batch", "p50_ms", "p99_ms", "images_per_sec", "mean_batch"])
+
+if __name__ == "__main__":
+    main()
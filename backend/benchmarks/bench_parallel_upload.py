@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark upload throughput of large originals against part concurrency
+
+Each payload is stored in the local S3 stand-in, whose connections are each
+capped at --link-mbps like a single TCP stream to a remote MinIO. The table
+compares put_object with one stream and with minio's default three, and
+the parallel multipart uploader at each --concurrency, so the scaling with
+parts in flight is visible without a MinIO deployment.
+
+Usage:
+    python benchmarks/bench_parallel_upload.py [--sizes 20,50,80] [--concurrency 1,2,4,8] [--part-mb 8] [--link-mbps 400] [--runs 3]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+from common import percentile, print_table
+from fake_s3 import FakeS3Server
+from minio import Minio
+from app.services.multipart import ParallelUploader
+
+MB = 1024 * 1024
+
+def timed_ms(upload, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        upload()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentile(samples, 0.50)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="20,50,80", help="Payload sizes in MB")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Parts in flight to try")
+    parser.add_argument("--part-mb", type=int, default=8)
+    parser.add_argument("--link-mbps", type=float, default=400.0, help="Upload rate cap per connection")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    
+    rows = []
+    with FakeS3Server(link_mbps=args.link_mbps) as server:
+        client = Minio(server.endpoint, access_key="bench", secret_key="benchsecret", secure=False, region="us-east-1")
+        for size_mb in (int(s) for s in args.sizes.split(",")):
+            data = os.urandom(size_mb * MB)
+            
+            def put(streams: int):
+                client.put_object("bench", "original.raw", io.BytesIO(data), len(data),
+                                  part_size=args.part_mb * MB, num_parallel_uploads=streams)
+            
+            cases = [("put_object, 1 stream", lambda: put(1)), ("put_object, minio default 3", lambda: put(3))]
+            uploaders = []
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                uploader = ParallelUploader(concurrency=concurrency, part_size=args.part_mb * MB)
+                uploaders.append(uploader)
+                cases.append((f"parallel, {concurrency} parts", lambda u=uploader: u.upload(client, "bench", "original.raw", data, "image/x-raw")))
+            
+            baseline_ms = None
+            for name, upload in cases:
+                p50_ms = timed_ms(upload, args.runs)
+                baseline_ms = baseline_ms or p50_ms
+                rows.append({
+                    "size_mb": size_mb,
+                    "upload": name,
+                    "p50_ms": p50_ms,
+                    "mb_per_sec": size_mb / (p50_ms / 1000),
+                    "speedup": baseline_ms / p50_ms,
+                })
+            for uploader in uploaders:
+                uploader.shutdown()
+    
+    print(f"{args.part_mb} MB parts, each connection capped at {args.link_mbps:g} Mbit/s")
+    print_table(rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark API startup: `import app.main` time, memory and which classifier modules it pulls in
+
+Each run imports the app in a fresh subprocess. The first-use rows then load
+each provider through the registry to show what deferring it saves at startup.
+A per-module breakdown from `python -X importtime` follows.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 12]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import os
+
+from common import percentile, peak_rss_mb, print_table
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only some providers need; none of these should load at startup
+PROVIDER_MODULES = [
+    "tenacity",
+    "google.cloud.vision",
+    "app.services.ai_identification.google_vision_rest",
+    "app.services.ai_identification.resilience",
+    "app.services.ai_identification.cascade",
+    "app.services.ai_identification.free_classifier",
+    "app.services.ai_identification.mock_service",
+]
+
+def run_child(provider: str):
+    import time
+    start = time.perf_counter()
+    import app.main  # noqa: F401
+    import_seconds = time.perf_counter() - start
+    import_rss = peak_rss_mb()
+    result = {
+        "import_ms": import_seconds * 1000,
+        "import_rss_mb": import_rss,
+        "provider_modules": [m for m in PROVIDER_MODULES if m in sys.modules],
+    }
+    if provider != "none":
+        from app.services.ai_identification.registry import provider_registry
+        start = time.perf_counter()
+        provider_registry.get(provider).version
+        result["first_use_ms"] = (time.perf_counter() - start) * 1000
+        result["first_use_rss_mb"] = peak_rss_mb() - import_rss
+    print(json.dumps(result))
+
+def spawn(args: list) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+
+def import_breakdown(top: int):
+    """Slowest modules by cumulative import time"""
+    stderr = spawn(["-X", "importtime", "-c", "import app.main"]).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12, help="Modules to show in the import breakdown")
+    parser.add_argument("--providers", default="mock,free,vision,cascade")
+    parser.add_argument("--child", metavar="PROVIDER", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(args.child)
+        return
+    
+    rows = []
+    for provider in ["none"] + args.providers.split(","):
+        results = [
+            json.loads(spawn([os.path.abspath(__file__), "--child", provider]).stdout.strip().splitlines()[-1])
+            for _ in range(args.runs)
+        ]
+        imports = [r["import_ms"] for r in results]
+        first_use = [r.get("first_use_ms", 0.0) for r in results]
+        rows.append({
+            "first_use": provider,
+            "import_p50_ms": percentile(imports, 0.50),
+            "import_rss_mb": results[-1]["import_rss_mb"],
+            "first_use_p50_ms": percentile(first_use, 0.50) if provider != "none" else None,
+            "first_use_rss_mb": results[-1].get("first_use_rss_mb"),
+            "provider_modules_at_import": ",".join(results[-1]["provider_modules"]) or "-",
+        })
+    
+    print_table(rows)
+    print()
+    print_table(import_breakdown(args.top))
+
+if __name__ == "__main__":
+    main()
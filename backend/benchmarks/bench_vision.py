@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark Google Vision client throughput against the local fake Vision server
+
+Compares one annotate call per image with micro-batched calls of up to 16 images,
+both over the pooled async client. The fake adds a fixed latency per HTTP call.
+
+Usage:
+    python benchmarks/bench_vision.py [--images 256] [--latency 0.15] [--concurrency 64]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+from common import corpus_image, percentile, print_table
+from fake_vision import FakeVisionServer
+from app.services.ai_identification.google_vision_rest import GoogleVisionRESTService
+
+async def drive(service: GoogleVisionRESTService, images, concurrency: int):
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    
+    async def one(data: bytes):
+        async with slots:
+            start = time.perf_counter()
+            await service.identify_species(data)
+            latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one(data) for data in images))
+    elapsed = time.perf_counter() - start
+    await service.close()
+    return elapsed, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.15, help="Seconds the fake adds per call")
+    parser.add_argument("--concurrency", type=int, default=64, help="Identifications in flight")
+    args = parser.parse_args()
+    
+    # Small distinct payloads; the fake ignores their content
+    image = corpus_image(0.3)
+    images = [image + bytes([i % 256]) for i in range(args.images)]
+    
+    rows = []
+    with FakeVisionServer(latency=args.latency) as server:
+        for name, batch_size in (("per-image", 1), ("batched", 16)):
+            calls_before = server.calls
+            service = GoogleVisionRESTService(api_key="bench", base_url=server.url, batch_size=batch_size)
+            elapsed, latencies = asyncio.run(drive(service, images, args.concurrency))
+            rows.append({
+                "client": name,
+                "images_per_sec": round(len(images) / elapsed, 1),
+                "api_calls": server.calls - calls_before,
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            })
+    
+    print_table(rows)
+
+if __name__ == "__main__":
+    main()
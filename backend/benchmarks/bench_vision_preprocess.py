@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark the bytes and latency Vision preprocessing saves per identification
+
+For each upload size the original and the prepared (downscaled, re-encoded)
+image are sent through the Vision client to the local fake server. The table
+reports the base64 bytes uploaded, the preprocessing time, the measured
+round trip over loopback, and the upload time that payload would take over
+an --uplink-mbps link, which is what dominates in production.
+
+Usage:
+    python benchmarks/bench_vision_preprocess.py [--sizes 3,12,24,48] [--uplink-mbps 50] [--runs 5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+from common import corpus_image, percentile, print_table
+from fake_vision import FakeVisionServer
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+from app.services.ai_identification.google_vision_rest import GoogleVisionRESTService, prepare_image
+
+def round_trip_ms(server: FakeVisionServer, payload: bytes, runs: int) -> float:
+    """Median latency of single-image annotate calls carrying payload"""
+    service = GoogleVisionRESTService(api_key="bench", base_url=server.url, batch_size=1)
+    
+    async def run():
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            await service.identify_species(payload)
+            samples.append((time.perf_counter() - start) * 1000)
+        await service.close()
+        return percentile(samples, 0.50)
+    
+    return asyncio.run(run())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="3,12,24,48", help="Megapixels of the synthetic JPEG uploads")
+    parser.add_argument("--png", type=float, default=12, help="Megapixels of an additional PNG upload, 0 to skip")
+    parser.add_argument("--uplink-mbps", type=float, default=50.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    
+    uploads = [(f"{mp:g}MP JPEG", corpus_image(mp)) for mp in (float(s) for s in args.sizes.split(","))]
+    if args.png:
+        uploads.append((f"{args.png:g}MP PNG", corpus_image(args.png, fmt="PNG")))
+    
+    def upload_ms(size: int) -> float:
+        return size * 8 / (args.uplink_mbps * 1_000_000) * 1000
+    
+    rows = []
+    with FakeVisionServer() as server:
+        for name, data in uploads:
+            features = ImageFeatures(data)
+            start = time.perf_counter()
+            prepared = prepare_image(features)
+            prepare_ms = (time.perf_counter() - start) * 1000
+            
+            sent_original = (len(data) + 2) // 3 * 4
+            sent_prepared = (len(prepared) + 2) // 3 * 4
+            original_ms = round_trip_ms(server, data, args.runs) + upload_ms(sent_original)
+            prepared_ms = prepare_ms + round_trip_ms(server, prepared, args.runs) + upload_ms(sent_prepared)
+            rows.append({
+                "upload": name,
+                "original_kb": sent_original / 1024,
+                "prepared_kb": sent_prepared / 1024,
+                "reduction": sent_original / sent_prepared,
+                "prepare_ms": prepare_ms,
+                "original_ms": original_ms,
+                "prepared_ms": prepared_ms,
+                "saved_ms": original_ms - prepared_ms,
+            })
+    
+    print(f"max side {settings.VISION_MAX_SIDE}px, quality {settings.VISION_JPEG_QUALITY}, "
+          f"latencies include upload at {args.uplink_mbps:g} Mbit/s")
+    print_table(rows)
+
+if __name__ == "__main__":
+    main()
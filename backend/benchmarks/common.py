@@ -0,0 +1,106 @@
+"""
+Shared helpers for the backend benchmark scripts
+Synthetic image corpus, timing statistics and memory measurement
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import resource
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".corpus")
+
+def megapixel_size(megapixels: float, aspect: float = 1.5) -> Tuple[int, int]:
+    """(width, height) for a 3:2 frame of roughly the given megapixels"""
+    height = int((megapixels * 1_000_000 / aspect) ** 0.5)
+    return int(height * aspect), height
+
+def make_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """A synthetic underwater scene: blue gradient, noise and a few colored fish"""
+    rng = np.random.default_rng(seed)
+    small_w, small_h = max(1, width // 8), max(1, height // 8)
+    gradient = np.linspace(0, 1, small_h)[:, None]
+    base = np.empty((small_h, small_w, 3), dtype=np.float32)
+    base[..., 0] = 10 + 30 * gradient
+    base[..., 1] = 60 + 60 * gradient
+    base[..., 2] = 140 + 80 * (1 - gradient)
+    base += rng.normal(0, 12, base.shape)
+    img = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8)).resize((width, height))
+    
+    draw = ImageDraw.Draw(img)
+    palette = ["orange", "yellow", "#0080ff", "gray", "#ffccee", "#2d5016"]
+    for i in range(6):
+        cx, cy = rng.integers(0, width), rng.integers(0, height)
+        rx, ry = width // rng.integers(8, 20), height // rng.integers(10, 25)
+        draw.ellipse([cx - rx, cy - ry, cx + rx, cy + ry], fill=palette[i % len(palette)])
+    return img
+
+def encode(img: Image.Image, fmt: str = "JPEG", quality: int = 90) -> bytes:
+    buffer = io.BytesIO()
+    if fmt.upper() == "JPEG":
+        img.save(buffer, format="JPEG", quality=quality)
+    else:
+        img.save(buffer, format=fmt, compress_level=1)
+    return buffer.getvalue()
+
+def corpus_image(megapixels: float, fmt: str = "JPEG", seed: int = 0) -> bytes:
+    """Encoded synthetic image, cached on disk between runs"""
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    ext = "jpg" if fmt.upper() == "JPEG" else fmt.lower()
+    path = os.path.join(CORPUS_DIR, f"{megapixels:g}mp_{seed}.{ext}")
+    if not os.path.exists(path):
+        width, height = megapixel_size(megapixels)
+        with open(path, "wb") as f:
+            f.write(encode(make_image(width, height, seed), fmt))
+    with open(path, "rb") as f:
+        return f.read()
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def time_call(fn: Callable[[], object], runs: int = 10, warmup: int = 1) -> Dict[str, float]:
+    """Run fn repeatedly and summarize wall-clock latency in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    total = sum(samples) / 1000
+    return {
+        "runs": runs,
+        "ops_per_sec": runs / total if total else float("inf"),
+        "p50_ms": percentile(samples, 0.50),
+        "p99_ms": percentile(samples, 0.99),
+        "mean_ms": sum(samples) / len(samples),
+    }
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def print_table(rows: List[Dict[str, object]], columns: Optional[List[str]] = None):
+    if not rows:
+        return
+    columns = columns or list(rows[0].keys())
+    widths = {c: max(len(c), *(len(_fmt(r.get(c))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    print("  ".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c)).ljust(widths[c]) for c in columns))
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return "" if value is None else str(value)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Classifier micro-benchmark suite with regression thresholds
+
+Times the free classifier's color, shape and full identification paths and
+the mock provider on the synthetic corpus at several resolutions and
+formats. Every case runs in a fresh subprocess, so peak RSS is per case, and
+a new ImageFeatures is built per call, so decoding is included as it is per
+request. Results (ops/s, p50/p99 and peak RSS) are written to a JSON
+artifact; given a baseline artifact the suite exits non-zero when a case's
+p50 or peak memory regresses past the threshold.
+
+Baselines are machine specific: record one with --save-baseline on the
+machine that will run the comparison.
+
+Usage:
+    python benchmarks/suite.py [--sizes 0.3,12,24,45] [--formats JPEG,PNG] [--runs 5]
+    python benchmarks/suite.py --save-baseline
+    python benchmarks/suite.py --baseline benchmarks/baselines/classifiers.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from common import corpus_image, time_call, peak_rss_mb, print_table
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "classifiers.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "classifiers.json")
+
+TARGETS = ["free.colors", "free.shape", "free.identify", "mock.identify"]
+
+# Metrics checked against the baseline and whether a larger value is worse
+CHECKED_METRICS = {"p50_ms": True, "peak_rss_mb": True}
+MEMORY_NOISE_MB = 5.0  # Peak RSS changes smaller than this are never regressions
+
+def load_target(name: str):
+    from app.services.ai_identification.free_classifier import free_classifier
+    from app.services.ai_identification.mock_service import MockIdentificationService
+    return {
+        "free.colors": free_classifier.analyze_image_colors,
+        "free.shape": free_classifier.calculate_shape_score,
+        "free.identify": free_classifier.identify_species,
+        "mock.identify": MockIdentificationService().identify_species,
+    }[name]
+
+def case_id(target: str, megapixels: float, fmt: str) -> str:
+    return f"{target}/{megapixels:g}mp/{fmt.lower()}"
+
+def run_child(target: str, megapixels: float, fmt: str, runs: int):
+    from app.services.image_features import ImageFeatures
+    data = corpus_image(megapixels, fmt)
+    filename = f"bench.{'jpg' if fmt.upper() == 'JPEG' else fmt.lower()}"
+    fn = load_target(target)
+    baseline = peak_rss_mb()
+    result = time_call(lambda: fn(ImageFeatures(data, filename)), runs=runs, warmup=1)
+    result["peak_rss_mb"] = peak_rss_mb() - baseline
+    print(json.dumps(result))
+
+def run_case(target: str, megapixels: float, fmt: str, runs: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--runs", str(runs),
+         "--child", target, str(megapixels), fmt],
+        capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    return json.loads(output)
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def compare(results: dict, baseline: dict, threshold: float, memory_threshold: float) -> list:
+    """One row per checked metric of every case present in both runs"""
+    rows = []
+    for case, current in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            continue
+        for metric, larger_is_worse in CHECKED_METRICS.items():
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            if metric == "peak_rss_mb":
+                regressed = after - before > max(MEMORY_NOISE_MB, before * memory_threshold)
+            else:
+                regressed = (change if larger_is_worse else -change) > threshold
+            rows.append({
+                "case": case,
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "change_pct": change * 100,
+                "status": "REGRESSED" if regressed else "ok",
+            })
+    return rows
+
+def write_json(path: str, payload: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="0.3,12,24,45", help="Megapixel sizes of the corpus images")
+    parser.add_argument("--formats", default="JPEG,PNG")
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON artifact")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Artifact to compare against, if it exists")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed fractional p50 slowdown")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed fractional peak RSS growth")
+    parser.add_argument("--child", nargs=3, metavar=("TARGET", "MP", "FORMAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(args.child[0], float(args.child[1]), args.child[2], args.runs)
+        return
+    
+    targets = args.targets.split(",")
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"Unknown targets: {', '.join(sorted(unknown))}")
+    
+    results, rows = {}, []
+    for fmt in args.formats.split(","):
+        for megapixels in [float(s) for s in args.sizes.split(",")]:
+            corpus_image(megapixels, fmt)  # Generate outside the measured children
+            for target in targets:
+                result = run_case(target, megapixels, fmt, args.runs)
+                case = case_id(target, megapixels, fmt)
+                results[case] = result
+                rows.append({
+                    "case": case,
+                    "ops_per_sec": result["ops_per_sec"],
+                    "p50_ms": result["p50_ms"],
+                    "p99_ms": result["p99_ms"],
+                    "peak_rss_mb": result["peak_rss_mb"],
+                })
+    print_table(rows)
+    
+    payload = {"environment": environment(), "runs": args.runs, "results": results}
+    write_json(args.output, payload)
+    print(f"\nWrote {args.output}")
+    
+    if args.save_baseline:
+        write_json(args.baseline, payload)
+        print(f"Saved baseline {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, nothing to compare")
+        return
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    comparison = compare(results, baseline["results"], args.threshold, args.memory_threshold)
+    print(f"\nAgainst baseline {baseline['environment'].get('commit')} ({baseline['environment'].get('timestamp')}):")
+    print_table(comparison)
+    regressions = [row for row in comparison if row["status"] != "ok"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) past the threshold")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
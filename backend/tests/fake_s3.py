@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the S3 object API MinIO serves
+Used by the storage tests and upload benchmarks instead of a MinIO container
+
+Usage:
+    python tests/fake_s3.py [--port 9100] [--link-mbps 200]
+"""
+
+import argparse
+import hashlib
+import itertools
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+S3_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+class FakeS3Server:
+    """
+    Threaded HTTP server implementing single and multipart object uploads
+    
+    Objects and in-progress multipart uploads are kept in memory; signatures
+    are not checked. `link_mbps` caps each connection's upload rate, like one
+    TCP stream to a remote MinIO, so concurrent parts add up. `fail_parts`
+    maps part numbers to how many times uploading them fails with a
+    retryable RequestTimeout before succeeding.
+    """
+    
+    def __init__(
+        self,
+        link_mbps: float = 0.0,
+        fail_parts: Optional[Dict[int, int]] = None,
+        port: int = 0
+    ):
+        self.link_mbps = link_mbps
+        self.fail_parts = dict(fail_parts or {})
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.aborted = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+    
+    def _read_body(self, handler: BaseHTTPRequestHandler) -> bytes:
+        """Request body, received no faster than the per-connection link allows"""
+        remaining = int(handler.headers.get("Content-Length", 0))
+        chunks = []
+        start = time.perf_counter()
+        received = 0
+        while remaining:
+            chunk = handler.rfile.read(min(remaining, 256 * 1024))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+            remaining -= len(chunk)
+            if self.link_mbps:
+                ahead = received * 8 / (self.link_mbps * 1_000_000) - (time.perf_counter() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+        return b"".join(chunks)
+    
+    def _handler(self):
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def _target(self):
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+                return unquote(parts.path).lstrip("/"), query
+            
+            def _reply(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if body:
+                    self.send_header("Content-Type", "application/xml")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body and self.command != "HEAD":
+                    self.wfile.write(body)
+            
+            def _xml(self, status: int, root: str, **fields: str):
+                body = "".join(f"<{name}>{value}</{name}>" for name, value in fields.items())
+                self._reply(status, f'<{root} xmlns="{S3_NS}">{body}</{root}>'.encode())
+            
+            def do_HEAD(self):
+                key, _ = self._target()
+                data = fake.objects.get(key)
+                if data is None:
+                    self._reply(404)
+                else:
+                    self._reply(200, headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+            
+            def do_PUT(self):
+                key, query = self._target()
+                with fake._lock:
+                    fake._in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake._in_flight)
+                try:
+                    data = fake._read_body(self)
+                finally:
+                    with fake._lock:
+                        fake._in_flight -= 1
+                etag = f'"{hashlib.md5(data).hexdigest()}"'
+                if "uploadId" not in query:
+                    fake.objects[key] = data
+                    self._reply(200, headers={"ETag": etag})
+                    return
+                number = int(query["partNumber"])
+                with fake._lock:
+                    failures = fake.fail_parts.get(number, 0)
+                    if failures:
+                        fake.fail_parts[number] = failures - 1
+                if failures:
+                    self._xml(400, "Error", Code="RequestTimeout", Message="Your socket connection timed out")
+                    return
+                fake.uploads[query["uploadId"]][number] = data
+                self._reply(200, headers={"ETag": etag})
+            
+            def do_POST(self):
+                key, query = self._target()
+                body = fake._read_body(self)
+                bucket = key.split("/", 1)[0]
+                if "uploads" in query:
+                    upload_id = f"upload-{next(fake._ids)}"
+                    fake.uploads[upload_id] = {}
+                    self._xml(200, "InitiateMultipartUploadResult", Bucket=bucket, Key=key, UploadId=upload_id)
+                    return
+                parts = fake.uploads.pop(query["uploadId"])
+                numbers = [int(n) for n in re.findall(rb"<PartNumber>(\d+)</PartNumber>", body)]
+                data = b"".join(parts[n] for n in numbers)
+                fake.objects[key] = data
+                etag = f'"{hashlib.md5(data).hexdigest()}-{len(numbers)}"'
+                self._xml(200, "CompleteMultipartUploadResult", Location=key, Bucket=bucket, Key=key, ETag=etag)
+            
+            def do_DELETE(self):
+                key, query = self._target()
+                if "uploadId" in query:
+                    fake.uploads.pop(query["uploadId"], None)
+                    fake.aborted += 1
+                else:
+                    fake.objects.pop(key, None)
+                self._reply(204)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def start(self) -> "FakeS3Server":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self) -> "FakeS3Server":
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--link-mbps", type=float, default=0.0, help="Upload rate cap per connection, 0 for none")
+    args = parser.parse_args()
+    
+    server = FakeS3Server(link_mbps=args.link_mbps, port=args.port)
+    print(f"Fake S3 listening on http://{server.endpoint}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Local fake of the Google Vision images:annotate endpoint
+Used by the classifier tests and benchmarks instead of the paid API
+
+Usage:
+    python tests/fake_vision.py [--port 8085] [--latency 0.2] [--label "Clownfish"]
+"""
+
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+class FakeVisionServer:
+    """
+    Threaded HTTP server answering annotate requests with fixed labels
+    
+    Every image in a request gets the same label annotations, unless a
+    `responder` maps each image's bytes to its own labels. `latency` is
+    added per HTTP call and `status` lets tests simulate API failures.
+    """
+    
+    def __init__(
+        self,
+        labels: Optional[List[dict]] = None,
+        latency: float = 0.0,
+        status: int = 200,
+        port: int = 0,
+        responder: Optional[Callable[[bytes], List[dict]]] = None
+    ):
+        self.labels = labels if labels is not None else [{"description": "Clownfish", "score": 0.97}]
+        self.responder = responder
+        self.latency = latency
+        self.status = status
+        self.calls = 0
+        self.images = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/images:annotate"
+    
+    def _labels_for(self, request: dict) -> List[dict]:
+        if self.responder is None:
+            return self.labels
+        return self.responder(base64.b64decode(request["image"]["content"]))
+    
+    def _handler(self):
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                requests = body.get("requests", [])
+                with fake._lock:
+                    fake.calls += 1
+                    fake.images += len(requests)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                
+                if fake.status != 200:
+                    payload = {"error": {"code": fake.status, "message": "fake failure"}}
+                else:
+                    payload = {"responses": [{"labelAnnotations": fake._labels_for(r)} for r in requests]}
+                data = json.dumps(payload).encode()
+                self.send_response(fake.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def start(self) -> "FakeVisionServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self) -> "FakeVisionServer":
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added per call")
+    parser.add_argument("--label", default="Clownfish")
+    args = parser.parse_args()
+    
+    server = FakeVisionServer([{"description": args.label, "score": 0.97}], args.latency, port=args.port)
+    print(f"Fake Vision API listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
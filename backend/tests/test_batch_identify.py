@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Tests for batch identification: multipart, zip and tar input, NDJSON output and grouped observation writes
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import json
+import tarfile
+import zipfile
+from concurrent.futures import Future
+from unittest import mock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+# The storage service checks its bucket on import
+with mock.patch("minio.Minio.bucket_exists", return_value=True):
+    from app.api import identification
+
+class RecordingDB:
+    def __init__(self):
+        self.writes = []
+    
+    def execute_query(self, query, parameters=None):
+        return []
+    
+    def execute_write(self, query, parameters=None):
+        self.writes.append((query, parameters))
+        return []
+
+class RecordingStorage:
+    def __init__(self):
+        self.references = []
+    
+    def upload_features(self, features, reference=None):
+        self.references.append(reference)
+        return {"filename": f"{features.content_hash}.jpg"}
+
+@pytest.fixture
+def batch(monkeypatch):
+    db, storage = RecordingDB(), RecordingStorage()
+    monkeypatch.setattr(identification, "get_db", lambda: db)
+    monkeypatch.setattr(identification, "storage_service", storage)
+    monkeypatch.setattr(identification.rendition_service, "submit", lambda features, filename, record=True: None)
+    monkeypatch.setattr(identification.identification_cache, "get", lambda *args: None)
+    monkeypatch.setattr(identification.identification_cache, "set", lambda *args: None)
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_ENABLED", False)
+    app = FastAPI()
+    app.include_router(identification.router, prefix="/identify")
+    client = TestClient(app)
+    
+    def post(files, **params):
+        response = client.post("/identify/batch", files=files, params={"provider": "mock", **params})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        return lines[:-1], lines[-1]
+    
+    post.db, post.storage = db, storage
+    return post
+
+def images(count):
+    return [(f"photo-{i}.jpg", f"image-{i}".encode()) for i in range(count)]
+
+def zip_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+def tar_archive(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tf:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+def test_multipart_files_are_identified_and_summarized(batch):
+    files = [("files", (name, data, "image/jpeg")) for name, data in images(3)]
+    files.append(("files", ("notes.txt", b"not an image", "text/plain")))
+    lines, summary = batch(files)
+    
+    assert sorted(line["index"] for line in lines) == [0, 1, 2, 3]
+    by_name = {line["filename"]: line for line in lines}
+    assert by_name["notes.txt"]["status"] == "error"
+    assert all(by_name[f"photo-{i}.jpg"]["status"] == "success" for i in range(3))
+    assert summary["total"] == 4 and summary["succeeded"] == 3 and summary["failed"] == 1
+    assert summary["saved"] == 3 and summary["status"] == "complete"
+    saved = [by_name[f"photo-{i}.jpg"]["observation_id"] for i in range(3)]
+    assert sorted(batch.storage.references) == sorted(f"observation:{id}" for id in saved)
+
+@pytest.mark.parametrize("build", [zip_archive, tar_archive])
+def test_archive_images_are_identified_and_other_members_skipped(batch, build):
+    archive = build(images(3) + [("README.md", b"skip me"), ("__MACOSX/._photo-0.jpg", b"resource fork")])
+    lines, summary = batch([("archive", ("photos.archive", archive, "application/octet-stream"))])
+    
+    assert sorted(line["filename"] for line in lines) == ["photo-0.jpg", "photo-1.jpg", "photo-2.jpg"]
+    assert all(line["status"] == "success" for line in lines)
+    assert summary["total"] == 3 and summary["saved"] == 3
+
+@pytest.mark.parametrize("build", [zip_archive, tar_archive])
+def test_archive_members_over_the_size_limit_are_not_extracted(batch, build, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_IMAGE_SIZE", 64)
+    archive = build([("small.jpg", b"x" * 64), ("huge.jpg", b"\0" * 10_000)])
+    lines, summary = batch([("archive", ("photos.archive", archive, "application/octet-stream"))])
+    
+    by_name = {line["filename"]: line for line in lines}
+    assert by_name["small.jpg"]["status"] == "success"
+    assert by_name["huge.jpg"]["status"] == "error" and "too large" in by_name["huge.jpg"]["error"]
+    assert summary["succeeded"] == 1 and summary["failed"] == 1
+
+def test_multipart_files_over_the_size_limit_fail_alone(batch, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_IMAGE_SIZE", 64)
+    files = [
+        ("files", ("small.jpg", b"x" * 64, "image/jpeg")),
+        ("files", ("huge.jpg", b"x" * 65, "image/jpeg")),
+    ]
+    lines, summary = batch(files)
+    
+    by_name = {line["filename"]: line for line in lines}
+    assert by_name["small.jpg"]["status"] == "success"
+    assert "too large" in by_name["huge.jpg"]["error"]
+    assert summary["failed"] == 1
+
+def test_archive_extraction_stops_at_the_batch_byte_limit(batch, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_EXTRACTED_BYTES", 20)
+    archive = zip_archive(images(5))
+    lines, summary = batch([("archive", ("photos.zip", archive, "application/zip"))])
+    
+    # Each image is 7 bytes, so the third would pass the limit
+    assert [line["filename"] for line in sorted(lines, key=lambda line: line["index"])] == ["photo-0.jpg", "photo-1.jpg"]
+    assert summary["total"] == 2 and "truncated" in summary
+
+def test_lines_stream_in_order_with_the_summary_last(batch):
+    files = [("files", (name, data, "image/jpeg")) for name, data in images(5)]
+    lines, summary = batch(files, concurrency=1)
+    
+    # With one slot each image finishes before the next is read
+    assert [line["index"] for line in lines] == [0, 1, 2, 3, 4]
+    assert set(summary) >= {"total", "succeeded", "failed", "saved", "status", "timestamp"}
+    assert summary["total"] == 5
+
+def test_observations_are_written_in_groups(batch, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_WRITE_SIZE", 2)
+    files = [("files", (name, data, "image/jpeg")) for name, data in images(5)]
+    lines, summary = batch(files, concurrency=1)
+    
+    writes = [params["observations"] for query, params in batch.db.writes if "UNWIND" in query]
+    assert len(writes) < 5
+    assert all(len(group) <= 3 for group in writes)
+    assert sorted(obs["id"] for group in writes for obs in group) == sorted(line["observation_id"] for line in lines)
+    assert summary["saved"] == 5
+
+def test_unsaved_batches_write_nothing(batch):
+    files = [("files", (name, data, "image/jpeg")) for name, data in images(2)]
+    lines, summary = batch(files, save_image=False)
+    
+    assert batch.db.writes == [] and batch.storage.references == []
+    assert summary["saved"] == 0
+
+def test_items_give_up_when_the_pool_stays_saturated(batch, monkeypatch):
+    async def saturated(features, provider):
+        raise identification.ExecutorSaturatedError("Classification queue is full")
+    
+    monkeypatch.setattr(identification, "_run_classifier", saturated)
+    monkeypatch.setattr(settings, "BATCH_SATURATION_WAIT", 0.2)
+    lines, summary = batch([("files", ("photo.jpg", b"image", "image/jpeg"))])
+    
+    assert lines[0]["status"] == "error" and "queue is full" in lines[0]["error"]
+    assert summary["failed"] == 1 and summary["status"] == "complete"
+
+def test_renditions_start_on_upload_and_are_recorded_after_the_write(batch, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_WRITE_SIZE", 100)
+    events = []
+    
+    def submit(features, filename, record=True):
+        # The write only happens at the end of the batch, after every upload
+        events.append(("submit", filename, record, len(batch.db.writes)))
+        future = Future()
+        future.set_result({"thumbnail": f"renditions/{filename}/thumbnail.webp"})
+        return future
+    
+    monkeypatch.setattr(identification.rendition_service, "submit", submit)
+    monkeypatch.setattr(
+        identification.rendition_service, "record_when_done",
+        lambda future, filename: events.append(("record", filename, len(batch.db.writes)))
+    )
+    files = [("files", (name, data, "image/jpeg")) for name, data in images(2)]
+    files.append(("files", ("copy.jpg", b"image-0", "image/jpeg")))
+    lines, summary = batch(files, concurrency=1)
+    
+    submitted = [event for event in events if event[0] == "submit"]
+    recorded = [event for event in events if event[0] == "record"]
+    # One rendition per stored original, not per observation
+    assert len(submitted) == 2 and all(not record and writes == 0 for _, _, record, writes in submitted)
+    assert sorted(name for _, name, _ in recorded) == sorted(name for _, name, _, _ in submitted)
+    assert all(writes == 1 for _, _, writes in recorded)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Tests for the blob index: skipped duplicate uploads, cold-index lookups and reference-counted deletes
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from collections import defaultdict
+
+from app.services.blob_index import BlobIndex
+
+class MemoryRedis:
+    """The set commands and locks the index uses"""
+    
+    def __init__(self):
+        self.sets = defaultdict(set)
+        self.locks = defaultdict(threading.Lock)
+    
+    def sadd(self, key, member):
+        self.sets[key].add(member)
+    
+    def srem(self, key, member):
+        self.sets[key].discard(member)
+    
+    def sismember(self, key, member):
+        return member in self.sets[key]
+    
+    def scard(self, key):
+        return len(self.sets[key])
+    
+    def delete(self, key):
+        self.sets.pop(key, None)
+    
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        return self.locks[name]
+
+class MemoryBucket:
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+    
+    def stat(self, name):
+        return self.objects.get(name)
+    
+    def put(self, name):
+        self.puts += 1
+        self.objects[name] = f"etag-{self.puts}"
+        return self.objects[name]
+    
+    def delete(self, name):
+        return self.objects.pop(name, None) is not None
+
+def store(index, bucket, name, reference):
+    return index.store(name, reference, stat=lambda: bucket.stat(name), put=lambda: bucket.put(name))
+
+def release(index, bucket, name, reference):
+    return index.release(name, reference, delete=lambda: bucket.delete(name))
+
+def test_duplicates_are_not_uploaded_again():
+    index, bucket = BlobIndex(MemoryRedis()), MemoryBucket()
+    assert store(index, bucket, "abc.jpg", "image:1") == ("etag-1", False)
+    assert store(index, bucket, "abc.jpg", "observation:2") == (None, True)
+    assert bucket.puts == 1
+    assert index.references("abc.jpg") == 2
+    assert index.stats()["deduplicated"] == 1 and index.stats()["stored"] == 1
+
+def test_objects_stored_before_the_index_are_found_by_stat():
+    index, bucket = BlobIndex(MemoryRedis()), MemoryBucket()
+    bucket.objects["abc.jpg"] = "etag-old"
+    assert store(index, bucket, "abc.jpg", "image:1") == ("etag-old", True)
+    assert bucket.puts == 0
+    # Known from now on, so the next duplicate doesn't even stat
+    bucket.objects.clear()
+    assert store(index, bucket, "abc.jpg", "image:2") == (None, True)
+
+def test_blob_is_deleted_with_its_last_reference_only():
+    index, bucket = BlobIndex(MemoryRedis()), MemoryBucket()
+    store(index, bucket, "abc.jpg", "image:1")
+    store(index, bucket, "abc.jpg", "observation:2")
+    # A replayed write of the same observation is one reference, not two
+    store(index, bucket, "abc.jpg", "observation:2")
+    
+    assert release(index, bucket, "abc.jpg", "image:1") is False
+    assert "abc.jpg" in bucket.objects
+    assert release(index, bucket, "abc.jpg", "observation:2") is True
+    assert "abc.jpg" not in bucket.objects
+
+def test_upload_after_the_last_delete_stores_the_blob_again():
+    index, bucket = BlobIndex(MemoryRedis()), MemoryBucket()
+    store(index, bucket, "abc.jpg", "image:1")
+    release(index, bucket, "abc.jpg", "image:1")
+    
+    assert store(index, bucket, "abc.jpg", "image:2") == ("etag-2", False)
+    assert bucket.objects["abc.jpg"] == "etag-2"
+
+def test_blobs_stored_before_the_index_are_kept_without_a_backfill():
+    index, bucket = BlobIndex(MemoryRedis()), MemoryBucket()
+    # image:1 was written before the index, so only image:2 is counted
+    bucket.objects["abc.jpg"] = "etag-old"
+    store(index, bucket, "abc.jpg", "image:2")
+    
+    assert release(index, bucket, "abc.jpg", "image:2") is False
+    assert "abc.jpg" in bucket.objects
+    assert index.stats()["untracked"] == 1
+
+def test_blobs_stored_before_the_index_are_counted_from_the_graph():
+    index, bucket = BlobIndex(MemoryRedis()), MemoryBucket()
+    bucket.objects["abc.jpg"] = "etag-old"
+    store(index, bucket, "abc.jpg", "image:2")
+    graph = {"image:1", "image:2"}
+    
+    def release_node(reference):
+        deleted = index.release("abc.jpg", reference, delete=lambda: bucket.delete("abc.jpg"), backfill=lambda: set(graph))
+        graph.discard(reference)
+        return deleted
+    
+    assert release_node("image:2") is False
+    assert "abc.jpg" in bucket.objects
+    assert release_node("image:1") is True
+    assert "abc.jpg" not in bucket.objects
+    assert index.stats()["backfilled"] == 1
+
+def test_blob_is_kept_when_the_graph_cannot_be_counted():
+    index, bucket = BlobIndex(MemoryRedis()), MemoryBucket()
+    bucket.objects["abc.jpg"] = "etag-old"
+    store(index, bucket, "abc.jpg", "image:2")
+    
+    def unavailable():
+        raise ConnectionError("Neo4j unavailable")
+    
+    assert index.release("abc.jpg", "image:2", delete=lambda: bucket.delete("abc.jpg"), backfill=unavailable) is False
+    assert "abc.jpg" in bucket.objects
+
+def test_lock_waits_are_bounded_separately_from_the_lock_lifetime():
+    redis = MemoryRedis()
+    requested = []
+    redis.lock = lambda name, timeout=None, blocking_timeout=None: requested.append((timeout, blocking_timeout)) or threading.Lock()
+    index, bucket = BlobIndex(redis, lock_timeout=300.0, lock_wait=5.0), MemoryBucket()
+    store(index, bucket, "abc.jpg", "image:1")
+    release(index, bucket, "abc.jpg", "image:1")
+    
+    assert requested == [(300.0, 5.0), (300.0, 5.0)]
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the confidence-driven classifier cascade against a fake Vision server
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import pytest
+
+from fake_vision import FakeVisionServer
+from app.services.ai_identification.cascade import CascadeStage, ClassifierCascade
+from app.services.ai_identification.google_vision_rest import GoogleVisionRESTService
+from app.services.image_features import ImageFeatures
+
+def local_stage(*confidences):
+    async def run(features):
+        return [
+            {"scientific_name": f"Species {i}", "common_name": f"Species {i}", "confidence": c}
+            for i, c in enumerate(confidences)
+        ]
+    return CascadeStage("free", run, "1")
+
+def vision_stage(server):
+    service = GoogleVisionRESTService(api_key="test-key", base_url=server.url)
+    
+    async def run(features):
+        return await service.identify_species(features.data)
+    return CascadeStage("vision", run, service.VERSION)
+
+@pytest.fixture
+def vision():
+    with FakeVisionServer() as server:
+        yield server
+
+def identify(cascade):
+    return asyncio.run(cascade.identify(ImageFeatures(b"not decoded by the fake stages")))
+
+def test_confident_local_answer_skips_vision(vision):
+    cascade = ClassifierCascade(local_stage(0.9, 0.5), vision_stage(vision), high_confidence=0.8, min_margin=0.1)
+    predictions, report = identify(cascade)
+    
+    assert predictions[0]["scientific_name"] == "Species 0"
+    assert report["answered_by"] == "free"
+    assert [stage["name"] for stage in report["stages"]] == ["free"]
+    assert vision.calls == 0
+
+@pytest.mark.parametrize("confidences, reason", [
+    ((0.6, 0.3), "low_confidence"),
+    ((0.9, 0.85), "ambiguous"),
+    ((), "no_predictions"),
+])
+def test_unsure_local_answer_escalates(vision, confidences, reason):
+    cascade = ClassifierCascade(local_stage(*confidences), vision_stage(vision), high_confidence=0.8, min_margin=0.1)
+    predictions, report = identify(cascade)
+    
+    assert report["escalation_reason"] == reason
+    assert report["answered_by"] == "vision"
+    assert predictions[0]["scientific_name"] == "Amphiprion ocellaris"
+    assert [stage["name"] for stage in report["stages"]] == ["free", "vision"]
+    assert all(stage["latency_ms"] >= 0 for stage in report["stages"])
+    assert vision.calls == 1
+
+def test_vision_failure_keeps_local_answer():
+    with FakeVisionServer(status=500) as server:
+        cascade = ClassifierCascade(local_stage(0.6, 0.3), vision_stage(server), high_confidence=0.8)
+        predictions, report = identify(cascade)
+    
+    assert report["answered_by"] == "free"
+    assert "error" in report["stages"][1]
+    assert predictions[0]["scientific_name"] == "Species 0"
+    assert cascade.stats()["remote_errors"] == 1
+
+def test_stats_count_stage_usage(vision):
+    cascade = ClassifierCascade(local_stage(0.6), vision_stage(vision), high_confidence=0.8)
+    for _ in range(3):
+        identify(cascade)
+    stats = cascade.stats()
+    
+    assert stats["requests"] == 3
+    assert stats["answered_by"] == {"free": 0, "vision": 3}
+    assert stats["escalations"] == {"low_confidence": 3}
+    assert stats["latency"]["vision"]["p50_ms"] is not None
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
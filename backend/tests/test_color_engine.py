@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Parity tests for the lookup-table color engine
+Compares it against the original per-pixel threshold chain
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import itertools
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.ai_identification.color_engine import ColorEngine, COLOR_NAMES, COLOR_RULES
+from app.services.ai_identification.free_classifier import FreeMarineClassifier
+from app.services.image_features import ImageFeatures
+
+def reference_pixel_color(r, g, b):
+    """The original if/elif chain from FreeMarineClassifier.analyze_image_colors"""
+    if r > 200 and g > 200 and b > 200:
+        return "white"
+    elif r < 50 and g < 50 and b < 50:
+        return "black"
+    elif r > 180 and g < 100 and b < 100:
+        return "red"
+    elif r > 180 and 80 < g < 140 and b < 80:
+        return "orange"
+    elif r > 180 and g > 180 and b < 100:
+        return "yellow"
+    elif r < 100 and g > 120 and b < 100:
+        return "green"
+    elif r < 150 and g < 180 and b > 120:
+        return "blue"
+    elif r > 100 and g < 100 and b > 100:
+        return "purple"
+    elif 80 < r < 160 and 40 < g < 120 and b < 80:
+        return "brown"
+    elif 80 < r < 180 and 80 < g < 180 and 80 < b < 180:
+        return "gray"
+    elif 180 < r < 220 and 150 < g < 200 and 150 < b < 200:
+        return "translucent"
+    else:
+        if b > r and b > g:
+            return "blue"
+        elif g > r and g > b:
+            return "green"
+        elif r > g and r > b:
+            return "red"
+        else:
+            return "gray"
+
+def reference_analyze(pixels):
+    colors = {name: 0 for name in COLOR_NAMES}
+    for row in pixels:
+        for pixel in row:
+            colors[reference_pixel_color(*pixel)] += 1
+    total = pixels.shape[0] * pixels.shape[1]
+    return {name: count / total for name, count in colors.items()}
+
+def boundary_values():
+    """Every threshold and its neighbours, plus the channel extremes"""
+    values = {0, 1, 254, 255}
+    for rule in COLOR_RULES:
+        for low, high in rule[1:]:
+            for limit in (low, high):
+                if limit is not None:
+                    values.update({limit - 1, limit, limit + 1})
+    return sorted(v for v in values if 0 <= v <= 255)
+
+def test_boundary_pixels_match_reference():
+    engine = ColorEngine()
+    values = boundary_values()
+    pixels = np.array(list(itertools.product(values, repeat=3)), dtype=np.uint8)
+    classes = engine.classify(pixels)
+    for pixel, cls in zip(pixels, classes):
+        assert COLOR_NAMES[cls] == reference_pixel_color(*pixel), tuple(pixel)
+
+def test_random_pixels_match_reference():
+    engine = ColorEngine()
+    rng = np.random.default_rng(1234)
+    pixels = rng.integers(0, 256, size=(20000, 3), dtype=np.uint8)
+    classes = engine.classify(pixels)
+    for pixel, cls in zip(pixels, classes):
+        assert COLOR_NAMES[cls] == reference_pixel_color(*pixel), tuple(pixel)
+
+def test_analyze_matches_reference_exactly():
+    engine = ColorEngine()
+    rng = np.random.default_rng(42)
+    pixels = rng.integers(0, 256, size=(150, 150, 3), dtype=np.uint8)
+    assert engine.analyze(pixels) == reference_analyze(pixels)
+
+def test_batch_matches_single_images():
+    engine = ColorEngine()
+    rng = np.random.default_rng(7)
+    batch = rng.integers(0, 256, size=(4, 40, 30, 3), dtype=np.uint8)
+    results = engine.analyze(batch)
+    assert len(results) == 4
+    for image, result in zip(batch, results):
+        assert result == engine.analyze(image)
+        assert abs(sum(result.values()) - 1.0) < 1e-9
+
+def test_classifier_colors_match_reference():
+    # Large enough for the JPEG to be decoded at reduced scale
+    img = Image.new('RGB', (1600, 1200), color='#1e40af')
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([600, 400, 1000, 800], fill='orange')
+    draw.rectangle([720, 480, 760, 720], fill='white')
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG')
+    
+    classifier = FreeMarineClassifier()
+    colors = classifier.analyze_image_colors(buffer.getvalue())
+    # The original full-resolution decode; reduced decoding only moves edge pixels
+    full = np.array(Image.open(io.BytesIO(buffer.getvalue())).convert('RGB').resize((150, 150)))
+    expected = reference_analyze(full)
+    for name in COLOR_NAMES:
+        assert abs(colors[name] - expected[name]) <= 0.005, name
+    
+    pixels = ImageFeatures(buffer.getvalue()).rgb_thumbnail
+    assert classifier.analyze_image_colors_batch(pixels[np.newaxis]) == [colors]
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for the nearest-neighbor embedding index: search, voting, appends and snapshots
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.ai_identification.embedding_index import EmbeddingIndex
+from app.services.image_features import ImageFeatures
+
+CLOWNFISH = {"scientific_name": "Amphiprion ocellaris", "common_name": "Common Clownfish", "key": "clownfish"}
+TANG = {"scientific_name": "Paracanthurus hepatus", "common_name": "Blue Tang", "key": "blue_tang"}
+
+def unit(rng, n, dim=128):
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def scene(fish_color, quality=90) -> bytes:
+    img = Image.new('RGB', (320, 240), (20, 80, 160))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([100, 90, 220, 150], fill=fish_color)
+    draw.rectangle([0, 200, 320, 240], fill=(200, 190, 150))
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+def test_search_many_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    index = EmbeddingIndex(str(tmp_path), chunk_rows=64)
+    vectors = unit(rng, 500)
+    index.append_many([(f"obs-{i}", CLOWNFISH, v) for i, v in enumerate(vectors[:290])])
+    index.snapshot()
+    index.append_many([(f"obs-{i}", CLOWNFISH, v) for i, v in enumerate(vectors[290:], start=290)])
+    # Snapshot with a partial last chunk followed by journal rows
+    index.snapshot()
+    
+    queries = unit(rng, 4)
+    rows, sims = index.search_many(queries, 10)
+    
+    expected = np.argsort(-(queries @ vectors.astype(np.float16).astype(np.float32).T), axis=1)[:, :10]
+    assert rows.shape == (4, 10)
+    assert (rows == expected).all()
+    assert (np.diff(sims, axis=1) <= 0).all()
+
+def test_vote_prefers_the_species_of_the_closest_neighbors(tmp_path, monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "KNN_NEIGHBORS", 5)
+    index = EmbeddingIndex(str(tmp_path))
+    examples = [(f"clown-{i}", CLOWNFISH, ImageFeatures(scene("orange", 70 + i)).embedding) for i in range(3)]
+    examples += [(f"tang-{i}", TANG, ImageFeatures(scene((30, 60, 230), 70 + i)).embedding) for i in range(3)]
+    index.append_many(examples)
+    
+    predictions = index.identify_species(scene("orange", 95))
+    
+    assert predictions[0]["scientific_name"] == CLOWNFISH["scientific_name"]
+    assert predictions[0]["source"] == "kNN"
+    assert predictions[0]["neighbors"] >= 1
+
+def test_reappending_an_observation_relabels_it(tmp_path):
+    rng = np.random.default_rng(1)
+    index = EmbeddingIndex(str(tmp_path))
+    vector = unit(rng, 1)[0]
+    index.append("obs-1", CLOWNFISH, vector)
+    index.snapshot()
+    
+    index.append("obs-1", TANG, vector)
+    rows, sims = index.search_many(vector, 1)
+    
+    assert len(index) == 1
+    assert index.vote(rows[0], sims[0])[0]["scientific_name"] == TANG["scientific_name"]
+
+def test_snapshot_and_appends_are_shared_between_instances(tmp_path):
+    rng = np.random.default_rng(2)
+    writer = EmbeddingIndex(str(tmp_path))
+    reader = EmbeddingIndex(str(tmp_path))
+    vectors = unit(rng, 20)
+    
+    writer.append_many([(f"obs-{i}", CLOWNFISH, v) for i, v in enumerate(vectors[:10])])
+    writer.snapshot()
+    reader.refresh()
+    assert len(reader) == 10 and reader.generation == writer.generation
+    assert isinstance(reader._base, np.memmap)
+    
+    # An append by another worker is picked up from the journal without a snapshot
+    writer.append("obs-new", TANG, vectors[10])
+    reader.refresh()
+    rows, _ = reader.search_many(vectors[10], 1)
+    assert rows[0][0] == 10
+    assert reader.contains("obs-new")
+
+def test_version_follows_appends_and_answers_match_it(tmp_path):
+    writer = EmbeddingIndex(str(tmp_path))
+    reader = EmbeddingIndex(str(tmp_path))
+    writer.append("clown-0", CLOWNFISH, ImageFeatures(scene("orange", 70)).embedding)
+    reader.refresh()
+    before = reader.VERSION
+    
+    # Another worker's append changes the version before any snapshot
+    writer.append("tang-0", TANG, ImageFeatures(scene((30, 60, 230), 70)).embedding)
+    assert reader.VERSION != before
+    
+    # and the next answer already sees it, without waiting for a reload
+    predictions = reader.identify_species(scene((30, 60, 230), 95))
+    assert predictions[0]["scientific_name"] == TANG["scientific_name"]
+    assert reader.VERSION == writer.VERSION
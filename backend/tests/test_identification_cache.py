@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the identification result cache: local and shared hits, version invalidation and copy-on-read
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+
+from app.services.identification_cache import IdentificationResultCache
+
+class MemoryCache:
+    """The get/set interface of CacheService, serializing like Redis does"""
+    
+    def __init__(self):
+        self.values = {}
+        self.gets = 0
+    
+    def get(self, key):
+        self.gets += 1
+        value = self.values.get(key)
+        return json.loads(value) if value is not None else None
+    
+    def set(self, key, value, ttl=None):
+        self.values[key] = json.dumps(value)
+        return True
+
+PREDICTIONS = [{"species": "Clownfish", "confidence": 0.9}, {"species": "Blue Tang", "confidence": 0.4}]
+
+def test_misses_then_local_hits():
+    shared = MemoryCache()
+    cache = IdentificationResultCache(shared, max_entries=10, ttl=60)
+    assert cache.get("abc", "free", "1") is None
+    
+    cache.set("abc", "free", "1", PREDICTIONS)
+    assert cache.get("abc", "free", "1") == PREDICTIONS
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["local_hits"] == 1 and stats["shared_hits"] == 0
+    # The local hit never reached Redis
+    assert shared.gets == 1
+
+def test_shared_hits_fill_the_local_level():
+    shared = MemoryCache()
+    IdentificationResultCache(shared, max_entries=10, ttl=60).set("abc", "free", "1", PREDICTIONS)
+    # Another worker, with a cold local level
+    cache = IdentificationResultCache(shared, max_entries=10, ttl=60)
+    
+    assert cache.get("abc", "free", "1") == PREDICTIONS
+    assert cache.get("abc", "free", "1") == PREDICTIONS
+    stats = cache.stats()
+    assert stats["shared_hits"] == 1 and stats["local_hits"] == 1
+
+def test_version_bump_makes_older_entries_unreachable():
+    cache = IdentificationResultCache(MemoryCache(), max_entries=10, ttl=60)
+    cache.set("abc", "free", "1", PREDICTIONS)
+    
+    assert cache.get("abc", "free", "2") is None
+    assert cache.get("abc", "onnx", "1") is None
+    assert cache.get("abc", "free", "1") == PREDICTIONS
+
+def test_callers_cannot_mutate_cached_entries():
+    shared = MemoryCache()
+    IdentificationResultCache(shared, max_entries=10, ttl=60).set("abc", "free", "1", PREDICTIONS)
+    cache = IdentificationResultCache(shared, max_entries=10, ttl=60)
+    
+    # Shared hit, then local hit; callers re-rank and annotate what they get
+    for _ in range(2):
+        predictions = cache.get("abc", "free", "1")
+        predictions[0]["confidence"] = 0.1
+        predictions.append({"species": "Nearby"})
+    
+    assert cache.get("abc", "free", "1") == PREDICTIONS
+    
+    stored = [dict(p) for p in PREDICTIONS]
+    cache.set("def", "free", "1", stored)
+    stored[0]["confidence"] = 0.0
+    assert cache.get("def", "free", "1") == PREDICTIONS
+
+def test_least_recently_used_entries_are_evicted_locally():
+    shared = MemoryCache()
+    cache = IdentificationResultCache(shared, max_entries=2, ttl=60)
+    for content_hash in ("a", "b", "c"):
+        cache.set(content_hash, "free", "1", PREDICTIONS)
+    
+    assert cache.stats()["local_entries"] == 2
+    # Evicted locally, still answered by Redis
+    assert cache.get("a", "free", "1") == PREDICTIONS
+    assert cache.stats()["shared_hits"] == 1
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for how classifier pool failures surface from the identify endpoint
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+# The storage service checks its bucket on import
+with mock.patch("minio.Minio.bucket_exists", return_value=True):
+    from app.api import identification
+from app.services.executor import classification_executor
+
+class EmptyDB:
+    def execute_query(self, query, parameters=None):
+        return []
+    
+    def execute_write(self, query, parameters=None):
+        return []
+
+class FakePool:
+    """Process pool stand-in whose submit fails with `error` or returns a future that never completes"""
+    
+    def __init__(self, error=None):
+        self.error = error
+    
+    def submit(self, *args):
+        if self.error is not None:
+            raise self.error
+        return Future()
+    
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+@pytest.fixture
+def identify(monkeypatch):
+    monkeypatch.setattr(identification, "get_db", lambda: EmptyDB())
+    monkeypatch.setattr(identification.identification_cache, "get", lambda *args: None)
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_ENABLED", False)
+    app = FastAPI()
+    app.include_router(identification.router, prefix="/identify")
+    client = TestClient(app)
+    
+    def post(pool, **executor_state):
+        # The free provider classifies on the process pool
+        monkeypatch.setattr(classification_executor, "_pool", pool)
+        monkeypatch.setattr(classification_executor, "_pending", 0)
+        for name, value in executor_state.items():
+            monkeypatch.setattr(classification_executor, name, value)
+        return client.post(
+            "/identify/",
+            files={"file": ("reef.jpg", b"image", "image/jpeg")},
+            params={"provider": "free", "save_image": "false"}
+        )
+    
+    return post
+
+def test_full_queue_is_rejected_with_retry_after(identify):
+    response = identify(FakePool(), _pending=classification_executor.capacity)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert "queue is full" in response.json()["detail"]
+
+def test_broken_pool_is_unavailable(identify):
+    response = identify(FakePool(BrokenProcessPool("A child process terminated abruptly")))
+    assert response.status_code == 503
+    assert "Retry-After" not in response.headers
+
+def test_classification_timeout_is_a_gateway_timeout(identify):
+    response = identify(FakePool(), task_timeout=0.05)
+    assert response.status_code == 504
+    assert "exceeded" in response.json()["detail"]
+
+def test_other_classifier_errors_are_server_errors(identify):
+    assert identify(FakePool(ValueError("bad task"))).status_code == 500
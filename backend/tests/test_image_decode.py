@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for reduced-resolution decoding: JPEG draft scaling, RAW previews and the min_size guarantee
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import types
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.image_decode import decode_image
+
+def encode(size, format="JPEG", color=(30, 64, 175)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color=color).save(buffer, format=format)
+    return buffer.getvalue()
+
+class FakeRaw:
+    """The parts of a rawpy RawPy object decode_image uses"""
+    
+    def __init__(self, module):
+        self.module = module
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def extract_thumb(self):
+        if self.module.thumb is None:
+            raise self.module.LibRawNoThumbnailError()
+        return self.module.thumb
+    
+    def postprocess(self, half_size=False, use_camera_wb=False):
+        self.module.postprocessed.append(half_size)
+        height, width = self.module.sensor_size
+        if half_size:
+            height, width = height // 2, width // 2
+        return np.zeros((height, width, 3), dtype=np.uint8)
+
+@pytest.fixture
+def rawpy(monkeypatch):
+    module = types.ModuleType("rawpy")
+    module.ThumbFormat = types.SimpleNamespace(JPEG="jpeg", BITMAP="bitmap")
+    module.LibRawNoThumbnailError = type("LibRawNoThumbnailError", (Exception,), {})
+    module.LibRawUnsupportedThumbnailError = type("LibRawUnsupportedThumbnailError", (Exception,), {})
+    module.thumb = None
+    module.sensor_size = (4000, 6000)
+    module.postprocessed = []
+    module.imread = lambda stream: FakeRaw(module)
+    monkeypatch.setitem(sys.modules, "rawpy", module)
+    return module
+
+def test_jpeg_is_decoded_at_draft_scale():
+    img = decode_image(encode((1600, 1200)), min_size=(150, 150))
+    # 1/8 DCT scaling, still covering min_size
+    assert img.size == (200, 150)
+    assert img.mode == "RGB"
+
+def test_full_decode_without_min_size():
+    assert decode_image(encode((1600, 1200))).size == (1600, 1200)
+
+@pytest.mark.parametrize("format", ["JPEG", "PNG"])
+@pytest.mark.parametrize("size", [(1600, 1200), (1000, 151), (151, 1000), (640, 480), (299, 299), (150, 150)])
+def test_reduced_images_still_cover_min_size(format, size):
+    min_size = (150, 150)
+    img = decode_image(encode(size, format), min_size=min_size)
+    assert img.width >= min_size[0] and img.height >= min_size[1]
+    # No smaller integer reduction would still have covered it
+    assert img.width < 2 * min_size[0] or img.height < 2 * min_size[1]
+
+def test_images_smaller_than_min_size_are_left_alone():
+    assert decode_image(encode((100, 80), "PNG"), min_size=(150, 150)).size == (100, 80)
+
+def test_raw_embedded_preview_is_used_when_large_enough(rawpy):
+    rawpy.thumb = types.SimpleNamespace(format=rawpy.ThumbFormat.JPEG, data=encode((1600, 1067)))
+    img = decode_image(b"raw sensor data", min_size=(150, 150), filename="IMG_0001.CR2")
+    
+    assert rawpy.postprocessed == []
+    assert img.width >= 150 and img.height >= 150 and img.width < 1600
+
+def test_raw_bitmap_preview_is_reduced(rawpy):
+    rawpy.thumb = types.SimpleNamespace(format=rawpy.ThumbFormat.BITMAP, data=np.zeros((600, 900, 3), dtype=np.uint8))
+    img = decode_image(b"raw sensor data", min_size=(150, 150), filename="IMG_0001.NEF")
+    
+    assert rawpy.postprocessed == []
+    assert img.size == (225, 150)
+
+def test_raw_preview_smaller_than_min_size_falls_back_to_demosaicing(rawpy):
+    rawpy.thumb = types.SimpleNamespace(format=rawpy.ThumbFormat.JPEG, data=encode((160, 120)))
+    img = decode_image(b"raw sensor data", min_size=(150, 150), filename="IMG_0001.ARW")
+    
+    assert rawpy.postprocessed == [True]
+    assert img.width >= 150 and img.height >= 150
+
+def test_raw_without_preview_falls_back_to_demosaicing(rawpy):
+    img = decode_image(b"raw sensor data", min_size=(150, 150), filename="IMG_0001.DNG")
+    
+    assert rawpy.postprocessed == [True]
+    # Half-size 3000x2000, then reduced by 13
+    assert img.size == (231, 154)
+
+def test_raw_filename_falls_back_to_pil_without_rawpy(monkeypatch):
+    # An import of a None entry in sys.modules raises ImportError
+    monkeypatch.setitem(sys.modules, "rawpy", None)
+    img = decode_image(encode((1600, 1200)), min_size=(150, 150), filename="converted.dng")
+    assert img.size == (200, 150)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared ImageFeatures views: each computed once and reused, and pickling to pool workers
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hashlib
+import io
+import pickle
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services import image_features
+from app.services.image_features import ImageFeatures
+
+def reef_jpeg(size=(800, 600), orientation=None):
+    img = Image.new("RGB", size, color="#1e40af")
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([size[0] // 3, size[1] // 3, size[0] // 2, size[1] // 2], fill="orange")
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", exif=exif)
+    return buffer.getvalue()
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Sizes every decode_image call was made for"""
+    calls = []
+    decode = image_features.decode_image
+    
+    def counting(data, min_size=None, filename=None):
+        calls.append(min_size)
+        return decode(data, min_size, filename=filename)
+    
+    monkeypatch.setattr(image_features, "decode_image", counting)
+    return calls
+
+def test_content_hash_is_computed_once(monkeypatch):
+    hashes = []
+    md5 = hashlib.md5
+    monkeypatch.setattr(image_features.hashlib, "md5", lambda data: hashes.append(1) or md5(data))
+    features = ImageFeatures(reef_jpeg())
+    
+    assert features.content_hash == md5(features.data).hexdigest()
+    assert features.content_hash == features.content_hash
+    assert len(hashes) == 1
+
+def test_analysis_views_share_one_reduced_decode(decodes):
+    features = ImageFeatures(reef_jpeg())
+    
+    views = [features.rgb_thumbnail, features.grayscale, features.edge_magnitude, features.embedding]
+    phash = features.phash
+    assert decodes == [ImageFeatures.ANALYSIS_SIZE]
+    
+    # Memoized: the same objects come back without decoding again
+    again = [features.rgb_thumbnail, features.grayscale, features.edge_magnitude, features.embedding]
+    assert all(first is second for first, second in zip(views, again))
+    assert features.phash == phash
+    assert len(decodes) == 1
+    assert features.rgb_thumbnail.shape == (150, 150, 3)
+    assert features.grayscale.shape == (100, 100)
+
+def test_reduced_decodes_are_cached_per_size(decodes):
+    features = ImageFeatures(reef_jpeg())
+    
+    small = features.reduced((100, 100))
+    assert features.reduced((100, 100)) is small
+    features.reduced((400, 300))
+    assert decodes == [(100, 100), (400, 300)]
+    
+    # Once decoded in full, reduced views reuse it
+    full = features.image
+    assert features.reduced((50, 50)) is full
+    assert decodes == [(100, 100), (400, 300), None]
+
+def test_header_views_do_not_decode(decodes):
+    features = ImageFeatures(reef_jpeg(orientation=6))
+    
+    assert features.format == "JPEG"
+    assert features.dimensions == (800, 600)
+    assert features.exif["Orientation"] == 6
+    assert features.exif is features.exif
+    assert decodes == []
+
+def test_upright_applies_the_exif_orientation_once_parsed():
+    features = ImageFeatures(reef_jpeg(orientation=6))
+    view = features.reduced((200, 150))
+    
+    # Orientation 6 is a quarter turn clockwise
+    assert features.upright(view).size == (view.height, view.width)
+    assert Image.open(io.BytesIO(features.thumbnail((200, 200)))).size == (150, 200)
+    assert ImageFeatures(reef_jpeg()).upright(view) is view
+
+def test_pickled_features_rebuild_equivalent_views():
+    features = ImageFeatures(reef_jpeg(), "reef.jpg", "image/jpeg")
+    phash, rgb = features.phash, features.rgb_thumbnail
+    
+    payload = pickle.dumps(features)
+    # Derived views are rebuilt by the worker rather than pickled
+    assert len(payload) < features.size + 1024
+    
+    copy = pickle.loads(payload)
+    assert (copy.data, copy.filename, copy.content_type) == (features.data, "reef.jpg", "image/jpeg")
+    assert copy.content_hash == features.content_hash
+    assert copy._reduced == {} and "rgb_thumbnail" not in copy.__dict__
+    assert copy.phash == phash
+    np.testing.assert_array_equal(copy.rgb_thumbnail, rgb)
+    np.testing.assert_array_equal(copy.embedding, features.embedding)
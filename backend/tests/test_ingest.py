@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for upload ingest: body size limits as bytes arrive and memory-mapped spool files
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import hashlib
+import io
+import mmap
+import pickle
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core.config import settings
+from app.core.middleware import BodySizeLimitMiddleware
+from app.services.image_features import ImageFeatures
+from app.services.ingest import ingest_upload
+
+LIMIT = 256 * 1024
+
+def make_app(ingested):
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, limits={"/upload": LIMIT})
+    
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        features = await ingest_upload(file)
+        ingested.append(features)
+        return {"hash": features.content_hash, "size": features.size, "dimensions": list(features.dimensions)}
+    
+    return app
+
+def noise_jpeg(side):
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+@pytest.fixture
+def client():
+    ingested = []
+    with TestClient(make_app(ingested)) as c:
+        c.ingested = ingested
+        yield c
+
+def test_declared_oversized_bodies_are_refused_up_front(client):
+    response = client.post("/upload", files={"file": ("big.jpg", b"\0" * (LIMIT + 1), "image/jpeg")})
+    assert response.status_code == 413
+    assert client.ingested == []
+
+def test_chunked_bodies_are_cut_off_once_past_the_limit():
+    ingested, sent, statuses = [], [], []
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/upload", "raw_path": b"/upload", "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=x")],
+        "client": ("test", 1), "server": ("test", 80)
+    }
+    
+    preamble = b'--x\r\nContent-Disposition: form-data; name="file"; filename="big.jpg"\r\nContent-Type: image/jpeg\r\n\r\n'
+    
+    async def receive():
+        sent.append(1)
+        body = b"\0" * 16384 if len(sent) > 1 else preamble
+        return {"type": "http.request", "body": body, "more_body": len(sent) < 64}
+    
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+    
+    asyncio.run(make_app(ingested)(scope, receive, send))
+    assert statuses == [413]
+    assert len(sent) == LIMIT // 16384 + 1
+    assert ingested == []
+
+def test_large_uploads_are_mapped_not_copied(client, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MMAP_THRESHOLD", 16 * 1024)
+    data = noise_jpeg(200)
+    assert 16 * 1024 < len(data) < LIMIT
+    
+    response = client.post("/upload", files={"file": ("reef.jpg", data, "image/jpeg")})
+    assert response.json() == {"hash": hashlib.md5(data).hexdigest(), "size": len(data), "dimensions": [200, 200]}
+    
+    features = client.ingested[0]
+    assert isinstance(features.data, mmap.mmap)
+    assert features.open().read() == data
+    assert features.reduced((50, 50)).size == (50, 50)
+    # The request has closed its spool file by now, so the payload is pickled as bytes
+    assert pickle.loads(pickle.dumps(features)).data[:] == data
+    features.close()
+    assert features.data.closed
+
+def test_mapped_uploads_are_pickled_by_path(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MMAP_THRESHOLD", 16 * 1024)
+    data = noise_jpeg(200)
+    pickled = []
+    app = FastAPI()
+    
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        features = await ingest_upload(file)
+        pickled.append(pickle.dumps(features))
+        features.close()
+        return {}
+    
+    with TestClient(app) as c:
+        c.post("/upload", files={"file": ("reef.jpg", data, "image/jpeg")})
+    
+    # Sent as the spool file's path, not a copy of the payload
+    assert len(pickled[0]) < 1024
+    # Once the request has closed the spool file, no process can map it
+    with pytest.raises((OSError, ValueError)):
+        pickle.loads(pickled[0])
+
+def worker_view(features):
+    return features.content_hash, list(features.dimensions), isinstance(features.data, mmap.mmap)
+
+def test_mapped_payloads_reach_pool_workers_without_a_copy(tmp_path):
+    data = noise_jpeg(200)
+    path = tmp_path / "spool"
+    path.write_bytes(data)
+    with open(path, "rb") as file:
+        features = ImageFeatures(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), "reef.jpg", source=str(path))
+    expected_hash = features.content_hash
+    
+    assert len(pickle.dumps(features)) < 1024
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(worker_view, features).result() == (expected_hash, [200, 200], True)
+    features.close()
+
+def test_replaced_spool_files_are_sent_as_bytes(tmp_path):
+    data = noise_jpeg(50)
+    path = tmp_path / "spool"
+    path.write_bytes(data)
+    with open(path, "rb") as file:
+        features = ImageFeatures(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), source=str(path))
+    # A new file at the same path must not be mapped in its place
+    path.unlink()
+    path.write_bytes(b"something else")
+    
+    copy = pickle.loads(pickle.dumps(features))
+    assert copy.data == data
+    features.close()
+
+def test_small_uploads_are_read_as_bytes(client):
+    data = noise_jpeg(20)
+    response = client.post("/upload", files={"file": ("tiny.jpg", data, "image/jpeg")})
+    assert response.status_code == 200
+    assert client.ingested[0].data == data
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the request-scoped Neo4j batch loaders
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import pytest
+
+from app.core.loaders import BatchLoader, cypher_batch
+
+class RecordingDB:
+    """Answers UNWIND queries from a dict and records every call"""
+    
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+    
+    def execute_query(self, query, parameters=None):
+        self.calls.append(list(parameters["keys"]))
+        return [{"key": key, "value": self.rows[key]} for key in parameters["keys"] if key in self.rows]
+
+def test_same_tick_loads_share_one_query():
+    db = RecordingDB({"a": 1, "b": 2})
+    loader = BatchLoader(cypher_batch(db, "UNWIND $keys AS key RETURN key"))
+    
+    async def run():
+        return await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"), loader.load("missing"))
+    
+    results = asyncio.run(run())
+    assert [r["value"] if r else None for r in results] == [1, 2, 1, None]
+    assert db.calls == [["a", "b", "missing"]]
+
+def test_results_are_memoized_across_ticks():
+    db = RecordingDB({"a": 1, "b": 2})
+    loader = BatchLoader(cypher_batch(db, "UNWIND $keys AS key RETURN key"))
+    
+    async def run():
+        await loader.load("a")
+        await loader.load_many(["a", "b"])
+    
+    asyncio.run(run())
+    assert db.calls == [["a"], ["b"]]
+    assert loader.batches == 2
+
+def test_max_batch_size_splits_queries():
+    db = RecordingDB({})
+    loader = BatchLoader(cypher_batch(db, "UNWIND $keys AS key RETURN key"), max_batch_size=2)
+    asyncio.run(loader.load_many(["a", "b", "c"]))
+    assert sorted(db.calls) == [["a", "b"], ["c"]]
+
+def test_failures_propagate_and_are_not_memoized():
+    calls = []
+    
+    def flaky(keys):
+        calls.append(keys)
+        if len(calls) == 1:
+            raise ConnectionError("database unavailable")
+        return {key: key.upper() for key in keys}
+    
+    loader = BatchLoader(flaky)
+    
+    async def run():
+        with pytest.raises(ConnectionError):
+            await asyncio.gather(loader.load("a"), loader.load("b"))
+        return await loader.load("a")
+    
+    assert asyncio.run(run()) == "A"
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the geohash location prior: encoding, incremental refresh and re-ranking
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ai_identification.location_prior import (
+    LocationPrior,
+    OBSERVATIONS_QUERY,
+    geohash,
+    geohash_neighborhood
+)
+
+REEF = (-18.29, 147.70)
+HAWAII = (19.90, -155.58)
+
+class OccurrenceDB:
+    """Answers the prior's two queries from in-memory observations and ranges"""
+    
+    def __init__(self):
+        self.observations = []
+        self.ranges = []
+    
+    def observe(self, obs_id, point, species, timestamp):
+        self.observations.append({
+            "id": obs_id, "latitude": point[0], "longitude": point[1], "timestamp": timestamp,
+            "scientific_name": species, "common_name": species.title()
+        })
+    
+    def execute_query(self, query, parameters=None):
+        if query != OBSERVATIONS_QUERY:
+            return [dict(r) for r in self.ranges]
+        since = parameters["since"]
+        return [dict(o) for o in self.observations if since is None or o["timestamp"] >= since]
+
+def test_geohash_matches_reference_encoding():
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash(-25.38262, -49.26561, 8) == "6gkzwgjz"
+
+def test_neighborhood_wraps_at_the_antimeridian():
+    cells = geohash_neighborhood(0.0, 179.99, 3)
+    assert len(cells) == 9
+    assert geohash(0.0, -179.99, 3) in cells
+
+def test_rerank_prefers_species_seen_nearby_and_surfaces_missing_ones():
+    db = OccurrenceDB()
+    for i in range(20):
+        db.observe(f"reef-{i}", REEF, "clownfish" if i < 12 else "manta ray", i)
+        db.observe(f"hawaii-{i}", HAWAII, "sea turtle", i)
+    prior = LocationPrior()
+    prior.load(db)
+    
+    predictions = [
+        {"scientific_name": "sea turtle", "confidence": 0.6},
+        {"scientific_name": "clownfish", "confidence": 0.5}
+    ]
+    ranked, nearby = prior.rerank(predictions, *REEF)
+    
+    assert [p["scientific_name"] for p in ranked] == ["clownfish", "sea turtle"]
+    assert ranked[0]["location_lift"] > 1 > ranked[1]["location_lift"]
+    assert "location_score" not in predictions[0]
+    assert [n["scientific_name"] for n in nearby] == ["manta ray"]
+    
+    # Nowhere near any data the classifier's order stands
+    ranked, nearby = prior.rerank(predictions, 60.0, -30.0)
+    assert [p["scientific_name"] for p in ranked] == ["sea turtle", "clownfish"]
+    assert nearby == []
+
+def test_refresh_is_incremental_and_counts_each_observation_once():
+    db = OccurrenceDB()
+    db.observe("a", REEF, "clownfish", 100)
+    db.observe("b", REEF, "clownfish", 100)
+    prior = LocationPrior()
+    assert prior.load(db) == 2
+    
+    db.observe("c", REEF, "clownfish", 100)
+    db.observe("d", REEF, "manta ray", 200)
+    assert prior.refresh(db) == 2
+    assert prior.refresh(db) == 0
+    assert prior.stats()["observations"] == 4
+    
+    db.ranges = [{"latitude": HAWAII[0], "longitude": HAWAII[1], "scientific_name": "dolphin", "common_name": "Dolphin"}]
+    prior.refresh(db)
+    _, nearby = prior.rerank([], *HAWAII)
+    assert nearby[0]["common_name"] == "Dolphin"
+    
+    db.ranges = []
+    prior.refresh(db)
+    assert prior.rerank([], *HAWAII)[1] == []
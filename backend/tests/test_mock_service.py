@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for the mock provider: per-image determinism and its synthetic latency and error profiles
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from app.services.image_features import ImageFeatures
+from app.services.ai_identification.mock_service import MockIdentificationService, MockProviderError
+
+IMAGES = [ImageFeatures(f"image-{i}".encode()) for i in range(2000)]
+
+def test_predictions_depend_only_on_the_image():
+    first = MockIdentificationService()
+    expected = [first.identify_species(image) for image in IMAGES[:200]]
+    
+    # Another instance, any order, many threads: the same answer per image
+    second = MockIdentificationService(seed=7)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        shuffled = list(pool.map(second.identify_species, reversed(IMAGES[:200])))
+    assert shuffled[::-1] == expected
+    assert second.identify_species(b"image-0") == expected[0]
+    assert len({p[0]["scientific_name"] for p in expected}) > 5
+
+def test_latency_follows_the_configured_lognormal():
+    mock = MockIdentificationService(latency_p50_ms=40, latency_p99_ms=400)
+    samples = sorted(mock.latency(image) * 1000 for image in IMAGES)
+    assert samples[len(samples) // 2] == pytest.approx(40, rel=0.15)
+    assert samples[int(len(samples) * 0.99)] == pytest.approx(400, rel=0.3)
+    
+    assert [mock.latency(image) for image in IMAGES[:5]] == [mock.latency(image) for image in IMAGES[:5]]
+    reseeded = MockIdentificationService(seed=1, latency_p50_ms=40, latency_p99_ms=400)
+    assert reseeded.latency(IMAGES[0]) != mock.latency(IMAGES[0])
+    assert MockIdentificationService().latency(IMAGES[0]) == 0.0
+
+def test_the_same_images_fail_every_time():
+    mock = MockIdentificationService(error_rate=0.1)
+    failing = {image.content_hash for image in IMAGES if mock.fails(image)}
+    assert 150 < len(failing) < 250
+    
+    async def run(image):
+        try:
+            return await mock.identify(image)
+        except MockProviderError:
+            return None
+    
+    async def run_all():
+        return await asyncio.gather(*[run(image) for image in IMAGES[:300]])
+    
+    results = asyncio.run(run_all())
+    assert {image.content_hash for image, r in zip(IMAGES, results) if r is None} == failing & {i.content_hash for i in IMAGES[:300]}
+    assert mock.stats()["calls"] == 300
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for parallel multipart uploads: part layout, concurrency, part retries and aborting
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import urllib3
+from minio import Minio
+from minio.error import S3Error, ServerError
+
+from app.services.multipart import MIN_PART_SIZE, ParallelUploader, _retryable, part_ranges
+from fake_s3 import FakeS3Server
+
+MB = 1024 * 1024
+
+def client(server):
+    return Minio(server.endpoint, access_key="test", secret_key="testsecret", secure=False, region="us-east-1")
+
+def payload(size):
+    return bytes(range(256)) * (size // 256)
+
+def test_parts_cover_the_payload_and_respect_s3_limits():
+    ranges = part_ranges(23 * MB, 5 * MB)
+    assert [length for _, length in ranges] == [5 * MB] * 4 + [3 * MB]
+    assert ranges[-1][0] + ranges[-1][1] == 23 * MB
+    # Too small for S3, and too many parts
+    assert part_ranges(12 * MB, MB)[0][1] == MIN_PART_SIZE
+    assert len(part_ranges(10001 * 5 * MB, MIN_PART_SIZE)) == 10000
+
+def test_parts_are_uploaded_concurrently_and_completed_in_order():
+    data = payload(26 * MB)
+    with FakeS3Server(link_mbps=400) as server:
+        uploader = ParallelUploader(concurrency=4, part_size=5 * MB)
+        etag = uploader.upload(client(server), "bucket", "abc.raw", data, "image/x-raw")
+        assert server.objects["bucket/abc.raw"] == data
+        assert etag.endswith("-6")
+        assert server.max_in_flight > 1
+        assert uploader.stats()["parts"] == 6
+        uploader.shutdown()
+
+def test_failed_parts_are_retried_on_their_own():
+    data = payload(15 * MB)
+    with FakeS3Server(fail_parts={2: 2}) as server:
+        uploader = ParallelUploader(concurrency=2, part_size=5 * MB, retries=2, retry_base=0.0)
+        uploader.upload(client(server), "bucket", "abc.raw", memoryview(data), "image/x-raw")
+        assert server.objects["bucket/abc.raw"] == data
+        assert uploader.stats()["retries"] == 2 and uploader.stats()["parts"] == 3
+        uploader.shutdown()
+
+def test_upload_is_aborted_and_nothing_stored_when_a_part_keeps_failing():
+    with FakeS3Server(fail_parts={3: 5}) as server:
+        uploader = ParallelUploader(concurrency=2, part_size=5 * MB, retries=1, retry_base=0.0)
+        with pytest.raises(S3Error):
+            uploader.upload(client(server), "bucket", "abc.raw", payload(15 * MB), "image/x-raw")
+        assert "bucket/abc.raw" not in server.objects
+        assert server.aborted == 1 and server.uploads == {}
+        uploader.shutdown()
+
+@pytest.mark.parametrize("error, retryable", [
+    (S3Error(None, "SlowDown", "Reduce your request rate", "abc.raw", "r", "h"), True),
+    (S3Error(None, "AccessDenied", "Access denied", "abc.raw", "r", "h"), False),
+    (ServerError("bad gateway", 502), True),
+    (urllib3.exceptions.ProtocolError("Connection aborted"), True),
+    (urllib3.exceptions.ReadTimeoutError(None, "/bucket/abc.raw", "Read timed out"), True),
+    (ConnectionResetError(), True),
+    (TypeError("unexpected keyword argument"), False),
+    (ValueError("invalid part"), False),
+])
+def test_only_transient_errors_are_retried(error, retryable):
+    assert _retryable(error) is retryable
+
+def test_programming_errors_abort_without_retrying():
+    calls = []
+    
+    class BrokenClient:
+        def _create_multipart_upload(self, bucket, name, headers):
+            return "upload-1"
+        
+        def _upload_part(self, *args):
+            calls.append(args)
+            raise TypeError("unexpected argument")
+        
+        def _abort_multipart_upload(self, bucket, name, upload_id):
+            calls.append("abort")
+    
+    uploader = ParallelUploader(concurrency=1, part_size=5 * MB, retries=3, retry_base=0.0)
+    with pytest.raises(TypeError):
+        uploader.upload(BrokenClient(), "bucket", "abc.raw", payload(5 * MB), "image/x-raw")
+    assert len(calls) == 2 and calls[-1] == "abort"
+    assert uploader.stats()["retries"] == 0
+    uploader.shutdown()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for streamed object responses: ranges, conditional GETs and cache headers
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timezone
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.object_response import RangeNotSatisfiableError, object_response, parse_range
+
+ORIGINAL = "0123456789abcdef0123456789abcdef.jpg"
+
+class ChunkedStorage:
+    """Serves in-memory objects in fixed-size chunks, recording what was streamed"""
+    
+    def __init__(self, objects, chunk_size=1024):
+        self.objects = objects
+        self.chunk_size = chunk_size
+        self.chunks = []
+    
+    def stat_image(self, key):
+        return {
+            "etag": f"etag-{len(self.objects[key])}",
+            "size": len(self.objects[key]),
+            "content_type": "image/jpeg",
+            "last_modified": datetime(2024, 5, 1, tzinfo=timezone.utc)
+        }
+    
+    def stream_image(self, key, offset=0, length=None):
+        data = self.objects[key][offset:offset + length]
+        for i in range(0, len(data), self.chunk_size):
+            self.chunks.append(len(data[i:i + self.chunk_size]))
+            yield data[i:i + self.chunk_size]
+
+@pytest.fixture
+def client():
+    data = bytes(range(256)) * 40
+    storage = ChunkedStorage({ORIGINAL: data, "lightroom/cover.jpg": data})
+    app = FastAPI()
+    
+    @app.get("/objects/{key:path}")
+    def get_object(key: str, request: Request):
+        return object_response(storage, key, request.headers)
+    
+    with TestClient(app) as c:
+        c.data, c.storage = data, storage
+        yield c
+
+def test_full_object_is_streamed_in_chunks_with_cache_headers(client):
+    response = client.get(f"/objects/{ORIGINAL}")
+    assert response.status_code == 200
+    assert response.content == client.data
+    assert response.headers["etag"] == f'"etag-{len(client.data)}"'
+    assert response.headers["content-length"] == str(len(client.data))
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["last-modified"] == "Wed, 01 May 2024 00:00:00 GMT"
+    assert max(client.storage.chunks) == 1024 and len(client.storage.chunks) == 10
+    
+    assert client.get("/objects/lightroom/cover.jpg").headers["cache-control"] == "no-cache"
+
+def test_ranges_return_partial_content(client):
+    response = client.get(f"/objects/{ORIGINAL}", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == client.data[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(client.data)}"
+    
+    response = client.get(f"/objects/{ORIGINAL}", headers={"Range": "bytes=-10"})
+    assert response.content == client.data[-10:]
+    
+    response = client.get(f"/objects/{ORIGINAL}", headers={"Range": "bytes=999999-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(client.data)}"
+
+def test_stale_if_range_sends_the_whole_object(client):
+    response = client.get(f"/objects/{ORIGINAL}", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert response.status_code == 200
+    assert len(response.content) == len(client.data)
+
+def test_matching_if_none_match_is_not_modified(client):
+    etag = client.get(f"/objects/{ORIGINAL}").headers["etag"]
+    client.storage.chunks.clear()
+    response = client.get(f"/objects/{ORIGINAL}", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert client.storage.chunks == []
+
+def test_parse_range_edge_cases():
+    assert parse_range("bytes=0-", 10) == (0, 9)
+    assert parse_range("bytes=5-100", 10) == (5, 9)
+    assert parse_range("bytes=0-1,4-5", 10) is None
+    assert parse_range("items=0-1", 10) is None
+    assert parse_range("bytes=x-1", 10) is None
+    with pytest.raises(RangeNotSatisfiableError):
+        parse_range("bytes=5-2", 10)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for the local ONNX Runtime classifier and its request batching
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import io
+import json
+import pytest
+
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from PIL import Image
+from tiny_onnx import SPECIES, build_model
+from app.services.ai_identification.batching import BatchingClassifier
+from app.services.ai_identification.onnx_classifier import OnnxClassifier
+from app.services.image_features import ImageFeatures
+
+def jpeg(color, size=(120, 80)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+@pytest.fixture(scope="module")
+def classifier(tmp_path_factory):
+    model_path, labels_path = build_model(str(tmp_path_factory.mktemp("onnx")))
+    return OnnxClassifier(model_path, labels_path, sessions=2, intra_op_threads=1, top_k=3)
+
+def test_identify_species_returns_ranked_labelled_predictions(classifier):
+    predictions = classifier.identify_species(jpeg("orange"))
+    
+    assert len(predictions) == 3
+    confidences = [p["confidence"] for p in predictions]
+    assert confidences == sorted(confidences, reverse=True)
+    assert 0 < sum(confidences) <= 1.0 + 1e-6
+    assert {p["scientific_name"] for p in predictions} <= {s["scientific_name"] for s in SPECIES}
+
+def test_batch_matches_single_image_inference(classifier):
+    images = [jpeg(color) for color in ("orange", "blue", "green", "gray")]
+    batched = classifier.identify_batch(images)
+    single = [classifier.identify_species(image) for image in images]
+    
+    # Dynamic quantization scales activations per batch, so scores drift slightly
+    for a, b in zip(batched, single):
+        assert a[0]["key"] == b[0]["key"]
+        assert a[0]["confidence"] == pytest.approx(b[0]["confidence"], abs=0.03)
+
+def test_label_count_must_match_model_outputs(tmp_path):
+    model_path, labels_path = build_model(str(tmp_path))
+    with open(labels_path, "w") as f:
+        json.dump(SPECIES[:3], f)
+    
+    with pytest.raises(ValueError):
+        OnnxClassifier(model_path, labels_path)
+
+def test_concurrent_requests_share_inference_calls(classifier):
+    batcher = BatchingClassifier(classifier, max_batch=8, batch_window=0.05)
+    images = [jpeg((i * 20, 100, 200)) for i in range(16)]
+    
+    async def run():
+        return await asyncio.gather(*[batcher.identify(ImageFeatures(image)) for image in images])
+    
+    results = asyncio.run(run())
+    
+    assert len(results) == 16 and all(len(r) == 3 for r in results)
+    assert batcher.stats()["batches"] == 2
+    assert batcher.stats()["mean_batch_size"] == 8
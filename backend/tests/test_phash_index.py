@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the perceptual-hash near-duplicate index
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import random
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.ai_identification.phash_index import MultiIndexHash, NearDuplicateIndex, hamming
+from app.services.image_features import ImageFeatures
+
+def test_search_matches_linear_scan():
+    rng = random.Random(0)
+    for chunks, radius in ((4, 6), (5, 8), (2, 12)):
+        index = MultiIndexHash(chunks)
+        hashes = [rng.getrandbits(64) for _ in range(5000)]
+        for h in hashes:
+            index.add(h, h)
+        for _ in range(50):
+            probe = rng.choice(hashes) ^ sum(1 << b for b in rng.sample(range(64), rng.randint(0, radius + 2)))
+            expected = sorted(h for h in hashes if hamming(probe, h) <= radius)
+            assert sorted(payload for _, payload in index.search(probe, radius)) == expected
+
+def test_find_returns_closest_entry():
+    index = NearDuplicateIndex(max_distance=6)
+    index.add(0b1111, [{"scientific_name": "far"}], "obs-far")
+    index.add(0b0001, [{"scientific_name": "near"}], "obs-near")
+    
+    match = index.find(0)
+    assert match["observation_id"] == "obs-near"
+    assert match["distance"] == 1
+    assert index.find((1 << 64) - 1) is None
+    assert index.stats()["hits"] == 1
+
+def test_find_only_returns_entries_of_the_same_provider_version():
+    index = NearDuplicateIndex(max_distance=6)
+    index.add(0b0001, [{"scientific_name": "mock"}], "obs-mock", "mock", "2")
+    index.add(0b0011, [{"scientific_name": "vision"}], "obs-vision", "vision", "1")
+    
+    assert index.find(0, "vision", "1")["observation_id"] == "obs-vision"
+    assert index.find(0, "mock", "2")["observation_id"] == "obs-mock"
+    assert index.find(0, "mock", "3") is None
+    assert index.find(0, "free", "1") is None
+
+def test_least_recently_used_entries_are_evicted():
+    index = NearDuplicateIndex(max_distance=1, max_entries=2)
+    index.add(0b0001 << 8, [{"scientific_name": "a"}], "obs-a")
+    index.add(0b0001 << 16, [{"scientific_name": "b"}], "obs-b")
+    assert index.find(0b0001 << 8)["observation_id"] == "obs-a"
+    
+    index.add(0b0001 << 24, [{"scientific_name": "c"}], "obs-c")
+    assert index.find(0b0001 << 16) is None
+    assert index.find(0b0001 << 8)["observation_id"] == "obs-a"
+    assert index.stats()["entries"] == 2 and index.stats()["evicted"] == 1
+
+def test_removed_hashes_are_no_longer_found():
+    index = MultiIndexHash(4)
+    ids = [index.add(h, h) for h in (1, 3, 7)]
+    index.remove(ids[1])
+    assert sorted(payload for _, payload in index.search(0, 8)) == [1, 7]
+    assert len(index) == 2
+
+def test_reencoded_image_is_near_duplicate():
+    gradient = np.linspace(0, 255, 600, dtype=np.uint8)
+    pixels = np.stack([gradient[np.newaxis, :].repeat(400, 0) // 4,
+                       gradient[:400, np.newaxis].repeat(600, 1) // 2,
+                       np.full((400, 600), 200, dtype=np.uint8)], axis=-1)
+    img = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([200, 120, 380, 260], fill='orange')
+    draw.rectangle([420, 60, 470, 300], fill='white')
+    
+    hashes = []
+    for quality, offset in ((95, 0), (70, 4)):
+        buffer = io.BytesIO()
+        img.crop((offset, offset, 560 + offset, 380 + offset)).save(buffer, format='JPEG', quality=quality)
+        hashes.append(ImageFeatures(buffer.getvalue()).phash)
+    assert hamming(*hashes) <= 6
+    
+    other = io.BytesIO()
+    img.transpose(Image.FLIP_LEFT_RIGHT).save(other, format='JPEG')
+    assert hamming(hashes[0], ImageFeatures(other.getvalue()).phash) > 6
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for lazy provider loading, per-request selection and runtime switching
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import subprocess
+import pytest
+
+from app.core.config import settings
+from app.services.ai_identification.registry import ProviderRegistry, UnknownProviderError
+
+class MemoryRedis:
+    """The get and set the registry shares its default through"""
+    
+    def __init__(self):
+        self.values = {}
+    
+    def get(self, key):
+        return self.values.get(key)
+    
+    def set(self, key, value):
+        self.values[key] = value.encode()
+
+class DownRedis:
+    def get(self, key):
+        raise ConnectionError("Redis is down")
+    
+    def set(self, key, value):
+        raise ConnectionError("Redis is down")
+
+class Provider:
+    version = "1"
+    
+    def __init__(self):
+        self.closed = False
+    
+    async def identify(self, features):
+        return [], None
+    
+    async def close(self):
+        self.closed = True
+
+def counting_factory(built):
+    def factory():
+        built.append(Provider())
+        return built[-1]
+    return factory
+
+def test_providers_are_built_on_first_use_only():
+    built = []
+    registry = ProviderRegistry(MemoryRedis())
+    registry.register("local", counting_factory(built))
+    
+    assert built == []
+    assert registry.loaded("local") is None
+    
+    provider = registry.get("local")
+    assert registry.get("local") is provider
+    assert len(built) == 1
+    assert registry.stats()["loaded"] == ["local"]
+
+def test_default_can_be_switched_at_runtime():
+    registry = ProviderRegistry(MemoryRedis())
+    registry.register("a", Provider)
+    registry.register("b", Provider)
+    registry.set_default("b")
+    
+    assert registry.default == "b"
+    assert registry.get() is registry.get("b")
+    with pytest.raises(UnknownProviderError):
+        registry.set_default("missing")
+    assert registry.default == "b"
+
+def test_default_switches_reach_other_workers(monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_DEFAULT_REFRESH", 0)
+    redis = MemoryRedis()
+    workers = [ProviderRegistry(redis), ProviderRegistry(redis)]
+    for registry in workers:
+        registry.register("a", Provider)
+        registry.register("b", Provider)
+    
+    assert workers[0].set_default("b")
+    assert workers[1].default == "b"
+
+def test_default_switch_stays_local_while_redis_is_down(monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_DEFAULT_REFRESH", 0)
+    registry = ProviderRegistry(DownRedis())
+    registry.register("a", Provider)
+    registry.register("b", Provider)
+    
+    assert not registry.set_default("b")
+    assert registry.default == "b"
+
+def test_unload_closes_and_rebuilds_on_next_use():
+    built = []
+    registry = ProviderRegistry(MemoryRedis())
+    registry.register("local", counting_factory(built))
+    first = registry.get("local")
+    
+    asyncio.run(registry.unload("local"))
+    
+    assert first.closed
+    assert registry.loaded("local") is None
+    assert registry.get("local") is not first
+
+def test_importing_the_registry_does_not_load_providers():
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = (
+        "import sys\n"
+        "import app.services.ai_identification.registry\n"
+        "heavy = ['tenacity', 'app.services.ai_identification.cascade', "
+        "'app.services.ai_identification.google_vision_rest', "
+        "'app.services.ai_identification.free_classifier']\n"
+        "print(','.join(m for m in heavy if m in sys.modules))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == ""
+
+def test_versions_are_read_without_constructing_providers():
+    built = []
+    registry = ProviderRegistry(MemoryRedis())
+    registry.register("local", counting_factory(built), lambda: "7")
+    registry.register("plain", counting_factory(built))
+    
+    assert registry.version("local") == "7"
+    assert built == []
+    # Once loaded the instance answers, and providers without a resolver are built to ask
+    assert registry.version("plain") == "1" and len(built) == 1
+    registry.get("local")
+    assert registry.version("local") == "1"
+
+def test_cached_lookups_do_not_load_local_classifiers():
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = (
+        "from app.services.ai_identification.registry import provider_registry\n"
+        "from app.services import executor\n"
+        "from app.services.ai_identification import color_engine\n"
+        "versions = [provider_registry.version(name) for name in ('free', 'mock', 'cascade')]\n"
+        "print(color_engine.color_engine.table is None, sorted(executor._providers), provider_registry.stats()['loaded'])\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "True [] []"
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for thumbnail and preview renditions: sizes, orientation, keys and background generation
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+from PIL import Image
+
+from app.core.config import settings
+from app.services import renditions
+from app.services.image_features import ImageFeatures
+from app.services.renditions import RenditionService, RECORD_QUERY, rendition_keys
+from app.services.url_signer import URLSigner
+
+class MemoryStorage:
+    def __init__(self):
+        self.objects = {}
+    
+    def upload_bytes(self, object_name, data, content_type):
+        self.objects[object_name] = (data, content_type)
+
+class RecordingDB:
+    def __init__(self):
+        self.writes = []
+    
+    def execute_write(self, query, parameters=None):
+        self.writes.append((query, parameters))
+
+def photo(size=(3000, 2000), orientation=None):
+    img = Image.new("RGB", size, "navy")
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    img.save(buffer, format="JPEG", exif=exif.tobytes())
+    return ImageFeatures(buffer.getvalue(), "reef.jpg", "image/jpeg")
+
+def test_renditions_fit_their_boxes_upright():
+    rendered = RenditionService(storage=MemoryStorage()).render(photo(orientation=6))
+    preview = Image.open(io.BytesIO(rendered["preview"]))
+    thumbnail = Image.open(io.BytesIO(rendered["thumbnail"]))
+    assert preview.format == "WEBP"
+    # Rotated a quarter turn, so portrait
+    assert preview.size == (800, 1200)
+    assert thumbnail.size == (200, 300)
+
+def test_keys_are_deterministic_per_content_and_format(monkeypatch):
+    assert rendition_keys("abc") == {
+        "preview": "renditions/abc/preview.webp",
+        "thumbnail": "renditions/abc/thumbnail.webp"
+    }
+    monkeypatch.setattr(settings, "RENDITION_FORMAT", "jpeg")
+    assert rendition_keys("abc")["thumbnail"] == "renditions/abc/thumbnail.jpg"
+
+def test_submitted_renditions_are_stored_and_recorded_after_the_caller_closes(monkeypatch):
+    db = RecordingDB()
+    monkeypatch.setattr(renditions, "get_db", lambda: db)
+    storage = MemoryStorage()
+    service = RenditionService(storage=storage)
+    features = photo()
+    
+    future = service.submit(features, "abc.jpg")
+    features.close()
+    future.result()
+    service.shutdown()
+    
+    keys = rendition_keys(features.content_hash)
+    assert storage.objects[keys["thumbnail"]][1] == "image/webp"
+    assert db.writes == [(RECORD_QUERY, {"filename": "abc.jpg", **keys})]
+    assert service.stats()["rendered"] == 1
+
+def test_deferred_renditions_are_recorded_once_their_nodes_exist(monkeypatch):
+    db = RecordingDB()
+    monkeypatch.setattr(renditions, "get_db", lambda: db)
+    service = RenditionService(storage=MemoryStorage())
+    features = photo()
+    
+    future = service.submit(features, "abc.jpg", record=False)
+    keys = future.result()
+    assert keys == rendition_keys(features.content_hash)
+    assert db.writes == []
+    
+    # The batch writes its observations, then asks for the record
+    service.record_when_done(future, "abc.jpg")
+    service.shutdown()
+    assert db.writes == [(RECORD_QUERY, {"filename": "abc.jpg", **keys})]
+
+def test_urls_fall_back_to_the_original_until_renditions_exist(monkeypatch):
+    monkeypatch.setattr(renditions, "url_signer", URLSigner(public_base="http://cdn", mode="public", bucket="b"))
+    service = RenditionService(storage=MemoryStorage())
+    keys = rendition_keys("abc")
+    
+    node = {"filename": "abc.jpg", **{f"{name}_key": key for name, key in keys.items()}}
+    assert service.urls(node)["thumbnail_url"] == f"http://cdn/b/{keys['thumbnail']}"
+    assert service.urls({"filename": "abc.jpg"}) == {"thumbnail_url": "http://cdn/b/abc.jpg", "preview_url": "http://cdn/b/abc.jpg"}
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Tests for provider deadlines, retries, circuit breaking and local fallback
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import time
+import pytest
+
+from fake_vision import FakeVisionServer
+from app.services.ai_identification.google_vision_rest import GoogleVisionRESTService, VisionAPIError
+from app.services.ai_identification.resilience import CircuitBreaker, ResilientProvider
+from app.services.image_features import ImageFeatures
+
+LOCAL = [{"scientific_name": "Pterois volitans", "confidence": 0.6}]
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+async def local(features):
+    return LOCAL
+
+def vision_call(server, timeout=5.0):
+    service = GoogleVisionRESTService(api_key="test-key", base_url=server.url, batch_window=0, timeout=timeout)
+    
+    async def call(features):
+        try:
+            return await service.identify_species(features.data)
+        finally:
+            await service.close()
+    return call
+
+def identify(provider):
+    return asyncio.run(provider.identify(ImageFeatures(b"image")))
+
+def test_breaker_opens_and_falls_back_without_calling_vision():
+    clock = Clock()
+    breaker = CircuitBreaker("vision", failure_threshold=3, reset_timeout=30, clock=clock)
+    with FakeVisionServer(status=503) as server:
+        provider = ResilientProvider("vision", vision_call(server), breaker, fallback=local,
+                                     fallback_name="free", retries=0)
+        for _ in range(3):
+            predictions, report = identify(provider)
+            assert report["fallback_reason"] == "error"
+        assert breaker.state == "open"
+        
+        calls = server.calls
+        predictions, report = identify(provider)
+        assert server.calls == calls
+        assert report == {"answered_by": "free", "fallback_reason": "circuit_open", "error": "Circuit for vision is open"}
+        assert predictions == LOCAL
+    
+    assert provider.stats()["fallbacks"] == {"error": 3, "circuit_open": 1}
+
+def test_half_open_trial_closes_circuit_on_success():
+    clock = Clock()
+    breaker = CircuitBreaker("vision", failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    assert not breaker.allow()
+    
+    clock.now = 31
+    assert breaker.state == "half_open"
+    with FakeVisionServer() as server:
+        provider = ResilientProvider("vision", vision_call(server), breaker, fallback=local)
+        predictions, report = identify(provider)
+    
+    assert report["answered_by"] == "vision"
+    assert predictions[0]["scientific_name"] == "Amphiprion ocellaris"
+    assert breaker.state == "closed"
+
+def test_half_open_allows_a_single_trial():
+    clock = Clock()
+    breaker = CircuitBreaker("vision", failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.stats()["opened"] == 2
+
+def test_cancelled_half_open_trial_lets_the_circuit_close_again():
+    clock = Clock()
+    breaker = CircuitBreaker("vision", failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    
+    async def hang(features):
+        await asyncio.sleep(10)
+    
+    async def cancel_trial():
+        provider = ResilientProvider("vision", hang, breaker, deadline=30)
+        task = asyncio.ensure_future(provider.identify(ImageFeatures(b"image")))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    
+    asyncio.run(cancel_trial())
+    assert breaker.state == "half_open"
+    
+    provider = ResilientProvider("vision", local, breaker)
+    predictions, report = identify(provider)
+    assert report["answered_by"] == "vision"
+    assert breaker.state == "closed"
+
+def test_deadline_bounds_slow_provider():
+    breaker = CircuitBreaker("vision", failure_threshold=5)
+    with FakeVisionServer(latency=1.0) as server:
+        provider = ResilientProvider("vision", vision_call(server), breaker, fallback=local, deadline=0.2)
+        start = time.perf_counter()
+        predictions, report = identify(provider)
+        elapsed = time.perf_counter() - start
+    
+    assert elapsed < 0.8
+    assert report["fallback_reason"] == "deadline"
+    assert predictions == LOCAL
+    assert provider.stats()["deadline_exceeded"] == 1
+
+def test_transient_failures_are_retried():
+    attempts = []
+    
+    async def flaky(features):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise VisionAPIError("503", retryable=True)
+        return LOCAL
+    
+    provider = ResilientProvider("vision", flaky, CircuitBreaker("vision"), retries=2, deadline=5)
+    predictions, report = identify(provider)
+    assert predictions == LOCAL and len(attempts) == 3
+    assert provider.stats()["retries"] == 2
+
+def test_permanent_failures_raise_without_retry_or_breaker_trip():
+    attempts = []
+    
+    async def no_match(features):
+        attempts.append(1)
+        raise VisionAPIError("no marine species")
+    
+    breaker = CircuitBreaker("vision", failure_threshold=1)
+    provider = ResilientProvider("vision", no_match, breaker, retries=2)
+    with pytest.raises(VisionAPIError):
+        identify(provider)
+    assert len(attempts) == 1
+    assert breaker.state == "closed"
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for time-bucketed presigned URLs: reuse within a bucket, expiry and public bases
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from urllib.parse import parse_qs, urlsplit
+
+from app.services.url_signer import URLSigner
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+def signer(clock, **kwargs):
+    options = {"public_base": "https://cdn.example.com", "mode": "presigned", "expires": 3600, "window": 900, "bucket": "marine-images"}
+    return URLSigner(clock=clock, **{**options, **kwargs})
+
+def test_urls_are_reused_within_a_bucket_and_resigned_after():
+    clock = Clock(1_700_000_100)
+    urls = signer(clock)
+    first = urls.sign("abc.jpg")
+    clock.now += 500
+    assert urls.sign("abc.jpg") == first
+    assert urls.stats()["hits"] == 1 and urls.stats()["signed"] == 1
+    
+    clock.now += 900
+    assert urls.sign("abc.jpg") != first
+    
+    query = parse_qs(urlsplit(first).query)
+    # Signed at the bucket start and valid for the rest of it plus the full expiry
+    assert query["X-Amz-Date"] == ["20231114T221500Z"]
+    assert query["X-Amz-Expires"] == ["4500"]
+
+def test_sign_many_dedupes_and_skips_missing_keys():
+    urls = signer(Clock(1_700_000_000))
+    signed = urls.sign_many(["a.jpg", None, "b.jpg", "a.jpg"])
+    assert sorted(signed) == ["a.jpg", "b.jpg"]
+    assert urls.stats()["signed"] == 2
+    assert urls.sign_many(["a.jpg", "b.jpg"]) == signed
+
+def test_base_path_is_prepended_after_signing_for_the_public_host():
+    url = signer(Clock(1_700_000_000), public_base="https://example.com/media/").sign("renditions/abc/thumbnail.webp")
+    parts = urlsplit(url)
+    assert parts.netloc == "example.com"
+    assert parts.path == "/media/marine-images/renditions/abc/thumbnail.webp"
+
+def test_public_mode_builds_plain_urls():
+    urls = signer(Clock(0), mode="public", public_base="http://localhost:9000")
+    assert urls.sign("a b.jpg") == "http://localhost:9000/marine-images/a%20b.jpg"
+
+def test_memo_is_bounded():
+    urls = signer(Clock(1_700_000_000), max_entries=10)
+    urls.sign_many(f"{i}.jpg" for i in range(25))
+    assert urls.stats()["entries"] == 10
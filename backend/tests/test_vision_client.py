@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the micro-batching Google Vision client against a fake Vision server
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import io
+import pytest
+from PIL import Image, ImageDraw
+
+from fake_vision import FakeVisionServer
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+from app.services.ai_identification.google_vision_rest import GoogleVisionRESTService, VisionAPIError, prepare_image
+
+LABELS = {
+    b"clown": [{"description": "Clownfish", "score": 0.91}],
+    b"turtle": [{"description": "Sea turtle", "score": 0.88}],
+    b"shark": [{"description": "Shark", "score": 0.75}],
+}
+
+def identify_all(service, images):
+    async def run():
+        try:
+            return await asyncio.gather(*(service.identify_species(i) for i in images), return_exceptions=True)
+        finally:
+            await service.close()
+    return asyncio.run(run())
+
+def test_concurrent_calls_share_annotate_requests():
+    with FakeVisionServer(responder=lambda image: LABELS[image.split(b"-")[0]]) as server:
+        service = GoogleVisionRESTService(api_key="test-key", base_url=server.url, batch_window=0.05)
+        images = [f"{name}-{i}".encode() for i in range(7) for name in ("clown", "turtle", "shark")]
+        results = identify_all(service, images)
+    
+    assert server.calls == 2  # 21 images at 16 per call
+    assert server.images == 21
+    expected = {"clown": "Amphiprion ocellaris", "turtle": "Chelonia mydas", "shark": "Carcharodon carcharias"}
+    for image, result in zip(images, results):
+        assert result[0]["scientific_name"] == expected[image.split(b"-")[0].decode()]
+
+def test_unmatched_image_fails_only_its_caller():
+    labels = {b"clown": LABELS[b"clown"], b"empty": []}
+    with FakeVisionServer(responder=lambda image: labels[image]) as server:
+        service = GoogleVisionRESTService(api_key="test-key", base_url=server.url, batch_window=0.05)
+        clown, empty = identify_all(service, [b"clown", b"empty"])
+    
+    assert server.calls == 1
+    assert clown[0]["common_name"] == "Common Clownfish"
+    assert isinstance(empty, VisionAPIError)
+
+def test_api_failure_fails_every_caller():
+    with FakeVisionServer(status=503) as server:
+        service = GoogleVisionRESTService(api_key="test-key", base_url=server.url, batch_window=0.05)
+        results = identify_all(service, [b"a", b"b", b"c"])
+    
+    assert all(isinstance(r, VisionAPIError) for r in results)
+    assert service.stats()["errors"] == 1
+
+def test_missing_api_key_raises_without_calling_api():
+    service = GoogleVisionRESTService(base_url="http://127.0.0.1:9/unused")
+    service.api_key = None
+    with pytest.raises(VisionAPIError):
+        asyncio.run(service.identify_species(b"image"))
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
+
+def jpeg(img, quality=95, **params) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality, **params)
+    return buffer.getvalue()
+
+def test_prepared_image_is_downscaled_and_upright():
+    img = Image.new("RGB", (4000, 2000), (20, 80, 160))
+    exif = img.getexif()
+    exif[0x0112] = 6  # Rotated 90 degrees clockwise when shot
+    features = ImageFeatures(jpeg(img, exif=exif))
+    
+    prepared = Image.open(io.BytesIO(prepare_image(features)))
+    
+    assert prepared.format == "JPEG"
+    assert prepared.size == (512, 1024)
+
+def test_small_jpegs_are_never_enlarged():
+    img = Image.effect_noise((320, 240), 60).convert("RGB")
+    data = jpeg(img, quality=40)
+    assert prepare_image(ImageFeatures(data)) == data
+
+def test_subject_crop_keeps_the_fish(monkeypatch):
+    monkeypatch.setattr(settings, "VISION_CROP_SUBJECT", True)
+    img = Image.new("RGB", (3000, 2000), (20, 80, 160))
+    ImageDraw.Draw(img).ellipse([2000, 300, 2600, 700], fill="orange")
+    features = ImageFeatures(jpeg(img))
+    
+    left, top, right, bottom = features.subject_box
+    assert left <= 2000 / 3000 < 2600 / 3000 <= right
+    assert top <= 300 / 2000 < 700 / 2000 <= bottom
+    
+    prepared = Image.open(io.BytesIO(prepare_image(features)))
+    assert prepared.width < 1024 and prepared.getpixel((prepared.width // 2, prepared.height // 2))[0] > 200
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for the write-behind queue: draining, retries, replay after a restart and the single drainer
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import pytest
+
+from app.core.config import settings
+from app.services.image_features import ImageFeatures
+from app.services.write_behind import WriteBehindQueue
+
+def observation(i):
+    return {"id": f"obs-{i}", "species_name": "Amphiprion ocellaris", "confidence": 0.9}
+
+def image(i):
+    return ImageFeatures(f"image-{i}".encode(), f"photo-{i}.jpg", "image/jpeg")
+
+class Recorder:
+    """Handler that fails the first `failures` calls for each job"""
+    
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = {}
+        self.stored = {}
+    
+    def __call__(self, job, features):
+        self.calls[job["id"]] = self.calls.get(job["id"], 0) + 1
+        if self.calls[job["id"]] <= self.failures:
+            raise ConnectionError("MinIO unavailable")
+        self.stored[job["id"]] = (features.data, features.filename, job["species_name"])
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_RETRY_BASE", 0.0)
+
+def test_enqueued_jobs_are_persisted_once_and_spool_is_cleared(tmp_path):
+    queue = WriteBehindQueue(str(tmp_path))
+    handler = Recorder()
+    for i in range(3):
+        queue.enqueue(image(i), observation(i))
+    
+    assert asyncio.run(queue.drain_once(handler)) == 3
+    assert asyncio.run(queue.drain_once(handler)) == 0
+    assert handler.stored["obs-1"] == (b"image-1", "photo-1.jpg", "Amphiprion ocellaris")
+    assert os.listdir(tmp_path / "images") == []
+    assert queue.stats()["persisted"] == 3
+
+def test_failures_are_retried_until_they_succeed(tmp_path):
+    queue = WriteBehindQueue(str(tmp_path))
+    handler = Recorder(failures=2)
+    queue.enqueue(image(0), observation(0))
+    
+    for _ in range(3):
+        asyncio.run(queue.drain_once(handler))
+    
+    assert handler.calls["obs-0"] == 3
+    assert "obs-0" in handler.stored
+    assert queue.stats()["retries"] == 2 and queue.stats()["pending"] == 0
+
+def test_pending_jobs_are_replayed_by_the_next_drainer(tmp_path):
+    first = WriteBehindQueue(str(tmp_path))
+    first.enqueue(image(0), observation(0))
+    first.enqueue(image(1), observation(1))
+    asyncio.run(first.drain_once(Recorder(failures=1)))
+    asyncio.run(first.stop())
+    
+    # A new process picks up both jobs, whose puts have no done record
+    handler = Recorder()
+    second = WriteBehindQueue(str(tmp_path))
+    assert asyncio.run(second.drain_once(handler)) == 2
+    assert set(handler.stored) == {"obs-0", "obs-1"}
+
+def test_only_one_drainer_and_it_sees_every_worker_s_jobs(tmp_path):
+    leader = WriteBehindQueue(str(tmp_path))
+    follower = WriteBehindQueue(str(tmp_path))
+    handler = Recorder()
+    asyncio.run(leader.drain_once(handler))
+    
+    follower.enqueue(image(0), observation(0))
+    assert asyncio.run(follower.drain_once(handler)) == 0
+    assert asyncio.run(leader.drain_once(handler)) == 1
+    assert follower.stats()["leader"] is False and "obs-0" in handler.stored
+
+def test_jobs_are_set_aside_after_max_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_MAX_ATTEMPTS", 2)
+    queue = WriteBehindQueue(str(tmp_path))
+    queue.enqueue(image(0), observation(0))
+    
+    for _ in range(3):
+        asyncio.run(queue.drain_once(Recorder(failures=10)))
+    
+    assert queue.stats()["dead"] == 1 and queue.stats()["pending"] == 0
+    assert sorted(os.listdir(tmp_path / "dead")) == ["obs-0.image", "obs-0.json"]
@@ -0,0 +1,71 @@
+"""
+Small randomly initialized CNN exported to ONNX for tests and benchmarks
+Conv/ReLU stages, global average pooling and a linear head, quantized to int8
+"""
+
+import json
+import os
+from typing import Sequence
+
+import numpy as np
+
+SPECIES = [
+    {"key": "clownfish", "scientific_name": "Amphiprion ocellaris", "common_name": "Common Clownfish"},
+    {"key": "blue_tang", "scientific_name": "Paracanthurus hepatus", "common_name": "Blue Tang"},
+    {"key": "turtle", "scientific_name": "Chelonia mydas", "common_name": "Green Sea Turtle"},
+    {"key": "shark", "scientific_name": "Carcharodon carcharias", "common_name": "Great White Shark"},
+]
+
+def build_model(
+    directory: str,
+    size: int = 32,
+    channels: Sequence[int] = (8, 16),
+    labels: Sequence[dict] = SPECIES,
+    quantize: bool = True,
+    seed: int = 0
+):
+    """Write model.onnx and labels.json into `directory`, returning their paths"""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+    
+    rng = np.random.default_rng(seed)
+    nodes, initializers = [], []
+    previous, width = "image", 3
+    for i, out in enumerate(channels):
+        weight = rng.normal(0, (2 / (9 * width)) ** 0.5, (out, width, 3, 3)).astype(np.float32)
+        initializers += [numpy_helper.from_array(weight, f"w{i}"), numpy_helper.from_array(np.zeros(out, np.float32), f"b{i}")]
+        nodes += [
+            helper.make_node("Conv", [previous, f"w{i}", f"b{i}"], [f"conv{i}"], kernel_shape=[3, 3], strides=[2, 2], pads=[1, 1, 1, 1]),
+            helper.make_node("Relu", [f"conv{i}"], [f"relu{i}"]),
+        ]
+        previous, width = f"relu{i}", out
+    
+    head = rng.normal(0, 0.5, (width, len(labels))).astype(np.float32)
+    initializers += [numpy_helper.from_array(head, "head"), numpy_helper.from_array(np.array([0, -1], np.int64), "flat")]
+    nodes += [
+        helper.make_node("GlobalAveragePool", [previous], ["pooled"]),
+        helper.make_node("Reshape", ["pooled", "flat"], ["features"]),
+        helper.make_node("MatMul", ["features", "head"], ["logits"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "marine_test",
+        [helper.make_tensor_value_info("image", TensorProto.FLOAT, ["N", 3, size, size])],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["N", len(labels)])],
+        initializers
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    
+    os.makedirs(directory, exist_ok=True)
+    model_path = os.path.join(directory, "model.onnx")
+    labels_path = os.path.join(directory, "labels.json")
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        float_path = os.path.join(directory, "model_fp32.onnx")
+        onnx.save(model, float_path)
+        quantize_dynamic(float_path, model_path, weight_type=QuantType.QInt8)
+    else:
+        onnx.save(model, model_path)
+    with open(labels_path, "w") as f:
+        json.dump(list(labels), f)
+    return model_path, labels_path